@@ -0,0 +1,398 @@
+"""Modo ASGI de la API: las mismas rutas públicas y de inscripción que main.py,
+servidas con handlers async sobre psycopg 3 y un pool de conexiones asíncrono.
+Cada petición en espera de PostgreSQL ya no ocupa un hilo del sistema.
+
+    pip install quart quart-cors "psycopg[binary]" psycopg-pool hypercorn
+    hypercorn asgi:app --bind 0.0.0.0:5000 --workers 2
+
+La app WSGI (python main.py / gunicorn main:app) sigue disponible y es la que
+tiene las rutas de administración, login y registro. Las dos comparten
+consultas.py (SQL, validación de la entrada y códigos de respuesta), la
+paginación, la caché de respuestas, las versiones (ETag) y la verificación de
+tokens de main.py.
+"""
+import logging
+import os
+from functools import wraps
+
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+import consultas
+import main as wsgi
+from cache import FALTA
+from config import DB_CONFIG
+from consultas import Rechazo
+from paginacion import ParametroInvalido
+
+logger = logging.getLogger(__name__)
+
+app = cors(Quart(__name__), expose_headers=['X-Siguiente-Cursor', 'Link'])
+app.config['SECRET_KEY'] = wsgi.app.config['SECRET_KEY']
+
+# -------------------- Pool asíncrono --------------------
+pool = AsyncConnectionPool(
+    conninfo=make_conninfo(**{('dbname' if k == 'database' else k): v for k, v in DB_CONFIG.items()}),
+    min_size=int(os.environ.get('DB_POOL_MIN', 1)),
+    max_size=int(os.environ.get('DB_POOL_MAX', 20)),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    max_lifetime=float(os.environ.get('DB_POOL_VIDA_MAXIMA', 1800)),
+    kwargs={'row_factory': dict_row},
+    open=False,
+)
+
+
+@app.before_serving
+async def abrir_pool():
+    await pool.open()
+    wsgi.volcador.arrancar()
+    wsgi.refresco_liga.arrancar()
+
+
+@app.after_serving
+async def cerrar_pool():
+    await pool.close()
+
+
+class ErrorSQL(Exception):
+    pass
+
+
+async def ejecutar_sql(sql, params=None, bloqueo=None):
+    # Una conexión y una transacción por llamada: se confirma al salir del bloque.
+    # `bloqueo` se ejecuta antes en la misma transacción (Operacion.bloqueo)
+    try:
+        async with pool.connection() as conn:
+            if bloqueo:
+                await conn.execute(bloqueo, params)
+            cur = await conn.execute(sql, params)
+            return await cur.fetchall() if cur.description else None
+    except Exception as e:
+        logger.exception("Error en ejecutar_sql (asgi)")
+        raise ErrorSQL(str(e)) from e
+
+
+@app.errorhandler(ErrorSQL)
+async def error_sql(e):
+    return jsonify({'error': str(e)}), 500
+
+
+# -------------------- Autenticación y caché --------------------
+def token_required(f):
+    @wraps(f)
+    async def decorador(*args, **kwargs):
+        usuario, error = wsgi.usuario_de_cabecera(request.headers.get('Authorization'))
+        if error:
+            return jsonify(error), 401
+        return await f(usuario, *args, **kwargs)
+    return decorador
+
+
+def cacheado(espacio):
+    # Misma caché, mismas claves y mismas entradas (con versión) que @cacheado
+    # en main.py. El pool es la primaria, así que basta con que la versión no
+    # haya cambiado durante la lectura
+    def decorador(f):
+        @wraps(f)
+        async def envoltura(*args, **kwargs):
+            nombre = espacio(**kwargs) if callable(espacio) else espacio
+            clave = wsgi.clave_desde(request.path, request.args)
+            version = wsgi.versiones.obtener(nombre)
+            guardado = wsgi.cache.get(nombre, clave)
+            if guardado is not FALTA and guardado[0] == version[0]:
+                _, cuerpo, estado, cabeceras = guardado
+                return app.response_class(cuerpo, status=estado, headers=cabeceras)
+
+            respuesta = await app.make_response(await f(*args, **kwargs))
+            if respuesta.status_code == 200 and wsgi.versiones.obtener(nombre)[0] == version[0]:
+                cabeceras = [(k, v) for k, v in respuesta.headers.items()
+                             if k not in ('Content-Length', 'Set-Cookie')]
+                wsgi.cache.set(nombre, clave, (version[0], await respuesta.get_data(),
+                                               respuesta.status_code, cabeceras))
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def versionado(espacio):
+    # Mismas versiones y mismos ETag que @versionado en main.py (solo con CACHE_URL)
+    def decorador(f):
+        if not wsgi.ETAGS:
+            return f
+
+        @wraps(f)
+        async def envoltura(*args, **kwargs):
+            nombre = espacio(**kwargs) if callable(espacio) else espacio
+            etag, modificado = wsgi.etiqueta_version(nombre, wsgi.clave_desde(request.path, request.args))
+            if request.if_none_match.contains(etag):
+                respuesta = app.response_class('', status=304)
+            else:
+                respuesta = await app.make_response(await f(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag)
+            respuesta.last_modified = modificado
+            return respuesta
+        return envoltura
+    return decorador
+
+
+# -------------------- Helpers de rutas --------------------
+async def membresia(id_usuario):
+    # Misma caché y mismas versiones que main.membresia (el pool es la primaria)
+    if wsgi.membresias is None:
+        return None
+    espacio = consultas.espacio_membresia(id_usuario)
+    version = wsgi.versiones_membresia.obtener(espacio)
+    guardada = wsgi.membresias.get(espacio, 'equipo')
+    if guardada is not FALTA and guardada[0] == version:
+        return guardada[1]
+    filas = await ejecutar_sql(consultas.MEMBRESIA, (id_usuario,))
+    actual = (filas[0]['equipo_id'], filas[0]['es_fundador']) if filas else (None, False)
+    wsgi.membresias.set(espacio, 'equipo', (version, actual))
+    return actual
+
+
+async def listar_paginado(listado, params=()):
+    try:
+        sql, params, limite, campos = listado.consulta(request.args, params)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+
+    filas, siguiente = listado.pagina(await ejecutar_sql(sql, params), limite, campos)
+    respuesta = jsonify(filas)
+    if siguiente:
+        respuesta.headers['X-Siguiente-Cursor'] = siguiente
+        respuesta.headers['Link'] = wsgi.enlace_siguiente(request.path, request.args, siguiente, limite)
+    return respuesta
+
+
+async def ejecutar_operacion(operacion, usuario, **ruta):
+    try:
+        params = operacion.parametros(usuario, await request.get_json(silent=True), **ruta)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+
+    if operacion.previa:
+        actual = await membresia(usuario['id'])
+        rechazo = actual is not None and operacion.previa(actual, params)
+        if rechazo:
+            cuerpo, estado = rechazo
+            return jsonify(cuerpo), estado
+
+    try:
+        resultado = await ejecutar_sql(operacion.sql, params, operacion.bloqueo)
+    except ErrorSQL as e:
+        return jsonify({'error': f'{operacion.error}: {e}'}), 500
+
+    cuerpo, estado = operacion.respuesta(resultado[0], usuario)
+    if operacion.invalida and estado < 400:
+        # ejecutar_sql ya ha confirmado la transacción; la posición del WAL
+        # solo hace falta si la app WSGI lee de réplicas (ver main.al_dia)
+        lsn = None
+        if wsgi.replicas:
+            try:
+                lsn = (await ejecutar_sql('SELECT pg_current_wal_lsn()::text AS lsn'))[0]['lsn']
+            except ErrorSQL:
+                pass
+        for espacio in operacion.invalida(params, resultado[0]):
+            wsgi.invalidar_espacio(espacio, lsn)
+    return jsonify(cuerpo), estado
+
+
+# -------------------- Rutas Públicas --------------------
+@app.route('/torneos', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
+async def obtener_torneos():
+    return await listar_paginado(consultas.LISTADO_TORNEOS)
+
+
+@app.route('/eventos', methods=['GET'])
+@versionado('eventos')
+@cacheado('eventos')
+async def obtener_eventos():
+    return await listar_paginado(consultas.LISTADO_EVENTOS)
+
+
+@app.route('/equipos', methods=['GET'])
+async def obtener_equipos():
+    return await listar_paginado(consultas.LISTADO_EQUIPOS)
+
+
+@app.route('/equipos/por-juego/<int:id_juego>', methods=['GET'])
+async def obtener_equipos_por_juego(id_juego):
+    return await listar_paginado(consultas.LISTADO_EQUIPOS_POR_JUEGO, (id_juego,))
+
+
+@app.route('/buscar', methods=['GET'])
+async def buscar():
+    # Misma validación y misma caché que /buscar en main.py
+    try:
+        params = wsgi.parametros_busqueda(request.args)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+
+    clave = wsgi.clave_busqueda(params)
+    datos = wsgi.busquedas.get('buscar', clave)
+    if datos is FALTA:
+        datos = await ejecutar_sql(consultas.BUSCAR, params)
+        wsgi.busquedas.set('buscar', clave, datos)
+    return jsonify(datos)
+
+
+@app.route('/liga/<int:id_juego>/tabla', methods=['GET'])
+async def tabla_liga(id_juego):
+    return await listar_paginado(consultas.LISTADO_TABLA_LIGA, (id_juego,))
+
+
+@app.route('/jugadores/por-juego/<int:id_juego>', methods=['GET'])
+async def obtener_jugadores_por_juego(id_juego):
+    return await listar_paginado(consultas.LISTADO_JUGADORES_POR_JUEGO, (id_juego,))
+
+
+@app.route('/juegos', methods=['GET'])
+@versionado('juegos')
+@cacheado('juegos')
+async def obtener_juegos():
+    tipo = request.args.get('tipo')
+    return jsonify(await ejecutar_sql(consultas.JUEGOS.get(tipo, consultas.JUEGOS[None])))
+
+
+@app.route('/torneos/por-juego/<int:id_juego>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
+async def obtener_torneos_por_juego(id_juego):
+    return jsonify(await ejecutar_sql(consultas.TORNEOS_POR_JUEGO, (id_juego,)))
+
+
+@app.route('/torneos/completos/<int:id_juego>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
+async def obtener_torneos_completos(id_juego):
+    return jsonify(await ejecutar_sql(consultas.TORNEOS_COMPLETOS, (id_juego,)))
+
+
+@app.route('/torneos/evento/<int:id_evento>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
+async def obtener_torneos_por_evento(id_evento):
+    return jsonify(await ejecutar_sql(consultas.TORNEOS_POR_EVENTO, (id_evento,)))
+
+
+@app.route('/clasificacion/<int:torneo_id>', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+async def clasificacion_torneo(torneo_id):
+    datos = await ejecutar_sql(consultas.CLASIFICACION_TORNEO, (torneo_id,))
+    if not datos:
+        return jsonify({"message": "No hay clasificación para este torneo"}), 404
+    return jsonify(datos)
+
+
+@app.route('/torneo/<int:torneo_id>/equipos', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+async def equipos_en_torneo(torneo_id):
+    return jsonify(await ejecutar_sql(consultas.EQUIPOS_EN_TORNEO, (torneo_id,)))
+
+
+@app.route('/torneo/<int:torneo_id>/detalle', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+@cacheado(consultas.espacio_torneo)
+async def detalle_torneo(torneo_id):
+    resultado = await ejecutar_sql(consultas.DETALLE_TORNEO, (torneo_id,))
+    if not resultado:
+        return jsonify({'error': 'Torneo no encontrado'}), 404
+    return app.response_class(resultado[0]['detalle'], mimetype='application/json')
+
+
+@app.route('/torneo/<int:torneo_id>/jugadores', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+async def jugadores_en_torneo(torneo_id):
+    return jsonify(await ejecutar_sql(consultas.JUGADORES_EN_TORNEO, (torneo_id,)))
+
+
+@app.route('/torneo/<int:torneo_id>/rondas', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+async def rondas_torneo(torneo_id):
+    return await listar_paginado(consultas.LISTADO_RONDAS, (torneo_id,))
+
+
+@app.route('/torneo/<int:torneo_id>/rondas/<int:numero>', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+async def partidas_ronda(torneo_id, numero):
+    return await listar_paginado(consultas.LISTADO_PARTIDAS, (torneo_id, numero))
+
+
+# -------------------- Rutas Privadas --------------------
+@app.route('/usuario/perfil', methods=['GET'])
+@token_required
+async def perfil(usuario):
+    return jsonify({
+        "id": usuario['id'],
+        "nombre": usuario['nombre'],
+        "rol": usuario['rol'],
+        "email": usuario['email']
+    })
+
+
+@app.route('/equipo/salirse', methods=['POST'])
+@token_required
+async def salir_del_equipo(usuario):
+    return await ejecutar_operacion(consultas.SALIR_DEL_EQUIPO, usuario)
+
+
+@app.route('/equipo/unirse/<codigo>', methods=['POST'])
+@token_required
+async def unirse_equipo_por_codigo(usuario, codigo):
+    return await ejecutar_operacion(consultas.UNIRSE_EQUIPO_POR_CODIGO, usuario, codigo=codigo)
+
+
+@app.route('/inscribir/jugador', methods=['POST'])
+@token_required
+async def inscribir_jugador(usuario):
+    return await ejecutar_operacion(consultas.INSCRIBIR_JUGADOR, usuario)
+
+
+@app.route('/torneo/<int:torneo_id>/salir', methods=['POST'])
+@token_required
+async def salir_torneo(usuario, torneo_id):
+    return await ejecutar_operacion(consultas.SALIR_TORNEO, usuario, torneo_id=torneo_id)
+
+
+@app.route('/unirse/juego-individual', methods=['POST'])
+@token_required
+async def unirse_juego_individual(usuario):
+    return await ejecutar_operacion(consultas.UNIRSE_JUEGO_INDIVIDUAL, usuario)
+
+
+@app.route('/salir/juego-individual', methods=['POST'])
+@token_required
+async def salir_juego_individual(usuario):
+    return await ejecutar_operacion(consultas.SALIR_JUEGO_INDIVIDUAL, usuario)
+
+
+@app.route('/inscribir/equipo', methods=['POST'])
+@token_required
+async def inscribir_equipo(usuario):
+    return await ejecutar_operacion(consultas.INSCRIBIR_EQUIPO, usuario)
+
+
+@app.route('/unirse/juego-equipo', methods=['POST'])
+@token_required
+async def unirse_juego_equipo(usuario):
+    return await ejecutar_operacion(consultas.UNIRSE_JUEGO_EQUIPO, usuario)
+
+
+@app.route('/salir/juego-equipo', methods=['POST'])
+@token_required
+async def salir_juego_equipo(usuario):
+    return await ejecutar_operacion(consultas.SALIR_JUEGO_EQUIPO, usuario)
+
+
+@app.route('/torneo-equipo/<int:id_torneo>/salir', methods=['POST'])
+@token_required
+async def salir_torneo_equipo(usuario, id_torneo):
+    return await ejecutar_operacion(consultas.SALIR_TORNEO_EQUIPO, usuario, id_torneo=id_torneo)
@@ -0,0 +1,222 @@
+import logging
+import pickle
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Dependencia opcional: solo hace falta con CACHE_URL
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+FALTA = object()
+
+
+# -------------------- Caché en memoria (LRU + TTL) --------------------
+class CacheLocal:
+    """Caché en proceso con expiración por TTL y expulsión LRU.
+
+    Las claves se agrupan en espacios ('torneos', 'eventos'...) para poder
+    invalidar de una vez todo lo que depende de una misma tabla.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=300.0):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()  # (espacio, clave) -> (caduca, valor)
+        self._por_espacio = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def get(self, espacio, clave):
+        k = (espacio, clave)
+        with self._lock:
+            entrada = self._datos.get(k)
+            if entrada is None:
+                self.fallos += 1
+                return FALTA
+            caduca, valor = entrada
+            if caduca <= time.monotonic():
+                self._quitar(k)
+                self.fallos += 1
+                return FALTA
+            self._datos.move_to_end(k)
+            self.aciertos += 1
+            return valor
+
+    def set(self, espacio, clave, valor, ttl=None):
+        k = (espacio, clave)
+        caduca = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._datos[k] = (caduca, valor)
+            self._datos.move_to_end(k)
+            self._por_espacio.setdefault(espacio, set()).add(clave)
+            while len(self._datos) > self.max_entradas:
+                viejo, _ = self._datos.popitem(last=False)
+                self._desindexar(viejo)
+                self.expulsiones += 1
+
+    def borrar(self, espacio, clave):
+        with self._lock:
+            self._quitar((espacio, clave))
+
+    def invalidar(self, espacio):
+        with self._lock:
+            for clave in self._por_espacio.pop(espacio, ()):
+                self._datos.pop((espacio, clave), None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._por_espacio.clear()
+
+    def _quitar(self, k):
+        # Llamar con el lock tomado
+        if self._datos.pop(k, None) is not None:
+            self._desindexar(k)
+
+    def _desindexar(self, k):
+        espacio, clave = k
+        claves = self._por_espacio.get(espacio)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_espacio[espacio]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+            }
+
+
+# -------------------- Caché compartida (Redis) --------------------
+class CacheRedis:
+    """Misma interfaz que CacheLocal pero guardada en Redis, de modo que todos
+    los workers de gunicorn ven las mismas entradas e invalidaciones.
+
+    Redis se configura con maxmemory-policy allkeys-lru para la expulsión LRU.
+    """
+
+    def __init__(self, url, ttl=300.0, prefijo='esports'):
+        if redis is None:
+            raise RuntimeError('CACHE_URL requiere el paquete "redis" (pip install redis)')
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self._cliente = redis.Redis.from_url(url)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _clave(self, espacio, clave):
+        return f'{self.prefijo}:cache:{espacio}:{clave}'
+
+    def _indice(self, espacio):
+        return f'{self.prefijo}:cache:{espacio}:__claves__'
+
+    def get(self, espacio, clave):
+        try:
+            valor = self._cliente.get(self._clave(espacio, clave))
+        except redis.RedisError:
+            logger.exception("Error en la caché Redis")
+            valor = None
+        if valor is None:
+            self.fallos += 1
+            return FALTA
+        self.aciertos += 1
+        return pickle.loads(valor)
+
+    def set(self, espacio, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        k = self._clave(espacio, clave)
+        try:
+            pipe = self._cliente.pipeline()
+            pipe.set(k, pickle.dumps(valor), px=max(1, int(ttl * 1000)))
+            pipe.sadd(self._indice(espacio), k)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Error en la caché Redis")
+
+    def borrar(self, espacio, clave):
+        k = self._clave(espacio, clave)
+        try:
+            pipe = self._cliente.pipeline()
+            pipe.delete(k)
+            pipe.srem(self._indice(espacio), k)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Error en la caché Redis")
+
+    def invalidar(self, espacio):
+        indice = self._indice(espacio)
+        try:
+            claves = self._cliente.smembers(indice)
+            pipe = self._cliente.pipeline()
+            if claves:
+                pipe.delete(*claves)
+            pipe.delete(indice)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Error en la caché Redis")
+
+    def limpiar(self):
+        try:
+            claves = list(self._cliente.scan_iter(f'{self.prefijo}:cache:*'))
+            if claves:
+                self._cliente.delete(*claves)
+        except redis.RedisError:
+            logger.exception("Error en la caché Redis")
+
+    def estadisticas(self):
+        return {
+            'backend': 'redis',
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+        }
+
+
+# -------------------- Versiones de recursos (ETag) --------------------
+class Versiones:
+    """Versión opaca por espacio de caché, para ETag y Last-Modified.
+
+    Cada cambio en un espacio genera una versión nueva al azar, y también
+    cuando la anterior se pierde (caduca, se expulsa o se reinicia el proceso):
+    en esos casos el cliente recibe como mucho un 200 de más. Con un almacén
+    local cada worker tiene sus propias versiones, así que para ETag hace
+    falta uno compartido (CacheRedis).
+    """
+
+    def __init__(self, almacen):
+        self._almacen = almacen
+
+    def obtener(self, espacio):
+        """Devuelve (version, modificado, lsn) con modificado en segundos epoch.
+
+        `lsn` es la posición del WAL de la primaria tras el cambio (o None).
+        """
+        version = self._almacen.get('version', espacio)
+        if version is FALTA:
+            version = self.cambiar(espacio)
+        return version
+
+    def cambiar(self, espacio, lsn=None):
+        version = (secrets.token_hex(6), time.time(), lsn)
+        self._almacen.set('version', espacio, version)
+        return version
+
+
+def crear_cache(url=None, max_entradas=1024, ttl=300.0):
+    # Sin URL la caché es local al proceso; con CACHE_URL=redis://... es compartida
+    if url:
+        return CacheRedis(url, ttl=ttl)
+    return CacheLocal(max_entradas=max_entradas, ttl=ttl)
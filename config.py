@@ -0,0 +1,18 @@
+import os
+
+# -------------------- Base de datos --------------------
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': os.environ.get('DB_PORT', '5432'),
+    'database': os.environ.get('DB_NAME', 'EsportsCanarias'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', '1234'),
+}
+
+# Réplicas de solo lectura: DSN de libpq separados por ';', p. ej.
+# DB_REPLICAS="host=localhost port=5433 dbname=EsportsCanarias user=postgres password=1234"
+DB_REPLICAS = [dsn.strip() for dsn in os.environ.get('DB_REPLICAS', '').split(';') if dsn.strip()]
+
+# Segundos que las lecturas de quien acaba de escribir siguen yendo a la
+# primaria, para que vea sus cambios aunque la réplica vaya con retraso
+DB_VENTANA_PRIMARIA = float(os.environ.get('DB_VENTANA_PRIMARIA', 5))
@@ -0,0 +1,1006 @@
+"""Consultas y operaciones compartidas por la app WSGI (main.py) y la ASGI (asgi.py).
+
+Cada operación de inscripción o baja es una única sentencia SQL que informa
+de qué comprobación falló. Aquí están la validación de la entrada, la SQL y
+la traducción del resultado a (cuerpo, código HTTP), para que las dos apps
+respondan exactamente igual.
+"""
+from paginacion import Listado
+from preparadas import preparar
+
+
+class Rechazo(Exception):
+    """Entrada inválida: se responde con cuerpo y código sin tocar la base de datos."""
+
+    def __init__(self, cuerpo, estado=400):
+        super().__init__(cuerpo)
+        self.cuerpo = cuerpo
+        self.estado = estado
+
+
+class Operacion:
+    """- parametros(usuario, data, **ruta) -> dict de parámetros o lanza Rechazo.
+    - sql: una sola sentencia que devuelve una fila de comprobaciones.
+    - respuesta(fila, usuario) -> (cuerpo, código HTTP).
+    - error: prefijo del mensaje si la sentencia falla (500).
+    - invalida(params, fila) -> espacios de caché que quedan obsoletos si la
+      operación tiene éxito (código < 400).
+    - tipos: tipo PostgreSQL de cada parámetro; con ellos la sentencia se
+      ejecuta preparada en el servidor (ver preparadas.py).
+    - previa(membresia, params) -> (cuerpo, código) para rechazar sin ejecutar
+      la sentencia, o None. `membresia` es (id_equipo, es_fundador) del
+      usuario según la caché de main.py; la sentencia vuelve a comprobarlo.
+      Solo para la primera comprobación de la sentencia, para que el código
+      de error sea el mismo que sin caché.
+    - bloqueo: sentencia con los mismos parámetros que se ejecuta antes, en la
+      misma transacción, para serializar operaciones que comprueban filas que
+      la otra puede estar insertando. Tiene que ir aparte: con READ COMMITTED
+      cada sentencia toma su foto al empezar, y un bloqueo dentro de la propia
+      sentencia no le dejaría ver lo que confirmó la que esperaba.
+    """
+
+    def __init__(self, nombre, sql, parametros, respuesta, error, invalida=None, tipos=None,
+                 previa=None, bloqueo=None):
+        self.nombre = nombre
+        self.sql = preparar(nombre, sql, tipos) if tipos is not None else sql
+        self.parametros = parametros
+        self.respuesta = respuesta
+        self.error = error
+        self.invalida = invalida
+        self.previa = previa
+        self.bloqueo = bloqueo
+
+
+def espacio_torneo(torneo_id):
+    # Espacio de caché de /torneo/<id>/detalle
+    return f'torneo:{torneo_id}'
+
+
+def _invalida_torneo(params, fila):
+    return [espacio_torneo(params['id_torneo'])]
+
+
+PREFIJO_MEMBRESIA = 'membresia:'
+
+
+def espacio_membresia(id_usuario):
+    # Espacio de la caché de pertenencia a equipo (main.membresias)
+    return f'{PREFIJO_MEMBRESIA}{id_usuario}'
+
+# Equipo del usuario y si lo ha fundado. Si pertenece a varios (un fundador
+# puede crear otro equipo), primero el que ha fundado: así es_fundador = FALSE
+# significa que no ha fundado ninguno.
+MEMBRESIA = '''
+    SELECT ue.equipo_id, e.fundador = ue.usuario_id AS es_fundador
+    FROM "UsuarioEquipo" ue
+    JOIN "Equipo" e ON e.id_equipo = ue.equipo_id
+    WHERE ue.usuario_id = %s
+    ORDER BY es_fundador DESC, ue.equipo_id
+    LIMIT 1
+'''
+
+
+# -------------------- Lecturas --------------------
+LISTADO_TORNEOS = Listado(
+    desde='FROM "Torneo"',
+    columnas={c: c for c in ('id_torneo', 'nombre', 'fecha_inicio', 'fecha_fin',
+                             'ubicacion', 'id_evento', 'id_juego')},
+    orden=['fecha_inicio', 'id_torneo'],
+    descendente=True,
+    por_defecto='*',
+)
+
+LISTADO_EVENTOS = Listado(
+    desde='FROM "Evento"',
+    columnas={c: c for c in ('id_evento', 'nombre', 'tipo', 'año', 'mes')},
+    orden=['año', 'id_evento'],
+    descendente=True,
+    por_defecto='*',
+)
+
+LISTADO_EQUIPOS = Listado(
+    desde='FROM "Equipo"',
+    columnas={c: c for c in ('id_equipo', 'nombre', 'fundador', 'fecha_creacion',
+                             'codigo', 'victorias', 'derrotas')},
+    orden=['id_equipo'],
+    por_defecto='*',
+)
+
+# EXISTS en lugar de JOIN + DISTINCT: cada equipo sale una vez y se puede paginar por id
+LISTADO_EQUIPOS_POR_JUEGO = Listado(
+    desde='FROM "Equipo" e',
+    filtro='''EXISTS (
+        SELECT 1
+        FROM "EquipoTorneo" et
+        JOIN "Torneo" t ON et.id_torneo = t.id_torneo
+        WHERE et.equipo_id = e.id_equipo AND t.id_juego = %s
+    )''',
+    columnas={
+        'id_equipo': 'e.id_equipo',
+        'nombre': 'e.nombre',
+        'victorias': 'e.victorias',
+        'derrotas': 'e.derrotas',
+    },
+    orden=['id_equipo'],
+)
+
+LISTADO_JUGADORES_POR_JUEGO = Listado(
+    desde='FROM "Usuario" u JOIN "LigaIndividual" li ON u.id_usuario = li.id_usuario',
+    filtro='li.id_juego = %s',
+    columnas={'id_usuario': 'u.id_usuario', 'nombre': 'u.nombre'},
+    orden=['nombre', 'id_usuario'],
+)
+
+# /liga/<id_juego>/tabla: vista materializada "TablaLiga" (migración 0005)
+LISTADO_TABLA_LIGA = Listado(
+    desde='FROM "TablaLiga"',
+    filtro='id_juego = %s',
+    columnas={c: c for c in ('posicion', 'tipo', 'id_participante', 'nombre', 'puntos',
+                             'torneos', 'victorias', 'derrotas')},
+    orden=['posicion', 'id_participante'],
+)
+
+# -------------------- Búsqueda (migración 0007) --------------------
+# Primero los nombres que empiezan por el texto (en orden alfabético) y después,
+# con 3 o más caracteres, los parecidos por trigramas (del más al menos
+# parecido). Cada parte lee como mucho `limite` filas de su índice.
+BUSCAR = preparar('buscar', '''
+    WITH candidatos AS (
+        (SELECT 'equipo' AS tipo, id_equipo AS id, nombre, 0 AS grupo, 0::real AS distancia
+         FROM "Equipo"
+         WHERE %(equipos)s
+           AND lower(nombre) COLLATE "C" >= %(desde)s AND lower(nombre) COLLATE "C" < %(hasta)s
+         ORDER BY lower(nombre) COLLATE "C"
+         LIMIT %(limite)s)
+        UNION ALL
+        (SELECT 'equipo', id_equipo, nombre, 1, lower(nombre) <-> %(texto)s
+         FROM "Equipo"
+         WHERE %(equipos)s AND %(difusa)s AND lower(nombre) %% %(texto)s
+         ORDER BY lower(nombre) <-> %(texto)s
+         LIMIT %(limite)s)
+        UNION ALL
+        (SELECT 'jugador', id_usuario, nombre, 0, 0::real
+         FROM "Usuario"
+         WHERE %(jugadores)s
+           AND lower(nombre) COLLATE "C" >= %(desde)s AND lower(nombre) COLLATE "C" < %(hasta)s
+         ORDER BY lower(nombre) COLLATE "C"
+         LIMIT %(limite)s)
+        UNION ALL
+        (SELECT 'jugador', id_usuario, nombre, 1, lower(nombre) <-> %(texto)s
+         FROM "Usuario"
+         WHERE %(jugadores)s AND %(difusa)s AND lower(nombre) %% %(texto)s
+         ORDER BY lower(nombre) <-> %(texto)s
+         LIMIT %(limite)s)
+    )
+    SELECT tipo, id, nombre
+    FROM (
+        SELECT DISTINCT ON (tipo, id) tipo, id, nombre, grupo, distancia
+        FROM candidatos
+        ORDER BY tipo, id, grupo
+    ) c
+    ORDER BY grupo, distancia, lower(nombre), tipo, id
+    LIMIT %(limite)s
+''', {'equipos': 'boolean', 'jugadores': 'boolean', 'desde': 'text', 'hasta': 'text',
+      'texto': 'text', 'difusa': 'boolean', 'limite': 'int'})
+
+
+# -------------------- Rondas (cuadros.py, migración 0006) --------------------
+LISTADO_RONDAS = Listado(
+    desde='FROM "Ronda"',
+    filtro='id_torneo = %s',
+    columnas={c: c for c in ('numero', 'formato', 'partidas', 'creada')},
+    orden=['numero'],
+)
+
+LISTADO_PARTIDAS = Listado(
+    desde='''
+        FROM "Partida" p
+        JOIN "Torneo" t ON t.id_torneo = p.id_torneo
+        JOIN "Juego" j ON j.id_juego = t.id_juego
+        LEFT JOIN "Equipo" ea ON NOT j.es_individual AND ea.id_equipo = p.participante_a
+        LEFT JOIN "Usuario" ua ON j.es_individual AND ua.id_usuario = p.participante_a
+        LEFT JOIN "Equipo" eb ON NOT j.es_individual AND eb.id_equipo = p.participante_b
+        LEFT JOIN "Usuario" ub ON j.es_individual AND ub.id_usuario = p.participante_b
+    ''',
+    filtro='p.id_torneo = %s AND p.ronda = %s',
+    columnas={
+        'mesa': 'p.mesa',
+        'cuadro': 'p.cuadro',
+        'participante_a': 'p.participante_a',
+        'nombre_a': 'COALESCE(ea.nombre, ua.nombre)',
+        'participante_b': 'p.participante_b',
+        'nombre_b': 'COALESCE(eb.nombre, ub.nombre)',
+        'ganador': 'p.ganador',
+    },
+    orden=['mesa'],
+)
+
+# El FOR UPDATE hace que dos rondas del mismo torneo no se generen a la vez
+BLOQUEAR_TORNEO = '''
+    SELECT j.es_individual
+    FROM "Torneo" t JOIN "Juego" j ON j.id_juego = t.id_juego
+    WHERE t.id_torneo = %s
+    FOR UPDATE OF t
+'''
+
+# Serializa los resultados de un torneo (POST /torneo/<id>/resultados): con
+# READ COMMITTED, dos sumas a la vez partirían de la misma foto y una pisaría
+# a la otra. FOR NO KEY UPDATE espera a BLOQUEAR_TORNEO y a otros resultados,
+# pero no a las claves ajenas de las inscripciones (solo toman FOR KEY SHARE);
+# estas esperan después, al recalcular las posiciones (migración 0008).
+BLOQUEAR_RESULTADOS = '''
+    SELECT id_torneo FROM "Torneo" WHERE id_torneo = %s FOR NO KEY UPDATE
+'''
+
+# Una sola sentencia: suma los puntos y recalcula la posición de todo el
+# torneo con RANK(). Si algún participante no está inscrito no se aplica nada.
+# Los empates comparten posición y se listan por orden de inscripción.
+# Al inscribirse o salir, el disparador de la migración 0008 recalcula las
+# posiciones con el mismo RANK().
+REGISTRAR_RESULTADOS = '''
+    WITH t AS (
+        SELECT id_torneo FROM "Torneo" WHERE id_torneo = %(id_torneo)s
+    ),
+    entrada AS (
+        SELECT * FROM unnest(%(equipos)s::int[], %(usuarios)s::int[], %(puntos)s::int[])
+            AS e(id_equipo, id_usuario, puntos)
+    ),
+    coincidencias AS (
+        SELECT e.id_equipo, e.id_usuario, e.puntos, c.id_clasificacion
+        FROM entrada e
+        LEFT JOIN "Clasificacion" c
+          ON c.id_torneo = %(id_torneo)s
+         AND c.id_equipo IS NOT DISTINCT FROM e.id_equipo
+         AND c.id_usuario IS NOT DISTINCT FROM e.id_usuario
+    ),
+    faltan AS (
+        SELECT id_equipo, id_usuario FROM coincidencias WHERE id_clasificacion IS NULL
+    ),
+    sumas AS (
+        SELECT id_clasificacion, SUM(puntos) AS puntos
+        FROM coincidencias
+        WHERE id_clasificacion IS NOT NULL
+        GROUP BY id_clasificacion
+    ),
+    nuevas AS (
+        SELECT c.id_clasificacion,
+               c.puntos + COALESCE(s.puntos, 0) AS puntos,
+               RANK() OVER (ORDER BY c.puntos + COALESCE(s.puntos, 0) DESC) AS posicion
+        FROM "Clasificacion" c
+        LEFT JOIN sumas s ON s.id_clasificacion = c.id_clasificacion
+        WHERE c.id_torneo = %(id_torneo)s
+    ),
+    act AS (
+        UPDATE "Clasificacion" c
+        SET puntos = n.puntos, posicion = n.posicion
+        FROM nuevas n
+        WHERE c.id_clasificacion = n.id_clasificacion
+          AND (c.puntos, c.posicion) IS DISTINCT FROM (n.puntos, n.posicion)
+          AND NOT EXISTS (SELECT 1 FROM faltan)
+        RETURNING c.id_clasificacion
+    )
+    SELECT EXISTS (SELECT 1 FROM t) AS torneo_existe,
+           (SELECT json_agg(json_build_object('id_equipo', id_equipo, 'id_usuario', id_usuario))
+            FROM faltan) AS no_inscritos,
+           (SELECT count(*) FROM act) AS actualizadas
+'''
+
+# El mismo bloqueo para salir de un torneo (Operacion.bloqueo). Sin él, la
+# salida borraría su fila de "Clasificacion" y el disparador de 0008
+# esperaría al torneo, mientras REGISTRAR_RESULTADOS, con el torneo ya
+# bloqueado, esperaría a esa fila: un interbloqueo.
+BLOQUEAR_SALIDA_TORNEO = '''
+    SELECT id_torneo FROM "Torneo" WHERE id_torneo = %(id_torneo)s FOR NO KEY UPDATE
+'''
+
+# Inscritos de más a menos puntos, por es_individual del juego
+PARTICIPANTES_RONDA = {
+    False: '''
+        SELECT et.equipo_id AS participante
+        FROM "EquipoTorneo" et
+        LEFT JOIN "Clasificacion" c ON c.id_torneo = et.id_torneo AND c.id_equipo = et.equipo_id
+        WHERE et.id_torneo = %s
+        ORDER BY COALESCE(c.puntos, 0) DESC, et.equipo_id
+    ''',
+    True: '''
+        SELECT ut.usuario_id AS participante
+        FROM "UsuarioTorneo" ut
+        LEFT JOIN "Clasificacion" c ON c.id_torneo = ut.id_torneo AND c.id_usuario = ut.usuario_id
+        WHERE ut.id_torneo = %s
+        ORDER BY COALESCE(c.puntos, 0) DESC, ut.usuario_id
+    ''',
+}
+
+INSERTAR_RONDA = 'INSERT INTO "Ronda" (id_torneo, numero, formato, partidas) VALUES (%s, %s, %s, %s)'
+
+INSERTAR_PARTIDAS = '''
+    INSERT INTO "Partida" (id_torneo, ronda, mesa, cuadro, participante_a, participante_b, ganador)
+    VALUES %s
+'''
+
+ULTIMA_RONDA = '''
+    SELECT numero, formato FROM "Ronda"
+    WHERE id_torneo = %s
+    ORDER BY numero DESC
+    LIMIT 1
+'''
+
+HISTORIAL_PARTIDAS = '''
+    SELECT ronda, mesa, cuadro, participante_a, participante_b, ganador
+    FROM "Partida"
+    WHERE id_torneo = %s
+    ORDER BY ronda, mesa
+'''
+
+# Todas las mesas deben existir, no ser exentas y tener como ganador a uno de
+# sus dos participantes; si alguna falla no se actualiza ninguna. Tampoco se
+# cambia una ronda de la que ya se ha generado la siguiente (antes se toma
+# BLOQUEAR_RESULTADOS, que espera a una generación en curso).
+RESULTADOS_RONDA = '''
+    WITH entrada AS (
+        SELECT * FROM unnest(%(mesas)s::int[], %(ganadores)s::int[]) AS e(mesa, ganador)
+    ),
+    siguiente AS (
+        SELECT 1 FROM "Ronda" WHERE id_torneo = %(id_torneo)s AND numero > %(ronda)s LIMIT 1
+    ),
+    invalidas AS (
+        SELECT e.mesa
+        FROM entrada e
+        LEFT JOIN "Partida" p
+          ON p.id_torneo = %(id_torneo)s AND p.ronda = %(ronda)s AND p.mesa = e.mesa
+        WHERE p.mesa IS NULL OR p.participante_b IS NULL
+           OR e.ganador NOT IN (p.participante_a, p.participante_b)
+    ),
+    act AS (
+        UPDATE "Partida" p
+        SET ganador = e.ganador
+        FROM entrada e
+        WHERE p.id_torneo = %(id_torneo)s AND p.ronda = %(ronda)s AND p.mesa = e.mesa
+          AND NOT EXISTS (SELECT 1 FROM invalidas)
+          AND NOT EXISTS (SELECT 1 FROM siguiente)
+        RETURNING p.mesa
+    )
+    SELECT EXISTS (SELECT 1 FROM siguiente) AS cerrada,
+           (SELECT array_agg(mesa ORDER BY mesa) FROM invalidas) AS invalidas,
+           (SELECT count(*) FROM act) AS actualizadas
+'''
+
+JUEGOS = {
+    'equipo': 'SELECT * FROM "Juego" WHERE es_individual = FALSE',
+    'individual': 'SELECT * FROM "Juego" WHERE es_individual = TRUE',
+    None: 'SELECT * FROM "Juego"',
+}
+
+TORNEOS_POR_JUEGO = preparar('torneos_por_juego', '''
+        SELECT * FROM "Torneo"
+        WHERE id_juego = %s
+        ORDER BY fecha_inicio DESC
+''', ('int',))
+
+TORNEOS_COMPLETOS = '''
+        SELECT t.id_torneo, t.nombre, t.fecha_inicio, t.fecha_fin, t.ubicacion,
+               e.id_evento, e.nombre AS nombre_evento
+        FROM "Torneo" t
+        LEFT JOIN "Evento" e ON t.id_evento = e.id_evento
+        WHERE t.id_juego = %s
+        ORDER BY t.fecha_inicio DESC
+'''
+
+TORNEOS_POR_EVENTO = '''
+        SELECT t.id_torneo, t.nombre, t.fecha_inicio, t.fecha_fin, t.ubicacion,
+               e.id_evento, e.nombre AS nombre_evento, t.id_juego
+        FROM "Torneo" t
+        LEFT JOIN "Evento" e ON t.id_evento = e.id_evento
+        WHERE t.id_evento = %s
+        ORDER BY t.fecha_inicio DESC
+'''
+
+CLASIFICACION_TORNEO = preparar('clasificacion_torneo', '''
+        SELECT c.id_clasificacion, c.puntos, c.posicion,
+               u.nombre AS usuario, eq.nombre AS equipo
+        FROM "Clasificacion" c
+        LEFT JOIN "Usuario" u ON c.id_usuario = u.id_usuario
+        LEFT JOIN "Equipo" eq ON c.id_equipo = eq.id_equipo
+        WHERE c.id_torneo = %s
+        ORDER BY c.posicion ASC NULLS LAST, c.id_clasificacion ASC
+''', ('int',))
+
+EQUIPOS_EN_TORNEO = preparar('equipos_en_torneo', '''
+        SELECT e.id_equipo, e.nombre
+        FROM "EquipoTorneo" et
+        JOIN "Equipo" e ON et.equipo_id = e.id_equipo
+        WHERE et.id_torneo = %s
+''', ('int',))
+
+JUGADORES_EN_TORNEO = preparar('jugadores_en_torneo', '''
+        SELECT u.id_usuario, u.nombre
+        FROM "UsuarioTorneo" ut
+        JOIN "Usuario" u ON ut.usuario_id = u.id_usuario
+        WHERE ut.id_torneo = %s
+''', ('int',))
+
+
+# Torneo, evento, juego, inscritos y clasificación en un único documento JSON
+# construido por PostgreSQL; se devuelve tal cual, sin pasar por Python
+# Fechas en el formato HTTP de Flask (serializacion._por_defecto), como en
+# /torneos y /torneos/completos: json_build_object las daría en ISO. Sin el
+# prefijo TM, Dy y Mon salen siempre en inglés
+FECHA_HTTP = 'Dy, DD Mon YYYY "00:00:00 GMT"'
+
+DETALLE_TORNEO = preparar('detalle_torneo', f'''
+        SELECT json_build_object(
+            'torneo', json_build_object(
+                'id_torneo', t.id_torneo, 'nombre', t.nombre,
+                'fecha_inicio', to_char(t.fecha_inicio, '{FECHA_HTTP}'),
+                'fecha_fin', to_char(t.fecha_fin, '{FECHA_HTTP}'),
+                'ubicacion', t.ubicacion
+            ),
+            'juego', (
+                SELECT json_build_object('id_juego', j.id_juego, 'nombre', j.nombre,
+                                         'es_individual', j.es_individual)
+                FROM "Juego" j WHERE j.id_juego = t.id_juego
+            ),
+            'evento', (
+                SELECT json_build_object('id_evento', e.id_evento, 'nombre', e.nombre,
+                                         'tipo', e.tipo, 'año', e.año, 'mes', e.mes)
+                FROM "Evento" e WHERE e.id_evento = t.id_evento
+            ),
+            'equipos', COALESCE((
+                SELECT json_agg(json_build_object('id_equipo', e.id_equipo, 'nombre', e.nombre)
+                                ORDER BY e.id_equipo)
+                FROM "EquipoTorneo" et
+                JOIN "Equipo" e ON e.id_equipo = et.equipo_id
+                WHERE et.id_torneo = t.id_torneo
+            ), '[]'),
+            'jugadores', COALESCE((
+                SELECT json_agg(json_build_object('id_usuario', u.id_usuario, 'nombre', u.nombre)
+                                ORDER BY u.id_usuario)
+                FROM "UsuarioTorneo" ut
+                JOIN "Usuario" u ON u.id_usuario = ut.usuario_id
+                WHERE ut.id_torneo = t.id_torneo
+            ), '[]'),
+            'clasificacion', COALESCE((
+                SELECT json_agg(json_build_object(
+                           'id_clasificacion', c.id_clasificacion, 'puntos', c.puntos,
+                           'posicion', c.posicion, 'id_equipo', c.id_equipo,
+                           'equipo', eq.nombre, 'id_usuario', c.id_usuario, 'usuario', u.nombre)
+                       ORDER BY c.posicion ASC NULLS LAST, c.id_clasificacion ASC)
+                FROM "Clasificacion" c
+                LEFT JOIN "Usuario" u ON c.id_usuario = u.id_usuario
+                LEFT JOIN "Equipo" eq ON c.id_equipo = eq.id_equipo
+                WHERE c.id_torneo = t.id_torneo
+            ), '[]')
+        )::text AS detalle
+        FROM "Torneo" t
+        WHERE t.id_torneo = %s
+''', ('int',))
+
+
+# -------------------- Consultas preparadas sueltas --------------------
+USUARIO_POR_EMAIL = preparar('usuario_por_email', 'SELECT * FROM "Usuario" WHERE email = %s', ('text',))
+
+EQUIPO_POR_CODIGO = preparar('equipo_por_codigo', '''
+        SELECT id_equipo, nombre, victorias, derrotas, fundador, fecha_creacion, codigo
+        FROM "Equipo"
+        WHERE codigo = %s
+''', ('text',))
+
+
+# -------------------- Inscripciones en torneos --------------------
+def _param_inscribir_jugador(usuario, data):
+    if not data:
+        raise Rechazo({'error': 'JSON inválido o no enviado'})
+    id_torneo = data.get('id_torneo')
+    if not id_torneo:
+        raise Rechazo({'error': 'Falta id_torneo'})
+    return {'id_torneo': id_torneo, 'id_usuario': usuario['id']}
+
+
+def _resp_inscribir_jugador(r, usuario):
+    if not r['torneo_existe']:
+        return {'error': 'Torneo no encontrado'}, 404
+    if not r['es_individual']:
+        return {'error': 'Este torneo no es para jugadores individuales'}, 403
+    if not r['insertado']:
+        return {'error': 'Jugador ya inscrito en este torneo'}, 405
+    return {'mensaje': 'Jugador inscrito en torneo'}, 201
+
+
+# Comprobaciones e inserción (UsuarioTorneo + Clasificacion) en una sola sentencia
+INSCRIBIR_JUGADOR = Operacion(
+    'inscribir_jugador',
+    sql='''
+        WITH t AS (
+            SELECT t.id_torneo, j.es_individual
+            FROM "Torneo" t
+            LEFT JOIN "Juego" j ON j.id_juego = t.id_juego
+            WHERE t.id_torneo = %(id_torneo)s
+        ),
+        ins AS (
+            INSERT INTO "UsuarioTorneo" (usuario_id, id_torneo)
+            SELECT %(id_usuario)s, t.id_torneo FROM t
+            WHERE t.es_individual
+              AND NOT EXISTS (
+                  SELECT 1 FROM "UsuarioTorneo"
+                  WHERE usuario_id = %(id_usuario)s AND id_torneo = t.id_torneo
+              )
+            ON CONFLICT DO NOTHING
+            RETURNING id_torneo
+        ),
+        cla AS (
+            INSERT INTO "Clasificacion" (id_torneo, id_equipo, id_usuario, puntos, posicion)
+            SELECT id_torneo, NULL, %(id_usuario)s, 0, NULL FROM ins
+        )
+        SELECT EXISTS (SELECT 1 FROM t) AS torneo_existe,
+               COALESCE((SELECT es_individual FROM t), FALSE) AS es_individual,
+               EXISTS (SELECT 1 FROM ins) AS insertado
+    ''',
+    parametros=_param_inscribir_jugador,
+    respuesta=_resp_inscribir_jugador,
+    error='Error al inscribir jugador',
+    invalida=_invalida_torneo,
+    tipos={'id_torneo': 'int', 'id_usuario': 'int'},
+)
+
+
+def _param_salir_torneo(usuario, data, torneo_id):
+    return {'id_torneo': torneo_id, 'id_usuario': usuario['id']}
+
+
+def _resp_salir_torneo(r, usuario):
+    if not r['torneo_existe']:
+        return {'error': 'Torneo no encontrado'}, 404
+    if not r['borrado']:
+        return {'error': 'No estás inscrito en este torneo'}, 400
+    return {'mensaje': 'Saliste del torneo correctamente'}, 200
+
+
+SALIR_TORNEO = Operacion(
+    'salir_torneo',
+    sql='''
+        WITH t AS (
+            SELECT id_torneo FROM "Torneo" WHERE id_torneo = %(id_torneo)s
+        ),
+        del AS (
+            DELETE FROM "UsuarioTorneo" ut
+            USING t
+            WHERE ut.usuario_id = %(id_usuario)s AND ut.id_torneo = t.id_torneo
+            RETURNING ut.id_torneo
+        ),
+        cla AS (
+            DELETE FROM "Clasificacion" c
+            USING del
+            WHERE c.id_usuario = %(id_usuario)s AND c.id_torneo = del.id_torneo
+        )
+        SELECT EXISTS (SELECT 1 FROM t) AS torneo_existe,
+               EXISTS (SELECT 1 FROM del) AS borrado
+    ''',
+    parametros=_param_salir_torneo,
+    respuesta=_resp_salir_torneo,
+    error='Error al salir del torneo',
+    invalida=_invalida_torneo,
+    tipos={'id_torneo': 'int', 'id_usuario': 'int'},
+    bloqueo=BLOQUEAR_SALIDA_TORNEO,
+)
+
+
+def _param_inscribir_equipo(usuario, data):
+    data = data or {}
+    id_torneo = data.get('id_torneo')
+    id_equipo = data.get('id_equipo')
+    if not id_torneo or not id_equipo:
+        raise Rechazo({'error': 'Faltan datos obligatorios (id_torneo, id_equipo)'})
+    return {'id_torneo': id_torneo, 'id_equipo': id_equipo, 'id_usuario': usuario['id']}
+
+
+def _resp_inscribir_equipo(r, usuario):
+    if not r['torneo_existe']:
+        return {'error': 'Torneo no encontrado'}, 404
+    if r['es_individual'] is not False:
+        return {'error': 'Este torneo no es para equipos'}, 400
+    if not r['equipo_existe']:
+        return {'error': 'Equipo no encontrado'}, 404
+    if r['fundador'] != usuario['id']:
+        return {'error': 'Solo el fundador del equipo puede inscribirlo'}, 403
+    if not r['insertado']:
+        return {'error': 'El equipo ya está inscrito en este torneo'}, 400
+    return {'mensaje': 'Equipo inscrito en torneo'}, 200
+
+
+# Comprobaciones e inserción (EquipoTorneo + Clasificacion) en una sola sentencia
+INSCRIBIR_EQUIPO = Operacion(
+    'inscribir_equipo',
+    sql='''
+        WITH t AS (
+            SELECT t.id_torneo, j.es_individual
+            FROM "Torneo" t
+            LEFT JOIN "Juego" j ON j.id_juego = t.id_juego
+            WHERE t.id_torneo = %(id_torneo)s
+        ),
+        e AS (
+            SELECT id_equipo, fundador FROM "Equipo" WHERE id_equipo = %(id_equipo)s
+        ),
+        ins AS (
+            INSERT INTO "EquipoTorneo" (equipo_id, id_torneo)
+            SELECT e.id_equipo, t.id_torneo FROM t, e
+            WHERE t.es_individual = FALSE
+              AND e.fundador = %(id_usuario)s
+              AND NOT EXISTS (
+                  SELECT 1 FROM "EquipoTorneo"
+                  WHERE equipo_id = e.id_equipo AND id_torneo = t.id_torneo
+              )
+            ON CONFLICT DO NOTHING
+            RETURNING equipo_id, id_torneo
+        ),
+        cla AS (
+            INSERT INTO "Clasificacion" (id_torneo, id_equipo, id_usuario, puntos, posicion)
+            SELECT id_torneo, equipo_id, NULL, 0, NULL FROM ins
+        )
+        SELECT EXISTS (SELECT 1 FROM t) AS torneo_existe,
+               (SELECT es_individual FROM t) AS es_individual,
+               EXISTS (SELECT 1 FROM e) AS equipo_existe,
+               (SELECT fundador FROM e) AS fundador,
+               EXISTS (SELECT 1 FROM ins) AS insertado
+    ''',
+    parametros=_param_inscribir_equipo,
+    respuesta=_resp_inscribir_equipo,
+    error='Error al inscribir equipo',
+    invalida=_invalida_torneo,
+    tipos={'id_torneo': 'int', 'id_equipo': 'int', 'id_usuario': 'int'},
+)
+
+
+def _param_salir_torneo_equipo(usuario, data, id_torneo):
+    id_equipo = (data or {}).get('id_equipo')
+    if not id_equipo:
+        raise Rechazo({'error': 'Falta id_equipo'})
+    return {'id_torneo': id_torneo, 'id_equipo': id_equipo, 'id_usuario': usuario['id']}
+
+
+def _resp_salir_torneo_equipo(r, usuario):
+    if not r['torneo_existe']:
+        return {'error': 'Torneo no encontrado'}, 404
+    if not r['equipo_existe']:
+        return {'error': 'Equipo no encontrado'}, 404
+    if r['fundador'] != usuario['id']:
+        return {'error': 'Solo el fundador del equipo puede retirarlo del torneo'}, 403
+    if not r['borrado']:
+        return {'error': 'El equipo no está inscrito en este torneo'}, 400
+    return {'mensaje': 'El equipo ha salido del torneo correctamente'}, 200
+
+
+SALIR_TORNEO_EQUIPO = Operacion(
+    'salir_torneo_equipo',
+    sql='''
+        WITH t AS (
+            SELECT id_torneo FROM "Torneo" WHERE id_torneo = %(id_torneo)s
+        ),
+        e AS (
+            SELECT id_equipo, fundador FROM "Equipo" WHERE id_equipo = %(id_equipo)s
+        ),
+        del AS (
+            DELETE FROM "EquipoTorneo" et
+            USING t, e
+            WHERE e.fundador = %(id_usuario)s
+              AND et.equipo_id = e.id_equipo AND et.id_torneo = t.id_torneo
+            RETURNING et.equipo_id, et.id_torneo
+        ),
+        cla AS (
+            DELETE FROM "Clasificacion" c
+            USING del
+            WHERE c.id_equipo = del.equipo_id AND c.id_torneo = del.id_torneo
+        )
+        SELECT EXISTS (SELECT 1 FROM t) AS torneo_existe,
+               EXISTS (SELECT 1 FROM e) AS equipo_existe,
+               (SELECT fundador FROM e) AS fundador,
+               EXISTS (SELECT 1 FROM del) AS borrado
+    ''',
+    parametros=_param_salir_torneo_equipo,
+    respuesta=_resp_salir_torneo_equipo,
+    error='Error al salir del torneo',
+    invalida=_invalida_torneo,
+    tipos={'id_torneo': 'int', 'id_equipo': 'int', 'id_usuario': 'int'},
+    bloqueo=BLOQUEAR_SALIDA_TORNEO,
+)
+
+
+# -------------------- Ligas por juego --------------------
+def _param_juego_individual(usuario, data):
+    if not data or 'id_juego' not in data:
+        raise Rechazo({'error': 'Falta id_juego'})
+    return {'id_juego': data['id_juego'], 'id_usuario': usuario['id']}
+
+
+def _resp_unirse_juego_individual(r, usuario):
+    if not r['juego_existe']:
+        return {'error': 'Juego no encontrado'}, 404
+    if not r['es_individual']:
+        return {'error': 'El juego no es individual'}, 400
+    if not r['insertado']:
+        return {'error': 'Ya estás inscrito en este juego individual'}, 409
+    return {'mensaje': 'Inscripción al juego individual realizada correctamente'}, 201
+
+
+UNIRSE_JUEGO_INDIVIDUAL = Operacion(
+    'unirse_juego_individual',
+    sql='''
+        WITH j AS (
+            SELECT id_juego, es_individual FROM "Juego" WHERE id_juego = %(id_juego)s
+        ),
+        ins AS (
+            INSERT INTO "LigaIndividual" (id_usuario, id_juego)
+            SELECT %(id_usuario)s, j.id_juego FROM j
+            WHERE j.es_individual
+              AND NOT EXISTS (
+                  SELECT 1 FROM "LigaIndividual"
+                  WHERE id_usuario = %(id_usuario)s AND id_juego = j.id_juego
+              )
+            ON CONFLICT DO NOTHING
+            RETURNING id_juego
+        )
+        SELECT EXISTS (SELECT 1 FROM j) AS juego_existe,
+               COALESCE((SELECT es_individual FROM j), FALSE) AS es_individual,
+               EXISTS (SELECT 1 FROM ins) AS insertado
+    ''',
+    parametros=_param_juego_individual,
+    respuesta=_resp_unirse_juego_individual,
+    error='Error al inscribirse en el juego individual',
+    tipos={'id_juego': 'int', 'id_usuario': 'int'},
+)
+
+
+def _resp_salir_juego_individual(r, usuario):
+    if not r['juego_existe']:
+        return {'error': 'Juego no encontrado'}, 404
+    if not r['es_individual']:
+        return {'error': 'El juego no es individual'}, 400
+    if not r['borrado']:
+        return {'error': 'No estás inscrito en este juego individual'}, 409
+    return {'mensaje': 'Has salido correctamente del juego individual'}, 200
+
+
+SALIR_JUEGO_INDIVIDUAL = Operacion(
+    'salir_juego_individual',
+    sql='''
+        WITH j AS (
+            SELECT id_juego, es_individual FROM "Juego" WHERE id_juego = %(id_juego)s
+        ),
+        del AS (
+            DELETE FROM "LigaIndividual" li
+            USING j
+            WHERE j.es_individual AND li.id_usuario = %(id_usuario)s AND li.id_juego = j.id_juego
+            RETURNING li.id_juego
+        )
+        SELECT EXISTS (SELECT 1 FROM j) AS juego_existe,
+               COALESCE((SELECT es_individual FROM j), FALSE) AS es_individual,
+               EXISTS (SELECT 1 FROM del) AS borrado
+    ''',
+    parametros=_param_juego_individual,
+    respuesta=_resp_salir_juego_individual,
+    error='Error al salir del juego individual',
+    tipos={'id_juego': 'int', 'id_usuario': 'int'},
+)
+
+
+def _param_unirse_juego_equipo(usuario, data):
+    data = data or {}
+    id_juego = data.get('id_juego')
+    id_equipo = data.get('id_equipo')
+    if not id_juego or not id_equipo:
+        raise Rechazo({'error': 'Faltan datos obligatorios (id_juego, id_equipo)'})
+    return {'id_juego': id_juego, 'id_equipo': id_equipo, 'id_usuario': usuario.get('id')}
+
+
+def _resp_unirse_juego_equipo(r, usuario):
+    if not r['juego_existe']:
+        return {'error': 'Juego no encontrado'}, 404
+    if r['es_individual']:
+        return {'error': 'Este juego no es para equipos'}, 400
+    if not r['equipo_existe']:
+        return {'error': 'Equipo no encontrado'}, 404
+    if r['fundador'] != usuario.get('id'):
+        return {'error': 'Solo el fundador del equipo puede unirlo a una liga'}, 403
+    if not r['insertado']:
+        return {'error': 'Este equipo ya está inscrito en la liga de este juego'}, 409
+    return {'mensaje': 'Equipo inscrito en la liga correctamente'}, 201
+
+
+UNIRSE_JUEGO_EQUIPO = Operacion(
+    'unirse_juego_equipo',
+    sql='''
+        WITH j AS (
+            SELECT id_juego, es_individual FROM "Juego" WHERE id_juego = %(id_juego)s
+        ),
+        e AS (
+            SELECT id_equipo, fundador FROM "Equipo" WHERE id_equipo = %(id_equipo)s
+        ),
+        ins AS (
+            INSERT INTO "LigaEquipo" (id_equipo, id_juego)
+            SELECT e.id_equipo, j.id_juego FROM j, e
+            WHERE j.es_individual = FALSE
+              AND e.fundador = %(id_usuario)s
+              AND NOT EXISTS (
+                  SELECT 1 FROM "LigaEquipo"
+                  WHERE id_equipo = e.id_equipo AND id_juego = j.id_juego
+              )
+            ON CONFLICT DO NOTHING
+            RETURNING id_equipo
+        )
+        SELECT EXISTS (SELECT 1 FROM j) AS juego_existe,
+               (SELECT es_individual FROM j) AS es_individual,
+               EXISTS (SELECT 1 FROM e) AS equipo_existe,
+               (SELECT fundador FROM e) AS fundador,
+               EXISTS (SELECT 1 FROM ins) AS insertado
+    ''',
+    parametros=_param_unirse_juego_equipo,
+    respuesta=_resp_unirse_juego_equipo,
+    error='Error al inscribir equipo en la liga',
+    tipos={'id_juego': 'int', 'id_equipo': 'int', 'id_usuario': 'int'},
+)
+
+
+def _param_salir_juego_equipo(usuario, data):
+    if not data or 'id_juego' not in data or 'id_equipo' not in data:
+        raise Rechazo({'error': 'Faltan datos (id_juego, id_equipo)'})
+    return {'id_juego': data['id_juego'], 'id_equipo': data['id_equipo'], 'id_usuario': usuario['id']}
+
+
+def _resp_salir_juego_equipo(r, usuario):
+    if not r['juego_existe']:
+        return {'error': 'Juego no encontrado'}, 404
+    if r['es_individual']:
+        return {'error': 'El juego no es para equipos'}, 400
+    if not r['equipo_existe']:
+        return {'error': 'Equipo no encontrado'}, 404
+    if r['fundador'] != usuario['id']:
+        return {'error': 'Solo el fundador del equipo puede retirarlo de la liga'}, 403
+    if not r['borrado']:
+        return {'error': 'El equipo no está inscrito en este juego'}, 409
+    return {'mensaje': 'El equipo ha salido correctamente de la liga'}, 200
+
+
+SALIR_JUEGO_EQUIPO = Operacion(
+    'salir_juego_equipo',
+    sql='''
+        WITH j AS (
+            SELECT id_juego, es_individual FROM "Juego" WHERE id_juego = %(id_juego)s
+        ),
+        e AS (
+            SELECT id_equipo, fundador FROM "Equipo" WHERE id_equipo = %(id_equipo)s
+        ),
+        del AS (
+            DELETE FROM "LigaEquipo" le
+            USING j, e
+            WHERE j.es_individual = FALSE
+              AND e.fundador = %(id_usuario)s
+              AND le.id_equipo = e.id_equipo AND le.id_juego = j.id_juego
+            RETURNING le.id_equipo
+        )
+        SELECT EXISTS (SELECT 1 FROM j) AS juego_existe,
+               (SELECT es_individual FROM j) AS es_individual,
+               EXISTS (SELECT 1 FROM e) AS equipo_existe,
+               (SELECT fundador FROM e) AS fundador,
+               EXISTS (SELECT 1 FROM del) AS borrado
+    ''',
+    parametros=_param_salir_juego_equipo,
+    respuesta=_resp_salir_juego_equipo,
+    error='Error al salir del juego de equipos',
+    tipos={'id_juego': 'int', 'id_equipo': 'int', 'id_usuario': 'int'},
+)
+
+
+# -------------------- Equipos --------------------
+def _param_unirse_equipo(usuario, data, codigo):
+    return {'codigo': codigo, 'id_usuario': usuario['id']}
+
+
+def _resp_unirse_equipo(r, usuario):
+    if not r['equipo_existe']:
+        return {'mensaje': 'Código de equipo no válido'}, 404
+    if not r['insertado']:
+        return {'mensaje': 'Ya perteneces a un equipo'}, 400
+    return {'mensaje': 'Te has unido al equipo correctamente'}, 200
+
+
+def _invalida_unirse_equipo(params, fila):
+    return [espacio_membresia(params['id_usuario'])]
+
+
+# Dos uniones a la vez del mismo usuario: la segunda espera a la primera y
+# ya ve su fila en "UsuarioEquipo" (ver Operacion.bloqueo)
+BLOQUEAR_USUARIO = '''
+    SELECT id_usuario FROM "Usuario" WHERE id_usuario = %(id_usuario)s FOR NO KEY UPDATE
+'''
+
+
+UNIRSE_EQUIPO_POR_CODIGO = Operacion(
+    'unirse_equipo_por_codigo',
+    sql='''
+        WITH e AS (
+            SELECT id_equipo FROM "Equipo" WHERE codigo = %(codigo)s
+        ),
+        ins AS (
+            INSERT INTO "UsuarioEquipo" (equipo_id, usuario_id)
+            SELECT e.id_equipo, %(id_usuario)s FROM e
+            WHERE NOT EXISTS (SELECT 1 FROM "UsuarioEquipo" WHERE usuario_id = %(id_usuario)s)
+            ON CONFLICT (usuario_id, equipo_id) DO NOTHING
+            RETURNING equipo_id
+        )
+        SELECT EXISTS (SELECT 1 FROM e) AS equipo_existe,
+               EXISTS (SELECT 1 FROM ins) AS insertado
+    ''',
+    parametros=_param_unirse_equipo,
+    respuesta=_resp_unirse_equipo,
+    error='Error al unirse al equipo',
+    invalida=_invalida_unirse_equipo,
+    tipos={'codigo': 'text', 'id_usuario': 'int'},
+    bloqueo=BLOQUEAR_USUARIO,
+)
+
+
+def _param_salir_del_equipo(usuario, data):
+    return {'id_usuario': usuario['id']}
+
+
+def _resp_salir_del_equipo(r, usuario):
+    if not r['pertenece']:
+        return {'mensaje': 'No perteneces a ningún equipo'}, 400
+    if r['fundador'] is None:
+        return {'mensaje': 'Equipo no encontrado'}, 404
+    if r['equipo_borrado']:
+        return {'mensaje': 'Te has salido y el equipo ha sido eliminado porque eras el fundador.'}, 200
+    return {'mensaje': 'Te has salido del equipo correctamente.'}, 200
+
+
+def _previa_salir_del_equipo(membresia, params):
+    if membresia[0] is None:
+        return {'mensaje': 'No perteneces a ningún equipo'}, 400
+    return None
+
+
+def _invalida_equipo_borrado(params, fila):
+    # Torneos del equipo borrado y pertenencia de quienes han salido
+    return [espacio_torneo(t) for t in fila['torneos']] + \
+        [espacio_membresia(u) for u in fila['usuarios']]
+
+
+# Si es fundador se borran todos los miembros y el equipo; si no, solo su relación
+SALIR_DEL_EQUIPO = Operacion(
+    'salir_del_equipo',
+    sql='''
+        WITH m AS (
+            SELECT ue.equipo_id, e.fundador
+            FROM "UsuarioEquipo" ue
+            LEFT JOIN "Equipo" e ON e.id_equipo = ue.equipo_id
+            WHERE ue.usuario_id = %(id_usuario)s
+            LIMIT 1
+        ),
+        miembros AS (
+            DELETE FROM "UsuarioEquipo" ue
+            USING m
+            WHERE ue.equipo_id = m.equipo_id
+              AND m.fundador IS NOT NULL
+              AND (m.fundador = %(id_usuario)s OR ue.usuario_id = %(id_usuario)s)
+            RETURNING ue.usuario_id
+        ),
+        equipo AS (
+            DELETE FROM "Equipo" e
+            USING m
+            WHERE e.id_equipo = m.equipo_id AND m.fundador = %(id_usuario)s
+            RETURNING e.id_equipo
+        )
+        SELECT EXISTS (SELECT 1 FROM m) AS pertenece,
+               (SELECT fundador FROM m) AS fundador,
+               EXISTS (SELECT 1 FROM equipo) AS equipo_borrado,
+               -- Torneos de los que sale el equipo borrado (el SELECT aún ve las filas)
+               ARRAY(SELECT et.id_torneo FROM "EquipoTorneo" et
+                     JOIN equipo ON et.equipo_id = equipo.id_equipo) AS torneos,
+               ARRAY(SELECT usuario_id FROM miembros) AS usuarios
+    ''',
+    parametros=_param_salir_del_equipo,
+    respuesta=_resp_salir_del_equipo,
+    error='Error al salir del equipo',
+    invalida=_invalida_equipo_borrado,
+    tipos={'id_usuario': 'int'},
+    previa=_previa_salir_del_equipo,
+)
@@ -0,0 +1,224 @@
+"""Generación de rondas y emparejamientos de un torneo.
+
+Cada llamada a generar() produce la siguiente ronda a partir de los inscritos
+(ordenados por "Clasificacion".puntos) y de las partidas anteriores. No toca
+la base de datos; main.py guarda la ronda en "Ronda" y "Partida" (migración
+0006). Formatos:
+
+- eliminacion: cuadro con cabezas de serie (1 contra el último, ...); los
+  exentos de la primera ronda son para los mejores cabezas de serie y después
+  se emparejan los ganadores de partidas consecutivas.
+- doble_eliminacion: se queda fuera quien pierde dos partidas. En cada ronda
+  se emparejan los invictos entre sí (cuadro de ganadores) y los que tienen
+  una derrota entre sí (cuadro de perdedores, evitando repetir partidas) hasta
+  que queda uno de cada, que juegan la final; si el invicto la pierde, se
+  repite.
+- liga: todos contra todos por el método del círculo; la ronda N se calcula
+  directamente, sin recorrer las anteriores.
+- suizo: empareja por victorias en las rondas anteriores (el exento cuenta
+  como victoria; a igualdad, por puntos de la clasificación), de arriba
+  abajo, con el siguiente rival con quien no se haya jugado todavía; el
+  exento es el peor clasificado que aún no ha descansado.
+
+Una partida es (cuadro, participante_a, participante_b, ganador); con
+participante_b None el participante a queda exento y pasa como ganador.
+"""
+from consultas import Rechazo
+
+FORMATOS = ('eliminacion', 'doble_eliminacion', 'liga', 'suizo')
+
+# Rivales que se miran por delante al buscar uno con quien no se haya jugado;
+# si ninguno sirve se acepta la repetición
+VENTANA_RIVALES = 64
+
+
+# -------------------- Utilidades --------------------
+def orden_siembra(tamaño):
+    """Cabezas de serie (1..tamaño) en orden de cuadro: [1, 8, 4, 5, 2, 7, 3, 6]."""
+    orden = [1]
+    while len(orden) < tamaño:
+        total = len(orden) * 2 + 1
+        orden = [s for semilla in orden for s in (semilla, total - semilla)]
+    return orden
+
+
+def emparejar(orden, jugados, cuadro=None):
+    """Empareja cada participante con el siguiente libre con quien no haya jugado.
+
+    `orden` no debe tener un número impar de participantes.
+    """
+    partidas = []
+    usados = set()
+    n = len(orden)
+    for i, a in enumerate(orden):
+        if a in usados:
+            continue
+        usados.add(a)
+        rival = primero = None
+        vistos = 0
+        for j in range(i + 1, n):
+            b = orden[j]
+            if b in usados:
+                continue
+            if primero is None:
+                primero = b
+            if b not in jugados.get(a, ()):
+                rival = b
+                break
+            vistos += 1
+            if vistos >= VENTANA_RIVALES:
+                break
+        rival = rival if rival is not None else primero
+        usados.add(rival)
+        partidas.append((cuadro, a, rival, None))
+    return partidas
+
+
+def _rivales(historial):
+    jugados = {}
+    for _, _, _, a, b, _ in historial:
+        if b is not None:
+            jugados.setdefault(a, set()).add(b)
+            jugados.setdefault(b, set()).add(a)
+    return jugados
+
+
+def _ronda(historial, numero):
+    return [p for p in historial if p[0] == numero]
+
+
+def _comprobar_completa(historial, numero):
+    anterior = _ronda(historial, numero - 1)
+    pendientes = [p[1] for p in anterior if p[5] is None]
+    if pendientes:
+        raise Rechazo({'error': f'La ronda {numero - 1} tiene partidas sin resultado',
+                       'mesas': pendientes[:100]}, 409)
+    return anterior
+
+
+def _exento(partidas, participante, cuadro=None):
+    partidas.append((cuadro, participante, None, participante))
+
+
+# -------------------- Formatos --------------------
+def eliminacion(participantes, historial, numero, cuadro=None):
+    if numero == 1:
+        if len(participantes) < 2:
+            raise Rechazo({'error': 'Hacen falta al menos dos inscritos'}, 409)
+        tamaño = 1
+        while tamaño < len(participantes):
+            tamaño *= 2
+        huecos = [participantes[s - 1] if s <= len(participantes) else None
+                  for s in orden_siembra(tamaño)]
+        partidas = []
+        for a, b in zip(huecos[::2], huecos[1::2]):
+            if b is None:
+                _exento(partidas, a, cuadro)
+            else:
+                partidas.append((cuadro, a, b, None))
+        return partidas
+
+    ganadores = [p[5] for p in _comprobar_completa(historial, numero)]
+    if len(ganadores) < 2:
+        raise Rechazo({'error': 'El torneo ya ha terminado', 'ganador': ganadores[0] if ganadores else None}, 409)
+    return [(cuadro, a, b, None) for a, b in zip(ganadores[::2], ganadores[1::2])]
+
+
+def doble_eliminacion(participantes, historial, numero):
+    if numero == 1:
+        return eliminacion(participantes, historial, numero, cuadro='ganadores')
+    _comprobar_completa(historial, numero)
+
+    derrotas = {}
+    for _, _, _, a, b, ganador in historial:
+        if b is not None:
+            perdedor = b if ganador == a else a
+            derrotas[perdedor] = derrotas.get(perdedor, 0) + 1
+    # En orden de cabeza de serie; solo cuentan los inscritos que están en el
+    # cuadro desde la primera ronda
+    en_cuadro = {p[3] for p in historial} | {p[4] for p in historial}
+    vivos = [p for p in participantes if p in en_cuadro and derrotas.get(p, 0) < 2]
+    invictos = [p for p in vivos if derrotas.get(p, 0) == 0]
+    una_derrota = [p for p in vivos if derrotas.get(p, 0) == 1]
+
+    if len(vivos) < 2:
+        raise Rechazo({'error': 'El torneo ya ha terminado', 'ganador': vivos[0] if vivos else None}, 409)
+    if len(vivos) == 2 and (len(invictos) == 1 or not invictos):
+        return [('final', vivos[0], vivos[1], None)]
+
+    jugados = _rivales(historial)
+    partidas = []
+    for cuadro, grupo in (('ganadores', invictos), ('perdedores', una_derrota)):
+        if len(grupo) % 2:
+            _exento(partidas, grupo[0], cuadro)
+            grupo = grupo[1:]
+        # Primero contra último de su cuadro, como en la primera ronda
+        mitad = len(grupo) // 2
+        orden = [p for par in zip(grupo[:mitad], reversed(grupo[mitad:])) for p in par]
+        partidas.extend(emparejar(orden, jugados, cuadro))
+    return partidas
+
+
+def liga(participantes, historial, numero):
+    ids = sorted(participantes)  # por id: el calendario no cambia con los puntos
+    if len(ids) < 2:
+        raise Rechazo({'error': 'Hacen falta al menos dos inscritos'}, 409)
+    if len(ids) % 2:
+        ids.append(None)
+    rondas = len(ids) - 1
+    if numero > rondas:
+        raise Rechazo({'error': f'La liga ya tiene sus {rondas} rondas'}, 409)
+
+    # Método del círculo: el primero fijo y el resto girado numero - 1 puestos
+    giro = (numero - 1) % rondas
+    resto = ids[1:]
+    circulo = [ids[0]] + (resto[-giro:] + resto[:-giro] if giro else resto)
+    partidas = []
+    for i in range(len(circulo) // 2):
+        a, b = circulo[i], circulo[-1 - i]
+        if a is None or b is None:
+            _exento(partidas, a if b is None else b)
+        else:
+            partidas.append((None, a, b, None))
+    return partidas
+
+
+def suizo(participantes, historial, numero):
+    if len(participantes) < 2:
+        raise Rechazo({'error': 'Hacen falta al menos dos inscritos'}, 409)
+    if numero > 1:
+        _comprobar_completa(historial, numero)
+
+    # Los resultados de las rondas solo están en "Partida": "Clasificacion"
+    # no los recoge. sorted es estable, así que a igualdad de victorias se
+    # mantiene el orden por puntos
+    victorias = {}
+    for p in historial:
+        if p[5] is not None:
+            victorias[p[5]] = victorias.get(p[5], 0) + 1
+    orden = sorted(participantes, key=lambda p: -victorias.get(p, 0))
+    partidas = []
+    if len(orden) % 2:
+        exentos = {p[3] for p in historial if p[4] is None}
+        exento = next((p for p in reversed(orden) if p not in exentos), orden[-1])
+        orden.remove(exento)
+        _exento(partidas, exento)
+    return emparejar(orden, _rivales(historial)) + partidas
+
+
+_GENERADORES = {
+    'eliminacion': eliminacion,
+    'doble_eliminacion': doble_eliminacion,
+    'liga': liga,
+    'suizo': suizo,
+}
+
+
+def generar(formato, participantes, historial, numero):
+    """Partidas de la ronda `numero`.
+
+    - participantes: ids de los inscritos por puntos (de más a menos).
+    - historial: partidas anteriores (ronda, mesa, cuadro, a, b, ganador) por
+      ronda y mesa; la liga no lo necesita.
+    """
+    return _GENERADORES[formato](participantes, historial, numero)
@@ -0,0 +1,97 @@
+"""Exportaciones completas de torneos, inscripciones y clasificaciones.
+
+Las filas se leen con un cursor con nombre (del lado del servidor) en lotes de
+LOTE filas y se van escribiendo en NDJSON o CSV a medida que llegan, así que la
+memoria no depende del tamaño de la tabla.
+"""
+import csv
+import io
+import json
+import os
+
+LOTE = int(os.environ.get('EXPORTAR_LOTE', 2000))
+
+FORMATOS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+class Exportacion:
+    """Consulta a exportar. `sql` recibe %(torneo)s (None = todos los torneos)."""
+
+    def __init__(self, sql, columnas):
+        self.sql = sql
+        self.columnas = columnas
+
+
+# El orden sigue la clave primaria o un índice, para que PostgreSQL pueda
+# empezar a enviar filas sin ordenar la tabla entera
+EXPORTACIONES = {
+    'torneos': Exportacion('''
+        SELECT id_torneo, nombre, fecha_inicio, fecha_fin, ubicacion, id_evento, id_juego
+        FROM "Torneo"
+        WHERE %(torneo)s::int IS NULL OR id_torneo = %(torneo)s
+        ORDER BY id_torneo
+    ''', ('id_torneo', 'nombre', 'fecha_inicio', 'fecha_fin', 'ubicacion', 'id_evento', 'id_juego')),
+    'clasificacion': Exportacion('''
+        SELECT id_torneo, posicion, puntos, id_equipo, id_usuario, id_clasificacion
+        FROM "Clasificacion"
+        WHERE %(torneo)s::int IS NULL OR id_torneo = %(torneo)s
+        ORDER BY id_torneo, posicion NULLS LAST, id_clasificacion
+    ''', ('id_torneo', 'posicion', 'puntos', 'id_equipo', 'id_usuario', 'id_clasificacion')),
+    'jugadores-torneo': Exportacion('''
+        SELECT ut.id_torneo, u.id_usuario, u.nombre
+        FROM "UsuarioTorneo" ut
+        JOIN "Usuario" u ON u.id_usuario = ut.usuario_id
+        WHERE %(torneo)s::int IS NULL OR ut.id_torneo = %(torneo)s
+        ORDER BY ut.id_torneo, ut.usuario_id
+    ''', ('id_torneo', 'id_usuario', 'nombre')),
+    'equipos-torneo': Exportacion('''
+        SELECT et.id_torneo, e.id_equipo, e.nombre
+        FROM "EquipoTorneo" et
+        JOIN "Equipo" e ON e.id_equipo = et.equipo_id
+        WHERE %(torneo)s::int IS NULL OR et.id_torneo = %(torneo)s
+        ORDER BY et.id_torneo, et.equipo_id
+    ''', ('id_torneo', 'id_equipo', 'nombre')),
+}
+
+
+# -------------------- Lectura por lotes --------------------
+def lotes(conn, exportacion, torneo=None, lote=LOTE):
+    # Cursor con nombre: las filas se quedan en el servidor hasta cada fetchmany
+    with conn.cursor(name='exportacion') as cur:
+        cur.itersize = lote
+        cur.execute(exportacion.sql, {'torneo': torneo})
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                break
+            yield filas
+
+
+# -------------------- Formatos --------------------
+def ndjson(columnas, bloques):
+    for filas in bloques:
+        yield ''.join(
+            json.dumps(dict(zip(columnas, fila)), ensure_ascii=False, default=str) + '\n'
+            for fila in filas
+        )
+
+
+def csv_(columnas, bloques):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for filas in bloques:
+        escritor.writerows(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()  # solo la cabecera: no había filas
+
+
+def generar(conn, exportacion, formato, torneo=None):
+    escribir = ndjson if formato == 'ndjson' else csv_
+    return escribir(exportacion.columnas, lotes(conn, exportacion, torneo))
@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class HashingSaturado(Exception):
+    """La cola de bcrypt está llena; la petición debe reintentarse más tarde."""
+
+    def __init__(self, reintentar_en):
+        super().__init__('Servicio de autenticación saturado')
+        self.reintentar_en = reintentar_en
+
+
+# -------------------- Ejecutor de bcrypt --------------------
+class EjecutorHash:
+    """Ejecuta bcrypt en un pool de hilos dedicado del tamaño del número de núcleos.
+
+    bcrypt libera el GIL mientras calcula, así que los hilos de petición solo
+    esperan el resultado y el resto de rutas siguen respondiendo. La cola es
+    acotada: si hay más de hilos + cola_maxima operaciones pendientes se lanza
+    HashingSaturado al momento en vez de acumular peticiones.
+    """
+
+    def __init__(self, hilos=None, cola_maxima=None, rondas=12, espera=0.05):
+        self.hilos = hilos or os.cpu_count() or 1
+        self.cola_maxima = self.hilos * 4 if cola_maxima is None else cola_maxima
+        self.rondas = rondas
+        self.espera = espera
+        self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='bcrypt')
+        self._huecos = threading.BoundedSemaphore(self.hilos + self.cola_maxima)
+        self._lock = threading.Lock()
+        self.pendientes = 0
+        self.completadas = 0
+        self.rechazadas = 0
+
+    def _ejecutar(self, fn, *args):
+        if not self._huecos.acquire(timeout=self.espera):
+            with self._lock:
+                self.rechazadas += 1
+            # Estimación simple: las operaciones por delante entre los hilos disponibles
+            raise HashingSaturado(reintentar_en=max(1, (self.hilos + self.cola_maxima) // self.hilos))
+        with self._lock:
+            self.pendientes += 1
+        try:
+            return self._ejecutor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+                self.completadas += 1
+            self._huecos.release()
+
+    def hashear(self, contraseña):
+        salt = bcrypt.gensalt(rounds=self.rondas)
+        return self._ejecutar(bcrypt.hashpw, contraseña.encode('utf-8'), salt).decode('utf-8')
+
+    def comprobar(self, contraseña, hashed):
+        return self._ejecutar(bcrypt.checkpw, contraseña.encode('utf-8'), hashed.encode('utf-8'))
+
+    def necesita_rehash(self, hashed):
+        # Formato $2b$<coste>$<salt+hash>
+        try:
+            return int(hashed.split('$')[2]) != self.rondas
+        except (IndexError, ValueError):
+            return False
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'hilos': self.hilos,
+                'cola_maxima': self.cola_maxima,
+                'rondas': self.rondas,
+                'pendientes': self.pendientes,
+                'completadas': self.completadas,
+                'rechazadas': self.rechazadas,
+            }
@@ -0,0 +1,226 @@
+"""Importación masiva de eventos, torneos, inscripciones de equipos y resultados
+de partidos (administración).
+
+Las filas llegan como array JSON o como CSV (cuerpo text/csv o fichero
+'archivo'), se validan todas en una pasada y se insertan con INSERT de varias
+filas dentro de la transacción de la petición: o entran todas o ninguna. Las
+mismas funciones validan crear_evento y crear_torneo.
+"""
+import csv
+import io
+import os
+from datetime import date
+
+from consultas import Rechazo
+
+MAX_FILAS = int(os.environ.get('IMPORTAR_MAX_FILAS', 10000))
+# Filas por sentencia INSERT
+LOTE = 1000
+
+
+# -------------------- Lectura --------------------
+def leer_filas(peticion):
+    """Devuelve una lista de dicts a partir de un array JSON o un CSV con cabecera."""
+    if 'archivo' in peticion.files:
+        texto = peticion.files['archivo'].read().decode('utf-8-sig')
+        filas = _leer_csv(texto)
+    elif peticion.mimetype == 'text/csv':
+        filas = _leer_csv(peticion.get_data(as_text=True))
+    else:
+        data = peticion.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('filas')
+        if not isinstance(data, list) or not all(isinstance(f, dict) for f in data):
+            raise Rechazo({'error': 'Se esperaba un array JSON de objetos o un CSV con cabecera'})
+        filas = data
+
+    if not filas:
+        raise Rechazo({'error': 'No hay filas que importar'})
+    if len(filas) > MAX_FILAS:
+        raise Rechazo({'error': f'Como máximo se pueden importar {MAX_FILAS} filas por petición'}, 413)
+    return filas
+
+
+def _leer_csv(texto):
+    # Las celdas vacías equivalen a campos ausentes
+    return [{k: (v if v != '' else None) for k, v in fila.items()}
+            for fila in csv.DictReader(io.StringIO(texto))]
+
+
+# -------------------- Validación --------------------
+def _entero(valor, campo):
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise Rechazo({'error': f'{campo} debe ser un número entero'})
+
+
+def _fecha(valor, campo):
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise Rechazo({'error': f'{campo} debe tener el formato AAAA-MM-DD'})
+
+
+def validar_evento(data):
+    nombre = data.get('nombre')
+    tipo = data.get('tipo')
+    año = data.get('año')
+    mes = data.get('mes')
+
+    if not nombre or not tipo or not año:
+        raise Rechazo({'error': 'Faltan campos obligatorios: nombre, tipo, año'})
+    if tipo not in ('anual', 'mensual'):
+        raise Rechazo({'error': 'Tipo de evento inválido, debe ser "anual" o "mensual"'})
+    año = _entero(año, 'año')
+    mes = _entero(mes, 'mes')
+    if tipo == 'mensual' and (mes is None or not (1 <= mes <= 12)):
+        raise Rechazo({'error': 'Para evento mensual, mes debe estar entre 1 y 12'})
+    if tipo == 'anual':
+        mes = None  # Ignorar mes si es anual
+    return (nombre, tipo, año, mes)
+
+
+def validar_torneo(data):
+    nombre = data.get('nombre')
+    fecha_inicio = data.get('fecha_inicio')
+    fecha_fin = data.get('fecha_fin')
+    id_juego = data.get('id_juego')
+
+    if not nombre or not fecha_inicio or not fecha_fin or not id_juego:
+        raise Rechazo({'error': 'Faltan campos obligatorios: nombre, fecha_inicio, fecha_fin, id_juego'})
+    fecha_inicio = _fecha(fecha_inicio, 'fecha_inicio')
+    fecha_fin = _fecha(fecha_fin, 'fecha_fin')
+    if fecha_fin < fecha_inicio:
+        raise Rechazo({'error': 'fecha_fin no puede ser anterior a fecha_inicio'})
+    return (nombre, fecha_inicio, fecha_fin, data.get('ubicacion'),
+            _entero(data.get('id_evento'), 'id_evento'), _entero(id_juego, 'id_juego'))
+
+
+def validar_resultado_partido(data):
+    id_ganador = _entero(data.get('id_ganador'), 'id_ganador')
+    id_perdedor = _entero(data.get('id_perdedor'), 'id_perdedor')
+    if id_ganador is None or id_perdedor is None:
+        raise Rechazo({'error': 'Faltan campos obligatorios: id_ganador, id_perdedor'})
+    if id_ganador == id_perdedor:
+        raise Rechazo({'error': 'id_ganador e id_perdedor deben ser equipos distintos'})
+    return (id_ganador, id_perdedor, _entero(data.get('id_torneo'), 'id_torneo'))
+
+
+def validar_inscripcion(data):
+    id_torneo = _entero(data.get('id_torneo'), 'id_torneo')
+    id_equipo = _entero(data.get('id_equipo'), 'id_equipo')
+    if id_torneo is None or id_equipo is None:
+        raise Rechazo({'error': 'Faltan campos obligatorios: id_torneo, id_equipo'})
+    return (id_torneo, id_equipo)
+
+
+# -------------------- Importaciones --------------------
+class Importacion:
+    """- validar(data) -> tupla de valores en el orden de `plantilla`, o lanza Rechazo.
+    - referencias: (posición en la tupla, SQL con ANY(%s) que devuelve los ids
+      válidos como columna `id`, mensaje); comprueban las claves ajenas de
+      todas las filas con una consulta por referencia.
+    - sql: INSERT ... VALUES %s ... RETURNING, para execute_values.
+    - espacio: espacio de caché a invalidar tras confirmar.
+    """
+
+    def __init__(self, validar, sql, plantilla, referencias=(), espacio=None):
+        self.validar = validar
+        self.sql = sql
+        self.plantilla = plantilla
+        self.referencias = referencias
+        self.espacio = espacio
+
+    def validar_filas(self, filas):
+        valores, errores = [], []
+        for numero, fila in enumerate(filas, start=1):
+            try:
+                valores.append(self.validar(fila))
+            except Rechazo as e:
+                errores.append({'fila': numero, 'error': e.cuerpo['error']})
+        return valores, errores
+
+    def errores_referencias(self, valores, existentes):
+        """`existentes(sql, ids)` devuelve el conjunto de ids que existen."""
+        errores = []
+        for posicion, sql, mensaje in self.referencias:
+            pedidos = {v[posicion] for v in valores if v[posicion] is not None}
+            validos = existentes(sql, sorted(pedidos)) if pedidos else set()
+            errores.extend(
+                {'fila': numero, 'error': mensaje}
+                for numero, v in enumerate(valores, start=1)
+                if v[posicion] is not None and v[posicion] not in validos
+            )
+        return sorted(errores, key=lambda e: e['fila'])
+
+
+EVENTOS = Importacion(
+    validar_evento,
+    sql='INSERT INTO "Evento" (nombre, tipo, año, mes) VALUES %s RETURNING id_evento',
+    plantilla='(%s, %s, %s, %s)',
+    espacio='eventos',
+)
+
+TORNEOS = Importacion(
+    validar_torneo,
+    sql='''
+        INSERT INTO "Torneo" (nombre, fecha_inicio, fecha_fin, ubicacion, id_evento, id_juego)
+        VALUES %s RETURNING id_torneo
+    ''',
+    plantilla='(%s, %s, %s, %s, %s, %s)',
+    referencias=(
+        (4, 'SELECT id_evento AS id FROM "Evento" WHERE id_evento = ANY(%s)',
+         'El id_evento proporcionado no existe'),
+        (5, 'SELECT id_juego AS id FROM "Juego" WHERE id_juego = ANY(%s)',
+         'El id_juego proporcionado no existe'),
+    ),
+    espacio='torneos',
+)
+
+# Las inscripciones que ya existían se ignoran (ON CONFLICT) y solo las
+# nuevas reciben su fila de "Clasificacion", como en /inscribir/equipo
+INSCRIPCIONES_EQUIPOS = Importacion(
+    validar_inscripcion,
+    sql='''
+        WITH datos (id_torneo, id_equipo) AS (VALUES %s),
+        ins AS (
+            INSERT INTO "EquipoTorneo" (equipo_id, id_torneo)
+            SELECT id_equipo, id_torneo FROM datos
+            ON CONFLICT DO NOTHING
+            RETURNING equipo_id, id_torneo
+        ),
+        cla AS (
+            INSERT INTO "Clasificacion" (id_torneo, id_equipo, id_usuario, puntos, posicion)
+            SELECT id_torneo, equipo_id, NULL, 0, NULL FROM ins
+        )
+        SELECT id_torneo, equipo_id AS id_equipo FROM ins
+    ''',
+    plantilla='(%s::int, %s::int)',
+    referencias=(
+        (0, '''SELECT t.id_torneo AS id FROM "Torneo" t JOIN "Juego" j ON j.id_juego = t.id_juego
+               WHERE t.id_torneo = ANY(%s) AND j.es_individual = FALSE''',
+         'El torneo no existe o es individual'),
+        (1, 'SELECT id_equipo AS id FROM "Equipo" WHERE id_equipo = ANY(%s)',
+         'Equipo no encontrado'),
+    ),
+)
+
+# Solo se insertan: marcadores.py los suma a "Equipo" en el siguiente volcado
+RESULTADOS_PARTIDOS = Importacion(
+    validar_resultado_partido,
+    sql='INSERT INTO "ResultadoPartido" (id_ganador, id_perdedor, id_torneo) VALUES %s RETURNING id_resultado',
+    plantilla='(%s, %s, %s)',
+    referencias=(
+        (0, 'SELECT id_equipo AS id FROM "Equipo" WHERE id_equipo = ANY(%s)',
+         'El equipo ganador no existe'),
+        (1, 'SELECT id_equipo AS id FROM "Equipo" WHERE id_equipo = ANY(%s)',
+         'El equipo perdedor no existe'),
+        (2, 'SELECT id_torneo AS id FROM "Torneo" WHERE id_torneo = ANY(%s)',
+         'El id_torneo proporcionado no existe'),
+    ),
+)
@@ -0,0 +1,64 @@
+"""Refresco de la tabla precalculada de las ligas ("TablaLiga", migración 0005).
+
+Los triggers avanzan la secuencia tabla_liga_cambios con cada sentencia que
+cambia clasificaciones, resultados, miembros de una liga o nombres. Cada
+INTERVALO segundos se compara con el valor del último refresco y, si ha
+avanzado, se refresca la vista con CONCURRENTLY (las lecturas no esperan).
+Varios cambios seguidos se juntan en un solo refresco, y un advisory lock
+deja refrescar a un solo proceso a la vez.
+
+Una transacción que avanza la secuencia antes de que empiece un refresco,
+pero confirma después, no entra en él. Por eso también se refresca cuando
+el último refresco tiene más de MAXIMO segundos.
+"""
+import os
+
+from tareas import TareaPeriodica
+
+INTERVALO = float(os.environ.get('LIGA_INTERVALO', 10))
+MAXIMO = float(os.environ.get('LIGA_REFRESCO_MAXIMO', 600))
+
+# Clave del advisory lock del refresco (7_421_001 migrar.py, 7_421_002 marcadores.py)
+BLOQUEO = 7_421_003
+
+
+class RefrescoLiga(TareaPeriodica):
+    """`transaccion()` como en marcadores.Volcador."""
+
+    nombre = 'refresco-tabla-liga'
+
+    def __init__(self, transaccion, intervalo=INTERVALO, maximo=MAXIMO):
+        super().__init__(intervalo)
+        self.transaccion = transaccion
+        self.maximo = maximo
+        self._refrescos = 0
+
+    def ejecutar(self):
+        self.refrescar()
+
+    def refrescar(self):
+        """Refresca la tabla si ha cambiado; devuelve True si se ha refrescado."""
+        with self.transaccion() as conn:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (BLOQUEO,))
+                if not cur.fetchone()[0]:
+                    return False
+                cur.execute('''
+                    SELECT s.last_value, r.cambios,
+                           r.refrescada < now() - make_interval(secs => %s)
+                    FROM tabla_liga_cambios s, "TablaLigaRefresco" r
+                ''', (self.maximo,))
+                actual, refrescado, caducada = cur.fetchone()
+                if actual == refrescado and not caducada:
+                    return False
+                cur.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY "TablaLiga"')
+                cur.execute('UPDATE "TablaLigaRefresco" SET cambios = %s, refrescada = now()', (actual,))
+        with self._lock:
+            self._refrescos += 1
+        return True
+
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        with self._lock:
+            estadisticas['refrescos'] = self._refrescos
+        return estadisticas
@@ -0,0 +1,119 @@
+"""Peticiones agrupadas: varios GET de la API en una sola petición a /batch.
+
+main.py despacha cada subpetición dentro del proceso, en su propio contexto
+de petición de Flask, con el usuario ya verificado por /batch y una sola
+conexión del pool para todo el lote. psycopg2 ejecuta una consulta a la vez
+por conexión, así que las subpeticiones que consultan la base de datos la
+toman por turnos (ConexionCompartida) y las que se responden desde la caché
+o con un 304 no esperan a nadie. Cada turno es un SAVEPOINT: si una
+subpetición falla solo se deshace lo suyo.
+"""
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from consultas import Rechazo
+
+logger = logging.getLogger(__name__)
+
+MAXIMO = int(os.environ.get('BATCH_MAXIMO', 20))
+HILOS = int(os.environ.get('BATCH_HILOS', 4))
+
+# Cabeceras de cada subrespuesta que se devuelven en el lote
+CABECERAS = ('ETag', 'Last-Modified', 'X-Siguiente-Cursor', 'Link', 'Retry-After')
+
+
+class ConexionCompartida:
+    """Conexión de un lote; se pide al pool la primera vez que hace falta.
+
+    `prestar()` devuelve (pool de origen, conexión), como main.prestar_conexion.
+    """
+
+    def __init__(self, prestar):
+        self.prestar = prestar
+        self.origen = self.conn = None
+        self._turno = threading.Lock()
+
+    def tomar(self):
+        self._turno.acquire()
+        try:
+            if self.conn is None:
+                self.origen, self.conn = self.prestar()
+            with self.conn.cursor() as cur:
+                cur.execute('SAVEPOINT subpeticion')
+        except Exception:
+            self._turno.release()
+            raise
+        return self.conn
+
+    def soltar(self, deshacer):
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute('ROLLBACK TO SAVEPOINT subpeticion' if deshacer else 'RELEASE SAVEPOINT subpeticion')
+        finally:
+            self._turno.release()
+
+    def cerrar(self):
+        # Al terminar el lote: confirma y devuelve la conexión al pool
+        if self.conn is None:
+            return
+        try:
+            self.conn.commit()
+        except Exception:
+            logger.exception("Error al cerrar la conexión del lote")
+            self.origen.devolver(self.conn, descartar=True)
+        else:
+            self.origen.devolver(self.conn)
+        self.conn = None
+
+
+def validar(data):
+    """Lista de (ruta, etag) del cuerpo {"peticiones": ["/juegos", {"ruta": ..., "etag": ...}]}."""
+    peticiones = data.get('peticiones') if isinstance(data, dict) else None
+    if not isinstance(peticiones, list) or not peticiones:
+        raise Rechazo({'error': 'Falta la lista de peticiones'})
+    if len(peticiones) > MAXIMO:
+        raise Rechazo({'error': f'Como mucho {MAXIMO} peticiones por lote'})
+
+    normalizadas = []
+    for i, peticion in enumerate(peticiones):
+        if isinstance(peticion, str):
+            peticion = {'ruta': peticion}
+        ruta = peticion.get('ruta') if isinstance(peticion, dict) else None
+        if not isinstance(ruta, str) or not ruta.startswith('/'):
+            raise Rechazo({'error': f'Petición {i}: falta la ruta (p. ej. "/juegos")'})
+        etag = peticion.get('etag')
+        normalizadas.append((ruta, etag if isinstance(etag, str) else None))
+    return normalizadas
+
+
+def ejecutar(despachar, peticiones, hilos=HILOS):
+    """Resultados de despachar(peticion) en el orden de `peticiones`."""
+    if len(peticiones) == 1 or hilos <= 1:
+        return [despachar(p) for p in peticiones]
+    with ThreadPoolExecutor(max_workers=min(hilos, len(peticiones)), thread_name_prefix='batch') as ejecutor:
+        return list(ejecutor.map(despachar, peticiones))
+
+
+def error(ruta, estado, mensaje):
+    return {'ruta': ruta, 'estado': estado, 'cuerpo': {'error': mensaje}}
+
+
+def resultado(ruta, respuesta):
+    # Subrespuesta de Flask -> elemento de la respuesta del lote. Las rutas en
+    # streaming conocidas se rechazan antes de despacharlas (main.en_streaming);
+    # esto solo evita quedarse leyendo un stream sin fin de una ruta sin marcar
+    if inspect.isgenerator(respuesta.response):
+        respuesta.close()
+        return error(ruta, 400, 'Las respuestas en streaming no se pueden pedir en un lote')
+    if respuesta.is_json:
+        cuerpo = respuesta.get_json(silent=True)
+    else:
+        cuerpo = respuesta.get_data(as_text=True) or None
+    cabeceras = {k: respuesta.headers[k] for k in CABECERAS if k in respuesta.headers}
+    elemento = {'ruta': ruta, 'estado': respuesta.status_code, 'cuerpo': cuerpo}
+    if cabeceras:
+        elemento['cabeceras'] = cabeceras
+    return elemento
@@ -1,94 +1,472 @@
-from functools import wraps
-from flask import Flask, request, jsonify
+import hashlib
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from urllib.parse import urlencode
+from flask import Flask, Response, request, jsonify, g, has_request_context, make_response
 import psycopg2
 import psycopg2.extras
-import bcrypt
 import jwt
 from datetime import datetime, timedelta, timezone, date
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from cache import FALTA, CacheLocal, Versiones, crear_cache
+from config import DB_CONFIG, DB_REPLICAS, DB_VENTANA_PRIMARIA
+import consultas
+import cuadros
+import exportacion
+import importacion
+import lotes
+from consultas import Rechazo
+from hashing import EjecutorHash, HashingSaturado
+from liga import RefrescoLiga
+from marcadores import Volcador
+from metricas import BUCKETS_CANTIDAD, Registro
+from paginacion import ParametroInvalido
+from pool import PoolAgotado, PoolConexiones
+from preparadas import registro as sentencias_preparadas
+from serializacion import Filas, ProveedorJSON
+from tiempo_real import Difusor
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)
+app.json = ProveedorJSON(app)
+CORS(app, expose_headers=['X-Siguiente-Cursor', 'Link'])
 
 app.config['SECRET_KEY'] = 'Secret_Key'
 
 # -------------------- Conexión a PostgreSQL --------------------
-def conectar():
-    return psycopg2.connect(
-        host="localhost",
-        port="5432",
-        database="EsportsCanarias",
-        user="postgres",
-        password="1234"
+def crear_pool(**parametros_conexion):
+    return PoolConexiones(
+        min_conexiones=int(os.environ.get('DB_POOL_MIN', 1)),
+        max_conexiones=int(os.environ.get('DB_POOL_MAX', 20)),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        vida_maxima=float(os.environ.get('DB_POOL_VIDA_MAXIMA', 1800)),
+        **parametros_conexion
     )
 
-# -------------------- Ejecutar SQL --------------------
-def ejecutar_sql(sql, params=None):
+
+# Primaria (escrituras y lecturas que deben ver lo último) y réplicas
+pool = crear_pool(**DB_CONFIG)
+replicas = [crear_pool(dsn=dsn) for dsn in DB_REPLICAS]
+_turno_replica = itertools.count()
+
+
+def conectar():
+    # Presta una conexión del pool; se devuelve al salir del bloque `with`
+    return pool.conexion()
+
+
+# -------------------- Métricas --------------------
+# Latencia por endpoint, tiempo y filas por sentencia SQL, consultas por
+# petición (para detectar N+1) y tiempo de préstamo del pool. Se exponen en
+# formato Prometheus en /metrics.
+metricas = Registro()
+m_peticion = metricas.histograma(
+    'http_peticion_segundos', 'Latencia de las peticiones HTTP por endpoint', ('endpoint', 'metodo'))
+m_respuestas = metricas.contador(
+    'http_respuestas_total', 'Respuestas HTTP por endpoint y código de estado', ('endpoint', 'metodo', 'estado'))
+m_consultas_peticion = metricas.histograma(
+    'http_peticion_consultas', 'Sentencias SQL ejecutadas en cada petición', ('endpoint',),
+    buckets=BUCKETS_CANTIDAD)
+m_sql = metricas.histograma(
+    'sql_sentencia_segundos', 'Duración de cada sentencia SQL', ('endpoint', 'sentencia'))
+m_sql_filas = metricas.contador(
+    'sql_filas_total', 'Filas devueltas o afectadas por las sentencias SQL', ('endpoint', 'sentencia'))
+m_sql_errores = metricas.contador(
+    'sql_errores_total', 'Sentencias SQL que terminaron en error', ('endpoint', 'sentencia'))
+m_pool_prestamo = metricas.histograma(
+    'pool_prestamo_segundos', 'Tiempo para obtener una conexión del pool')
+pool.al_prestar = m_pool_prestamo.observar
+for _replica in replicas:
+    _replica.al_prestar = m_pool_prestamo.observar
+m_preparadas = metricas.contador(
+    'sql_preparadas_total', 'Ejecuciones de sentencias preparadas, con PREPARE nuevo o reutilizado',
+    ('sentencia', 'resultado'))
+sentencias_preparadas.al_ejecutar = lambda nombre, reutilizada: m_preparadas.inc(
+    nombre, 'reutilizada' if reutilizada else 'planificada')
+
+for _nombre, _clave, _tipo, _ayuda in [
+    ('pool_en_uso', 'en_uso', 'gauge', 'Conexiones prestadas ahora mismo'),
+    ('pool_inactivas', 'inactivas', 'gauge', 'Conexiones abiertas esperando en el pool'),
+    ('pool_esperas_total', 'esperas', 'counter', 'Préstamos que tuvieron que esperar'),
+    ('pool_espera_segundos_total', 'tiempo_espera_total', 'counter', 'Segundos esperando una conexión'),
+    ('pool_timeouts_total', 'timeouts', 'counter', 'Préstamos que agotaron el tiempo de espera'),
+]:
+    metricas.indicador(_nombre, _ayuda, lambda c=_clave: pool.estadisticas()[c], tipo=_tipo)
+
+# Cachés y bcrypt (definidos más abajo; se leen al exportar)
+metricas.indicador('cache_aciertos_total', 'Aciertos de la caché de respuestas',
+                   lambda: cache.estadisticas()['aciertos'], tipo='counter')
+metricas.indicador('cache_fallos_total', 'Fallos de la caché de respuestas',
+                   lambda: cache.estadisticas()['fallos'], tipo='counter')
+metricas.indicador('tokens_aciertos_total', 'Tokens JWT servidos desde la caché',
+                   lambda: tokens_verificados.estadisticas()['aciertos'], tipo='counter')
+metricas.indicador('tokens_fallos_total', 'Tokens JWT verificados con jwt.decode',
+                   lambda: tokens_verificados.estadisticas()['fallos'], tipo='counter')
+metricas.indicador('bcrypt_pendientes', 'Operaciones bcrypt en curso o en cola',
+                   lambda: hasher.estadisticas()['pendientes'])
+metricas.indicador('bcrypt_rechazadas_total', 'Operaciones bcrypt rechazadas por saturación',
+                   lambda: hasher.estadisticas()['rechazadas'], tipo='counter')
+
+
+@lru_cache(maxsize=1024)
+def etiqueta_sentencia(sql):
+    # "SELECT Torneo", "WITH Torneo"...: verbo y primera tabla, cardinalidad acotada
+    partes = sql.split(None, 1)
+    verbo = partes[0].upper() if partes else ''
+    tabla = re.search(r'"(\w+)"', sql)
+    return f'{verbo} {tabla.group(1)}' if tabla else verbo
+
+
+def ejecutar_medido(cur, sql, params=None):
+    endpoint = (request.endpoint or 'desconocido') if has_request_context() else 'fuera_de_peticion'
+    sentencia = etiqueta_sentencia(sql)
+    preparada = sentencias_preparadas.buscar(sql)
+    inicio = time.perf_counter()
     try:
-        conn = conectar()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        if params:
+        if preparada is not None:
+            sentencias_preparadas.ejecutar(cur, preparada, params)
+        elif params:
             cur.execute(sql, params)
         else:
             cur.execute(sql)
-
-        if sql.strip().lower().startswith("select"):
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-            return rows
+    except Exception:
+        m_sql_errores.inc(endpoint, sentencia)
+        raise
+    finally:
+        m_sql.observar(time.perf_counter() - inicio, endpoint, sentencia)
+    if cur.rowcount > 0:
+        m_sql_filas.inc(endpoint, sentencia, cantidad=cur.rowcount)
+    if has_request_context():
+        g._consultas = g.get('_consultas', 0) + 1
+
+
+@app.before_request
+def iniciar_medicion():
+    g._inicio = time.perf_counter()
+    g._consultas = 0
+
+
+@app.after_request
+def anotar_estado(response):
+    g._estado = response.status_code
+    return response
+
+
+@app.teardown_request
+def registrar_medicion(exc):
+    inicio = g.pop('_inicio', None)
+    if inicio is None:
+        return
+    endpoint = request.endpoint or 'desconocido'
+    m_peticion.observar(time.perf_counter() - inicio, endpoint, request.method)
+    m_respuestas.inc(endpoint, request.method, str(g.pop('_estado', 500)))
+    m_consultas_peticion.observar(g.pop('_consultas', 0), endpoint)
+
+# -------------------- Transacción por petición --------------------
+# Dentro de una petición HTTP todas las consultas comparten una única conexión
+# y una única transacción: se confirma al final si todo fue bien y se deshace
+# si alguna consulta falló o la respuesta es un error 5xx.
+def conexion_peticion():
+    conn = g.get('_db_conn')
+    if conn is None:
+        if '_lote' in g:
+            # Subpetición de /batch: la conexión del lote, cuando le toque
+            conn = g._lote.tomar()
         else:
-            if "returning" in sql.lower():
-                rows = cur.fetchall()
-                conn.commit()  # <-- Esto es lo que faltaba
-                cur.close()
-                conn.close()
-                return rows
-            else:
-                conn.commit()
-                cur.close()
-                conn.close()
+            g._db_pool, conn = prestar_conexion()
+        g._db_conn = conn
+    return conn
+
+
+@contextmanager
+def transaccion():
+    if has_request_context():
+        yield conexion_peticion()
+        return
+    # Fuera de una petición (scripts, hilos) cada bloque es su propia transacción
+    with conectar() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def marcar_fallo():
+    if has_request_context():
+        g._db_fallo = True
+
+
+@app.after_request
+def cerrar_transaccion(response):
+    conn = g.pop('_db_conn', None)
+    if conn is None:
+        return response
+    fallo = g.pop('_db_fallo', False)
+    if '_lote' in g:
+        g._lote.soltar(deshacer=fallo or response.status_code >= 500)
+        if fallo and response.status_code < 400:
+            return make_response(jsonify({'error': 'Error en la base de datos'}), 500)
+        return response
+    origen = g.pop('_db_pool', pool)
+    invalidar = g.pop('_invalidar', None)
+    try:
+        if fallo or response.status_code >= 500:
+            conn.rollback()
+        else:
+            conn.commit()
+            if invalidar:
+                lsn = lsn_primaria(conn) if origen is pool else None
+                for espacio in invalidar:
+                    invalidar_espacio(espacio, lsn)
+    except Exception as e:
+        logger.exception("Error al cerrar la transacción")
+        origen.devolver(conn, descartar=True)
+        return make_response(jsonify({'error': f'Error al confirmar la transacción: {str(e)}'}), 500)
+    origen.devolver(conn)
+    if origen is pool and replicas and not fallo and response.status_code < 400 \
+            and request.method not in ('GET', 'HEAD'):
+        recordar_escritura(response)
+    if fallo and response.status_code < 400:
+        # Una consulta falló y la transacción se ha deshecho: no se puede responder éxito
+        return make_response(jsonify({'error': 'Error en la base de datos, no se guardaron los cambios'}), 500)
+    return response
+
+
+@app.teardown_request
+def liberar_conexion(exc):
+    # Si la petición terminó con una excepción no se llega a after_request
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        if '_lote' in g:
+            g._lote.soltar(deshacer=True)
+        else:
+            g.pop('_db_pool', pool).devolver(conn)
+
+# -------------------- Réplicas de lectura --------------------
+# Los GET van a una réplica (por turnos) salvo las rutas marcadas con
+# @solo_primaria y salvo que quien pregunta haya escrito hace menos de
+# DB_VENTANA_PRIMARIA segundos. Esa ventana se recuerda por usuario (en Redis
+# si hay CACHE_URL, para que la vean todos los workers) y en una cookie, para
+# los clientes sin token.
+COOKIE_PRIMARIA = 'primaria_hasta'
+ventanas_primaria = crear_cache(
+    os.environ.get('CACHE_URL'),
+    max_entradas=int(os.environ.get('VENTANA_PRIMARIA_MAX', 10000)),
+    ttl=DB_VENTANA_PRIMARIA,
+)
+
+
+def solo_primaria(f):
+    f._solo_primaria = True
+    return f
+
+
+def en_streaming(f):
+    # La respuesta se genera sobre la marcha: /batch no la admite
+    f._streaming = True
+    return f
+
+
+def en_ventana_primaria():
+    try:
+        if float(request.cookies.get(COOKIE_PRIMARIA, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    usuario, _ = usuario_de_cabecera(request.headers.get('Authorization'))
+    return usuario is not None and ventanas_primaria.get('primaria', usuario['id']) is not FALTA
+
+
+def recordar_escritura(response):
+    hasta = time.time() + DB_VENTANA_PRIMARIA
+    response.set_cookie(COOKIE_PRIMARIA, f'{hasta:.3f}', max_age=int(DB_VENTANA_PRIMARIA) + 1,
+                        httponly=True, samesite='Lax')
+    usuario, _ = usuario_de_cabecera(request.headers.get('Authorization'))
+    if usuario is not None:
+        ventanas_primaria.set('primaria', usuario['id'], True)
+
+
+def elegir_pool(vistas=None):
+    # `vistas`: las de las subpeticiones de /batch, que comparten conexión
+    if not replicas or not has_request_context():
+        return pool
+    if vistas is None:
+        if request.method not in ('GET', 'HEAD'):
+            return pool
+        vistas = [app.view_functions.get(request.endpoint)]
+    if any(getattr(v, '_solo_primaria', False) for v in vistas) or en_ventana_primaria():
+        return pool
+    return replicas[next(_turno_replica) % len(replicas)]
+
+
+def prestar_conexion(origen=None):
+    # Devuelve (pool de origen, conexión); si la réplica no responde se lee de la primaria
+    if origen is None:
+        origen = elegir_pool()
+    try:
+        return origen, origen.obtener()
+    except (PoolAgotado, psycopg2.OperationalError) as e:
+        if origen is pool:
+            raise
+        logger.warning("Réplica no disponible, se usa la primaria: %s", e)
+        return pool, pool.obtener()
+
+
+# -------------------- Ejecutar SQL --------------------
+def ejecutar_sql(sql, params=None):
+    try:
+        with transaccion() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                ejecutar_medido(cur, sql, params)
+
+                # SELECT o sentencias con RETURNING devuelven filas
+                if cur.description is not None:
+                    return cur.fetchall()
                 return {"msg": "Operación exitosa"}
     except Exception as e:
+        marcar_fallo()
         print(f"Error en ejecutar_sql: {e}")
         return {"error": str(e)}
 
 
 
+def ejecutar_sql_filas(sql, params=None):
+    # Como ejecutar_sql pero sin un dict por fila: tuplas + nombres de columna,
+    # para los listados que solo se serializan
+    try:
+        with transaccion() as conn:
+            with conn.cursor() as cur:
+                ejecutar_medido(cur, sql, params)
+                return Filas([c.name for c in cur.description], cur.fetchall())
+    except Exception as e:
+        marcar_fallo()
+        logger.exception("Error en ejecutar_sql_filas")
+        return {"error": str(e)}
+
+
 def ejecutar_sql_params(sql, params=None):
     try:
-        conn = conectar()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute(sql, params)
-        if sql.strip().lower().startswith("select"):
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-            return rows
-        else:
-            conn.commit()
-            cur.close()
-            conn.close()
-            return None
+        with transaccion() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                ejecutar_medido(cur, sql, params)
+                if cur.description is not None:
+                    return cur.fetchall()
+                return None
     except Exception as e:
+        marcar_fallo()
         print("Error ejecutar_sql:", e)
         raise e
 
+
+def ejecutar_operacion(operacion, usuario, **ruta):
+    # Operaciones de una sola sentencia compartidas con asgi.py (ver consultas.py)
+    try:
+        params = operacion.parametros(usuario, request.get_json(silent=True), **ruta)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+
+    if operacion.previa:
+        actual = membresia(usuario['id'])
+        rechazo = actual is not None and operacion.previa(actual, params)
+        if rechazo:
+            cuerpo, estado = rechazo
+            return jsonify(cuerpo), estado
+
+    if operacion.bloqueo:
+        bloqueo = ejecutar_sql(operacion.bloqueo, params)
+        if isinstance(bloqueo, dict):
+            return jsonify({'error': f'{operacion.error}: {bloqueo["error"]}'}), 500
+
+    resultado = ejecutar_sql(operacion.sql, params)
+    if isinstance(resultado, dict):
+        return jsonify({'error': f'{operacion.error}: {resultado["error"]}'}), 500
+
+    cuerpo, estado = operacion.respuesta(resultado[0], usuario)
+    if operacion.invalida and estado < 400:
+        invalidar_cache(*operacion.invalida(params, resultado[0]))
+    return jsonify(cuerpo), estado
+
+# -------------------- Hash de contraseñas --------------------
+# bcrypt se ejecuta en un pool de hilos acotado; si está saturado se responde
+# 503 con Retry-After en lugar de bloquear todos los workers.
+hasher = EjecutorHash(
+    hilos=int(os.environ.get('BCRYPT_HILOS', 0)) or None,
+    cola_maxima=int(os.environ['BCRYPT_COLA']) if 'BCRYPT_COLA' in os.environ else None,
+    rondas=int(os.environ.get('BCRYPT_RONDAS', 12)),
+)
+
+
+@app.errorhandler(HashingSaturado)
+def hashing_saturado(e):
+    respuesta = jsonify({'error': 'Demasiadas peticiones de autenticación, inténtalo de nuevo en unos segundos'})
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = str(e.reintentar_en)
+    return respuesta
+
 # -------------------- Decorador de Autenticación --------------------
+# Caché de tokens ya verificados: evita repetir jwt.decode (HS256) en cada
+# petición. La clave es el SHA-256 del token y cada entrada caduca en el
+# 'exp' del propio token, nunca después.
+tokens_verificados = CacheLocal(
+    max_entradas=int(os.environ.get('TOKENS_CACHE_MAX', 10000)),
+    ttl=0,
+)
+
+
+def verificar_token(token):
+    clave = hashlib.sha256(token.encode('utf-8')).digest()
+    guardado = tokens_verificados.get('token', clave)
+    if guardado is not FALTA:
+        usuario, exp = guardado
+        if exp > time.time():
+            return usuario
+        tokens_verificados.borrar('token', clave)
+        raise jwt.ExpiredSignatureError('Signature has expired')
+
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    usuario = data['usuario']
+    exp = data.get('exp')
+    if exp is not None:
+        restante = exp - time.time()
+        if restante > 0:
+            tokens_verificados.set('token', clave, (usuario, exp), ttl=restante)
+    return usuario
+
+
+def usuario_de_cabecera(cabecera):
+    # Devuelve (usuario, None) o (None, cuerpo_del_401); también lo usa asgi.py
+    if not cabecera:
+        return None, {'error': 'Token faltante'}
+    try:
+        return verificar_token(cabecera.replace('Bearer ', '')), None
+    except jwt.ExpiredSignatureError:
+        return None, {'error': 'Token expirado'}
+    except Exception as e:
+        return None, {'error': f'Token inválido: {str(e)}'}
+
+
 def token_required(f):
     @wraps(f)
     def decorador(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token faltante'}), 401
-        try:
-            token = token.replace('Bearer ', '')
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            usuario = data['usuario']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except Exception as e:
-            return jsonify({'error': f'Token inválido: {str(e)}'}), 401
+        # En las subpeticiones de /batch el token ya se ha verificado una vez
+        usuario = g.get('_usuario')
+        if usuario is None:
+            usuario, error = usuario_de_cabecera(request.headers.get('Authorization'))
+            if error:
+                return jsonify(error), 401
         return f(usuario, *args, **kwargs)
     return decorador
 
@@ -101,6 +479,290 @@ def admin_required(f):
         return f(usuario, *args, **kwargs)
     return decorador
 
+# -------------------- Caché de datos de referencia --------------------
+# Juegos, eventos y torneos solo cambian cuando un administrador los crea, así
+# que sus respuestas se guardan (LRU + TTL) y se invalidan desde esas rutas.
+# Con CACHE_URL=redis://... la caché es compartida entre workers.
+cache = crear_cache(
+    os.environ.get('CACHE_URL'),
+    max_entradas=int(os.environ.get('CACHE_MAX_ENTRADAS', 1024)),
+    ttl=float(os.environ.get('CACHE_TTL', 300)),
+)
+
+
+def clave_desde(ruta, args):
+    # Ruta + parámetros ordenados, para que ?a=1&b=2 y ?b=2&a=1 compartan entrada
+    args = sorted(args.items(multi=True))
+    return ruta + ('?' + urlencode(args) if args else '')
+
+
+def clave_peticion():
+    return clave_desde(request.path, request.args)
+
+
+def cacheado(espacio):
+    # `espacio` puede ser una función de los parámetros de la ruta
+    # (p. ej. un espacio por torneo)
+    def decorador(f):
+        @wraps(f)
+        def envoltura(*args, **kwargs):
+            nombre = espacio(**kwargs) if callable(espacio) else espacio
+            clave = clave_peticion()
+            version = versiones.obtener(nombre)
+            guardado = cache.get(nombre, clave)
+            # Cada entrada lleva la versión con la que se leyó: si el espacio
+            # ha cambiado desde entonces no vale, aunque se guardara después
+            # de invalidarlo
+            if guardado is not FALTA and guardado[0] == version[0]:
+                _, cuerpo, estado, cabeceras = guardado
+                return app.response_class(cuerpo, status=estado, headers=cabeceras)
+
+            respuesta = make_response(f(*args, **kwargs))
+            # No se guardan errores (ejecutar_sql devuelve {"error"} con 200)
+            # ni lo leído antes del último cambio del espacio
+            if respuesta.status_code == 200 and not g.get('_db_fallo') and al_dia(nombre, version):
+                cabeceras = [(k, v) for k, v in respuesta.headers
+                             if k not in ('Content-Length', 'Set-Cookie')]
+                cache.set(nombre, clave, (version[0], respuesta.get_data(), respuesta.status_code, cabeceras))
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def invalidar_cache(*espacios):
+    # Dentro de una petición se invalida tras el commit, para que ninguna
+    # petición concurrente vuelva a guardar los datos anteriores
+    if has_request_context():
+        g.setdefault('_invalidar', set()).update(espacios)
+        return
+    lsn = None
+    if replicas:
+        with conectar() as conn:
+            lsn = lsn_primaria(conn)
+    for espacio in espacios:
+        invalidar_espacio(espacio, lsn)
+
+
+def invalidar_espacio(espacio, lsn=None):
+    # Ya confirmado: nueva versión (ETag) para el espacio y fuera la caché.
+    # Primero la versión: una lectura anterior al commit que pase al_dia()
+    # entre las dos llamadas guardaría su entrada con la versión vieja.
+    # `lsn`: posición del WAL de la primaria tras el commit (ver al_dia)
+    if espacio.startswith(consultas.PREFIJO_MEMBRESIA):
+        if membresias is not None:
+            versiones_membresia.cambiar(espacio)
+        return
+    versiones.cambiar(espacio, lsn)
+    cache.invalidar(espacio)
+
+
+# -------------------- Réplicas y caché --------------------
+# Las lecturas cacheadas y con ETag también van a las réplicas. Para que una
+# réplica con retraso no vuelva a guardar (o etiquetar con la versión nueva)
+# los datos de antes de un cambio, la versión de cada espacio lleva la
+# posición del WAL de la primaria tras el commit, y solo se guarda lo leído
+# de una réplica que ya la ha aplicado.
+def lsn_primaria(conn):
+    if not replicas:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_current_wal_lsn()::text')
+            return cur.fetchone()[0]
+    except Exception:
+        logger.exception("Error al leer la posición del WAL")
+        return None
+
+
+def al_dia(espacio, version):
+    """True si lo leído en la petición puede guardarse con `version` del espacio.
+
+    `version` se obtiene antes de leer: si el espacio cambia mientras tanto,
+    lo leído puede ser anterior y no se guarda.
+    """
+    if versiones.obtener(espacio)[0] != version[0]:
+        return False
+    conn = g.get('_db_conn')
+    lsn = version[2]
+    if conn is None or lsn is None or leido_de_primaria():
+        return True
+    # @versionado y @cacheado preguntan por la misma posición en cada petición
+    comprobadas = g.setdefault('_lsn_aplicado', {})
+    if lsn not in comprobadas:
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn', (lsn,))
+                comprobadas[lsn] = bool(cur.fetchone()[0])
+        except Exception:
+            logger.exception("Error al comprobar el retraso de la réplica")
+            comprobadas[lsn] = False
+    return comprobadas[lsn]
+
+
+# -------------------- Pertenencia a equipos --------------------
+# (id_equipo, es_fundador) de cada usuario, para responder sin consultar
+# "UsuarioEquipo" a quien no tiene equipo (/equipo/usuario, salirse). Al
+# unirse, salir, crear o borrar el equipo cambia la versión del usuario y las
+# entradas guardadas con la anterior dejan de valer, aunque se guarden
+# después (una lectura anterior al commit que termina tras la invalidación).
+# Solo con CACHE_URL: con una caché por worker, la invalidación de uno no
+# llegaría a los demás.
+if os.environ.get('CACHE_URL'):
+    membresias = crear_cache(
+        os.environ['CACHE_URL'],
+        max_entradas=int(os.environ.get('MEMBRESIA_CACHE_MAX', 10000)),
+        ttl=float(os.environ.get('MEMBRESIA_TTL', 120)),
+    )
+    versiones_membresia = Versiones(membresias)
+else:
+    membresias = versiones_membresia = None
+
+
+def leido_de_primaria():
+    # Si las consultas de esta petición han ido a la primaria
+    lote = g.get('_lote')
+    return (lote.origen if lote is not None else g.get('_db_pool', pool)) is pool
+
+
+def membresia(id_usuario):
+    # None sin caché o si la consulta falla: entonces decide la sentencia
+    if membresias is None:
+        return None
+    espacio = consultas.espacio_membresia(id_usuario)
+    version = versiones_membresia.obtener(espacio)
+    guardada = membresias.get(espacio, 'equipo')
+    if guardada is not FALTA and guardada[0] == version:
+        return guardada[1]
+    filas = ejecutar_sql(consultas.MEMBRESIA, (id_usuario,))
+    if isinstance(filas, dict):
+        return None
+    actual = (filas[0]['equipo_id'], filas[0]['es_fundador']) if filas else (None, False)
+    # Una réplica con retraso no rellena la caché
+    if leido_de_primaria():
+        membresias.set(espacio, 'equipo', (version, actual))
+    return actual
+
+
+# -------------------- Peticiones condicionales (ETag / 304) --------------------
+# Cada espacio de caché tiene una versión que cambia con cada escritura que lo
+# invalida. El ETag combina esa versión con la URL, así que un sondeo con un
+# If-None-Match que coincide recibe 304 sin tocar la base de datos.
+# Solo hay ETag con CACHE_URL: con versiones locales, un worker seguiría
+# respondiendo 304 a un ETag que otro ya ha dejado atrás. Sin ella las
+# versiones solo sirven a al_dia().
+versiones = Versiones(crear_cache(
+    os.environ.get('CACHE_URL'),
+    max_entradas=int(os.environ.get('CACHE_MAX_ENTRADAS', 1024)),
+    ttl=float(os.environ.get('CACHE_TTL', 300)),
+))
+ETAGS = bool(os.environ.get('CACHE_URL'))
+
+
+def etiqueta_version(espacio, clave, version=None):
+    # (etag, modificado) de la representación `clave` del espacio
+    token, modificado, _ = version or versiones.obtener(espacio)
+    resumen = hashlib.sha1(clave.encode('utf-8')).hexdigest()[:12]
+    return f'{token}-{resumen}', datetime.fromtimestamp(modificado, timezone.utc)
+
+
+def versionado(espacio):
+    # Sin ETag si lo leído puede ser anterior a la versión (ver al_dia): el
+    # cliente guardaría datos viejos con la versión nueva
+    def decorador(f):
+        if not ETAGS:
+            return f
+
+        @wraps(f)
+        def envoltura(*args, **kwargs):
+            nombre = espacio(**kwargs) if callable(espacio) else espacio
+            version = versiones.obtener(nombre)
+            etag, modificado = etiqueta_version(nombre, clave_peticion(), version)
+            if request.if_none_match.contains(etag):
+                respuesta = app.response_class(status=304)
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200 or g.get('_db_fallo') or not al_dia(nombre, version):
+                    return respuesta
+            respuesta.set_etag(etag)
+            respuesta.last_modified = modificado
+            return respuesta
+        return envoltura
+    return decorador
+
+# -------------------- Paginación --------------------
+# Los listados grandes se paginan por clave: ?limit=N&cursor=<token>&fields=a,b.
+# El cuerpo sigue siendo una lista; el cursor de la página siguiente va en
+# la cabecera X-Siguiente-Cursor (y en Link: rel="next").
+def listar_paginado(listado, params=()):
+    try:
+        sql, params, limite, campos = listado.consulta(request.args, params)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+
+    datos = ejecutar_sql_filas(sql, params)
+    if isinstance(datos, dict):
+        return jsonify(datos)
+
+    filas, siguiente = listado.pagina(datos, limite, campos)
+    respuesta = jsonify(filas)
+    if siguiente:
+        respuesta.headers['X-Siguiente-Cursor'] = siguiente
+        respuesta.headers['Link'] = enlace_siguiente(request.path, request.args, siguiente, limite)
+    return respuesta
+
+
+def enlace_siguiente(ruta, args, cursor, limite):
+    args = args.to_dict()
+    args.update(cursor=cursor, limit=limite)
+    return f'<{ruta}?{urlencode(args)}>; rel="next"'
+
+# -------------------- Estado --------------------
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/estado/pool', methods=['GET'])
+def estado_pool():
+    estadisticas = pool.estadisticas()
+    estadisticas['replicas'] = [r.estadisticas() for r in replicas]
+    return jsonify(estadisticas)
+
+
+@app.route('/estado/cache', methods=['GET'])
+def estado_cache():
+    return jsonify(cache.estadisticas())
+
+
+@app.route('/estado/tokens', methods=['GET'])
+def estado_tokens():
+    return jsonify(tokens_verificados.estadisticas())
+
+
+@app.route('/estado/preparadas', methods=['GET'])
+def estado_preparadas():
+    return jsonify(sentencias_preparadas.estadisticas())
+
+
+@app.route('/estado/directo', methods=['GET'])
+def estado_directo():
+    return jsonify(difusor.estadisticas())
+
+
+@app.route('/estado/resultados', methods=['GET'])
+def estado_resultados():
+    return jsonify(volcador.estadisticas())
+
+
+@app.route('/estado/liga', methods=['GET'])
+def estado_liga():
+    return jsonify(refresco_liga.estadisticas())
+
+
+@app.route('/estado/hashing', methods=['GET'])
+def estado_hashing():
+    return jsonify(hasher.estadisticas())
+
 # -------------------- Rutas Públicas --------------------
 @app.route('/usuario/login', methods=['POST'])
 def login():
@@ -111,14 +773,22 @@ def login():
     if not email or not password:
         return jsonify({'error': 'Email y contraseña son requeridos'}), 400
 
-    usuario = ejecutar_sql('SELECT * FROM "Usuario" WHERE email = %s', (email,))
+    usuario = ejecutar_sql(consultas.USUARIO_POR_EMAIL, (email,))
     if not usuario:
         return jsonify({'error': 'Usuario no encontrado'}), 404
     usuario = usuario[0]
 
-    if not bcrypt.checkpw(password.encode('utf-8'), usuario['contraseña'].encode('utf-8')):
+    if not hasher.comprobar(password, usuario['contraseña']):
         return jsonify({'error': 'Contraseña incorrecta'}), 401
 
+    # Si el coste configurado ha cambiado, se aprovecha el login para rehacer el hash
+    if hasher.necesita_rehash(usuario['contraseña']):
+        try:
+            ejecutar_sql('UPDATE "Usuario" SET contraseña = %s WHERE id_usuario = %s',
+                         (hasher.hashear(password), usuario['id_usuario']))
+        except HashingSaturado:
+            pass
+
     token = jwt.encode({
         'usuario': {
             'id': usuario['id_usuario'],
@@ -147,7 +817,7 @@ def registrar_usuario():
     email = data['email']
     contraseña_plana = data['contraseña']
     rol = 'jugador'
-    hashed = bcrypt.hashpw(contraseña_plana.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed = hasher.hashear(contraseña_plana)
 
     sql_usuario = 'INSERT INTO "Usuario" (nombre, email, contraseña, rol) VALUES (%s, %s, %s, %s) RETURNING id_usuario'
     result_usuario = ejecutar_sql(sql_usuario, (nombre, email, hashed, rol))
@@ -178,37 +848,28 @@ def registrar_usuario():
 
 
 @app.route('/torneos', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
 def obtener_torneos():
-
-    datos = ejecutar_sql('SELECT * FROM "Torneo" ORDER BY fecha_inicio DESC')
-    return jsonify(datos)
+    return listar_paginado(consultas.LISTADO_TORNEOS)
 
 
 
 @app.route('/eventos', methods=['GET'])
+@versionado('eventos')
+@cacheado('eventos')
 def obtener_eventos():
-    datos = ejecutar_sql('SELECT * FROM "Evento" ORDER BY año DESC')
-    return jsonify(datos)
+    return listar_paginado(consultas.LISTADO_EVENTOS)
 
 @app.route('/equipos', methods=['GET'])
 def obtener_equipos():
-    datos = ejecutar_sql('SELECT * FROM "Equipo"')
-    return jsonify(datos)
+    return listar_paginado(consultas.LISTADO_EQUIPOS)
 
 
 
 @app.route('/equipos/por-juego/<int:id_juego>', methods=['GET'])
 def obtener_equipos_por_juego(id_juego):
-    # Ahora usamos et.id_torneo (la FK correcta) para relacionar equipos con torneos
-    sql = '''
-        SELECT DISTINCT e.id_equipo, e.nombre, e.victorias, e.derrotas
-        FROM "Equipo" e
-        JOIN "EquipoTorneo" et ON e.id_equipo = et.equipo_id
-        JOIN "Torneo" t ON et.id_torneo = t.id_torneo
-        WHERE t.id_juego = %s
-    '''
-    datos = ejecutar_sql(sql, (id_juego,))
-    return jsonify(datos)
+    return listar_paginado(consultas.LISTADO_EQUIPOS_POR_JUEGO, (id_juego,))
 
 @app.route('/equipos/liga/<int:id_juego>', methods=['GET'])
 def obtener_equipos_en_liga(id_juego):
@@ -218,83 +879,139 @@ def obtener_equipos_en_liga(id_juego):
         JOIN "LigaEquipo" le ON e.id_equipo = le.id_equipo
         WHERE le.id_juego = %s
     '''
-    datos = ejecutar_sql(sql, (id_juego,))
+    datos = ejecutar_sql_filas(sql, (id_juego,))
     return jsonify(datos)
 
 
 
+# Búsqueda por nombre para autocompletar. Las respuestas de los textos más
+# pedidos (los prefijos cortos, sobre todo) se guardan unos segundos en memoria.
+BUSCAR_LIMITE_MAXIMO = 20
+busquedas = CacheLocal(
+    max_entradas=int(os.environ.get('BUSCAR_CACHE_MAX', 2048)),
+    ttl=float(os.environ.get('BUSCAR_CACHE_TTL', 30)),
+)
+
+
+def fin_prefijo(texto):
+    """Menor texto posterior a todos los que empiezan por `texto`, o None.
+
+    Con COLLATE "C" y UTF-8 el orden es el de los code points. El último
+    carácter se sustituye por el siguiente, saltando los sustitutos (no se
+    pueden codificar) y quitando los U+10FFFF, que no tienen siguiente.
+    """
+    while texto:
+        siguiente = ord(texto[-1]) + 1
+        if siguiente == 0xD800:
+            siguiente = 0xE000
+        if siguiente <= 0x10FFFF:
+            return texto[:-1] + chr(siguiente)
+        texto = texto[:-1]
+    return None
+
+
+def parametros_busqueda(args):
+    """Parámetros de consultas.BUSCAR a partir de ?q=&tipo=equipo|jugador&limit=."""
+    texto = ' '.join(args.get('q', '').split()).lower()
+    if not texto or len(texto) > 100:
+        raise ParametroInvalido('q debe tener entre 1 y 100 caracteres')
+    hasta = fin_prefijo(texto)
+    if hasta is None:
+        raise ParametroInvalido('q no es un texto de búsqueda válido')
+    tipo = args.get('tipo')
+    if tipo not in (None, 'equipo', 'jugador'):
+        raise ParametroInvalido('tipo debe ser "equipo" o "jugador"')
+    try:
+        limite = min(int(args.get('limit', 10)), BUSCAR_LIMITE_MAXIMO)
+    except ValueError:
+        raise ParametroInvalido('limit debe ser un número entero')
+    if limite < 1:
+        raise ParametroInvalido('limit debe ser mayor que 0')
+    return {
+        'equipos': tipo != 'jugador',
+        'jugadores': tipo != 'equipo',
+        # Prefijo como rango: 'abc' <= nombre < 'abd'
+        'desde': texto,
+        'hasta': hasta,
+        'texto': texto,
+        'difusa': len(texto) >= 3,
+        'limite': limite,
+    }
+
+
+def clave_busqueda(params):
+    return f"{params['equipos']:d}{params['jugadores']:d}:{params['limite']}:{params['texto']}"
+
+
+@app.route('/buscar', methods=['GET'])
+def buscar():
+    try:
+        params = parametros_busqueda(request.args)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+
+    clave = clave_busqueda(params)
+    datos = busquedas.get('buscar', clave)
+    if datos is FALTA:
+        datos = ejecutar_sql_filas(consultas.BUSCAR, params)
+        if isinstance(datos, dict):
+            return jsonify(datos), 500
+        busquedas.set('buscar', clave, datos)
+    return jsonify(datos)
+
+
+# Tabla de la liga de un juego, precalculada en "TablaLiga" (liga.py); va como
+# mucho LIGA_INTERVALO segundos por detrás de clasificaciones y resultados
+refresco_liga = RefrescoLiga(transaccion)
+
+
+@app.route('/liga/<int:id_juego>/tabla', methods=['GET'])
+def tabla_liga(id_juego):
+    return listar_paginado(consultas.LISTADO_TABLA_LIGA, (id_juego,))
+
+
 @app.route('/jugadores/por-juego/<int:id_juego>', methods=['GET'])
 def obtener_jugadores_por_juego(id_juego):
-    sql = '''
-        SELECT u.id_usuario, u.nombre
-        FROM "Usuario" u
-        JOIN "LigaIndividual" li ON u.id_usuario = li.id_usuario
-        WHERE li.id_juego = %s
-        ORDER BY u.nombre
-    '''
-    datos = ejecutar_sql(sql, (id_juego,))
-    return jsonify(datos)
+    return listar_paginado(consultas.LISTADO_JUGADORES_POR_JUEGO, (id_juego,))
 
 
 
 @app.route('/juegos', methods=['GET'])
+@versionado('juegos')
+@cacheado('juegos')
 def obtener_juegos():
     tipo = request.args.get('tipo')
-    if tipo == 'equipo':
-        datos = ejecutar_sql('SELECT * FROM "Juego" WHERE es_individual = FALSE')
-    elif tipo == 'individual':
-        datos = ejecutar_sql('SELECT * FROM "Juego" WHERE es_individual = TRUE')
-    else:
-        datos = ejecutar_sql('SELECT * FROM "Juego"')
+    datos = ejecutar_sql_filas(consultas.JUEGOS.get(tipo, consultas.JUEGOS[None]))
     return jsonify(datos)
 
 
 @app.route('/torneos/por-juego/<int:id_juego>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
 def obtener_torneos_por_juego(id_juego):
-    datos = ejecutar_sql('''
-        SELECT * FROM "Torneo"
-        WHERE id_juego = %s
-        ORDER BY fecha_inicio DESC
-    ''', (id_juego,))
+    datos = ejecutar_sql_filas(consultas.TORNEOS_POR_JUEGO, (id_juego,))
     return jsonify(datos)
 
 @app.route('/torneos/completos/<int:id_juego>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
 def obtener_torneos_completos(id_juego):
-    datos = ejecutar_sql('''
-        SELECT t.id_torneo, t.nombre, t.fecha_inicio, t.fecha_fin, t.ubicacion,
-               e.id_evento, e.nombre AS nombre_evento
-        FROM "Torneo" t
-        LEFT JOIN "Evento" e ON t.id_evento = e.id_evento
-        WHERE t.id_juego = %s
-        ORDER BY t.fecha_inicio DESC
-    ''', (id_juego,))
+    datos = ejecutar_sql_filas(consultas.TORNEOS_COMPLETOS, (id_juego,))
     return jsonify(datos)
 
 @app.route('/torneos/evento/<int:id_evento>', methods=['GET'])
+@versionado('torneos')
+@cacheado('torneos')
 def obtener_torneos_por_evento(id_evento):
-    datos = ejecutar_sql('''
-        SELECT t.id_torneo, t.nombre, t.fecha_inicio, t.fecha_fin, t.ubicacion,
-               e.id_evento, e.nombre AS nombre_evento, t.id_juego
-        FROM "Torneo" t
-        LEFT JOIN "Evento" e ON t.id_evento = e.id_evento
-        WHERE t.id_evento = %s
-        ORDER BY t.fecha_inicio DESC
-    ''', (id_evento,))
+    datos = ejecutar_sql_filas(consultas.TORNEOS_POR_EVENTO, (id_evento,))
     return jsonify(datos)
 
 
 
 @app.route('/clasificacion/<int:torneo_id>', methods=['GET'])
+@versionado(consultas.espacio_torneo)
 def clasificacion_torneo(torneo_id):
-    datos = ejecutar_sql('''
-        SELECT c.id_clasificacion, c.puntos, c.posicion,
-               u.nombre AS usuario, eq.nombre AS equipo
-        FROM "Clasificacion" c
-        LEFT JOIN "Usuario" u ON c.id_usuario = u.id_usuario
-        LEFT JOIN "Equipo" eq ON c.id_equipo = eq.id_equipo
-        WHERE c.id_torneo = %s
-        ORDER BY c.posicion ASC
-    ''', (torneo_id,))
+    datos = ejecutar_sql_filas(consultas.CLASIFICACION_TORNEO, (torneo_id,))
 
     if not datos:
         return jsonify({"message": "No hay clasificación para este torneo"}), 404
@@ -302,25 +1019,56 @@ def clasificacion_torneo(torneo_id):
     return jsonify(datos)
 
 
+# Clasificación en directo: en lugar de sondear /clasificacion/<id>, el
+# cliente abre un EventSource y recibe la clasificación cada vez que cambia
+def clasificacion_json(torneo_id):
+    datos = ejecutar_sql_filas(consultas.CLASIFICACION_TORNEO, (torneo_id,))
+    if isinstance(datos, dict):
+        return None
+    return app.json.dumps(datos)
+
+
+difusor = Difusor(DB_CONFIG, cargar=clasificacion_json)
+
+
+@app.route('/clasificacion/<int:torneo_id>/stream', methods=['GET'])
+@solo_primaria
+@en_streaming
+def clasificacion_stream(torneo_id):
+    # Primero la suscripción y después la lectura: un cambio entre las dos
+    # llega como evento en lugar de perderse. La conexión de la petición se
+    # devuelve al pool antes de empezar a enviar el stream.
+    suscripcion = difusor.suscribir(torneo_id)
+    inicial = clasificacion_json(torneo_id)
+    return Response(suscripcion.eventos(inicial), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/torneo/<int:torneo_id>/equipos', methods=['GET'])
+@versionado(consultas.espacio_torneo)
 def equipos_en_torneo(torneo_id):
-    datos = ejecutar_sql('''
-        SELECT e.id_equipo, e.nombre
-        FROM "EquipoTorneo" et
-        JOIN "Equipo" e ON et.equipo_id = e.id_equipo
-        WHERE et.torneo_id = %s
-    ''', (torneo_id,))
+    datos = ejecutar_sql_filas(consultas.EQUIPOS_EN_TORNEO, (torneo_id,))
     return jsonify(datos)
 
 
+@app.route('/torneo/<int:torneo_id>/detalle', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+@cacheado(consultas.espacio_torneo)
+def detalle_torneo(torneo_id):
+    # Todo lo que muestra la página de un torneo en una sola consulta; se
+    # invalida al cambiar sus inscripciones o su clasificación
+    resultado = ejecutar_sql(consultas.DETALLE_TORNEO, (torneo_id,))
+    if isinstance(resultado, dict):
+        return jsonify(resultado), 500
+    if not resultado:
+        return jsonify({'error': 'Torneo no encontrado'}), 404
+    return app.response_class(resultado[0]['detalle'], mimetype='application/json')
+
+
 @app.route('/torneo/<int:torneo_id>/jugadores', methods=['GET'])
+@versionado(consultas.espacio_torneo)
 def jugadores_en_torneo(torneo_id):
-    datos = ejecutar_sql('''
-        SELECT u.id_usuario, u.nombre
-        FROM "UsuarioTorneo" ut
-        JOIN "Usuario" u ON ut.usuario_id = u.id_usuario
-        WHERE ut.torneo_id = %s
-    ''', (torneo_id,))
+    datos = ejecutar_sql_filas(consultas.JUGADORES_EN_TORNEO, (torneo_id,))
     return jsonify(datos)
 
 # -------------------- Rutas Privadas --------------------
@@ -361,6 +1109,7 @@ def crear_equipo(usuario):
 
         # Añadimos al fundador como miembro
         ejecutar_sql('INSERT INTO "UsuarioEquipo" (usuario_id, equipo_id) VALUES (%s, %s)', (id_fundador, id_equipo))
+        invalidar_cache(consultas.espacio_membresia(id_fundador))
 
         equipo_creado = {
             'id_equipo': id_equipo,
@@ -379,34 +1128,15 @@ def crear_equipo(usuario):
 @app.route('/equipo/salirse', methods=['POST'])
 @token_required
 def salir_del_equipo(usuario):
-    # Buscar equipo al que pertenece el usuario
-    equipo_usuario = ejecutar_sql('SELECT equipo_id FROM "UsuarioEquipo" WHERE usuario_id = %s', (usuario['id'],))
-    if not equipo_usuario or len(equipo_usuario) == 0:
-        return jsonify({'mensaje': 'No perteneces a ningún equipo'}), 400
-
-    id_equipo = equipo_usuario[0]['equipo_id']
-
-    # Obtener fundador del equipo
-    equipo = ejecutar_sql('SELECT fundador FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-    if not equipo or len(equipo) == 0:
-        return jsonify({'mensaje': 'Equipo no encontrado'}), 404
-
-    fundador_id = equipo[0]['fundador']
-
-    if usuario['id'] == fundador_id:
-        # Si es fundador, eliminar todos los usuarios de ese equipo y borrar el equipo
-        ejecutar_sql('DELETE FROM "UsuarioEquipo" WHERE equipo_id = %s', (id_equipo,))
-        ejecutar_sql('DELETE FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-        return jsonify({'mensaje': 'Te has salido y el equipo ha sido eliminado porque eras el fundador.'})
-    else:
-        # Si no es fundador, solo eliminar la relación de usuario con el equipo
-        ejecutar_sql('DELETE FROM "UsuarioEquipo" WHERE usuario_id = %s AND equipo_id = %s', (usuario['id'], id_equipo))
-        return jsonify({'mensaje': 'Te has salido del equipo correctamente.'})
+    return ejecutar_operacion(consultas.SALIR_DEL_EQUIPO, usuario)
 
 
 @app.route('/equipo/usuario', methods=['GET'])
 @token_required
 def obtener_equipo_usuario(usuario):
+    actual = membresia(usuario['id'])
+    if actual is not None and actual[0] is None:
+        return jsonify({}), 204
     equipo = ejecutar_sql('''
         SELECT e.id_equipo, e.nombre, e.fundador, e.fecha_creacion, e.codigo, e.victorias, e.derrotas
         FROM "Equipo" e
@@ -435,11 +1165,7 @@ def obtener_miembros_equipo(usuario, id_equipo):
 @app.route('/equipo/codigo/<codigo>', methods=['GET'])
 @token_required
 def obtener_equipo_por_codigo(usuario, codigo):
-    equipo = ejecutar_sql('''
-        SELECT id_equipo, nombre, victorias, derrotas, fundador, fecha_creacion, codigo
-        FROM "Equipo"
-        WHERE codigo = %s
-    ''', (codigo,))
+    equipo = ejecutar_sql(consultas.EQUIPO_POR_CODIGO, (codigo,))
 
     if equipo and len(equipo) > 0:
         # Devolvemos el primer (único) resultado
@@ -451,19 +1177,7 @@ def obtener_equipo_por_codigo(usuario, codigo):
 @app.route('/equipo/unirse/<codigo>', methods=['POST'])
 @token_required
 def unirse_equipo_por_codigo(usuario, codigo):
-    equipo = ejecutar_sql('SELECT id_equipo FROM "Equipo" WHERE codigo = %s', (codigo,))
-    if not equipo or len(equipo) == 0:
-        return jsonify({'mensaje': 'Código de equipo no válido'}), 404
-
-    # `equipo` es lista, así que accedes al primer elemento con [0]
-    id_equipo = equipo[0]['id_equipo']
-
-    pertenece = ejecutar_sql('SELECT * FROM "UsuarioEquipo" WHERE usuario_id = %s', (usuario['id'],))
-    if pertenece and len(pertenece) > 0:
-        return jsonify({'mensaje': 'Ya perteneces a un equipo'}), 400
-
-    ejecutar_sql('INSERT INTO "UsuarioEquipo" (equipo_id, usuario_id) VALUES (%s, %s)', (id_equipo, usuario['id']))
-    return jsonify({'mensaje': 'Te has unido al equipo correctamente'})
+    return ejecutar_operacion(consultas.UNIRSE_EQUIPO_POR_CODIGO, usuario, codigo=codigo)
 
 
 
@@ -493,7 +1207,7 @@ def editar_usuario(usuario, id_usuario):
         sql_set.append('email = %s')
         params.append(email)
     if contraseña:
-        hashed = bcrypt.hashpw(contraseña.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed = hasher.hashear(contraseña)
         sql_set.append('contraseña = %s')
         params.append(hashed)
 
@@ -501,147 +1215,44 @@ def editar_usuario(usuario, id_usuario):
         return jsonify({'error': 'No hay datos para actualizar'}), 400
 
     params.append(id_usuario)
+    # Torneos en los que aparece su nombre (clasificación, jugadores, rondas)
     sql = f'''
     UPDATE "Usuario" SET {", ".join(sql_set)} WHERE id_usuario = %s
-    RETURNING id_usuario AS id, nombre, rol, email
+    RETURNING id_usuario AS id, nombre, rol, email,
+              ARRAY(SELECT ut.id_torneo FROM "UsuarioTorneo" ut
+                    WHERE ut.usuario_id = "Usuario".id_usuario) AS torneos
     '''
     resultado = ejecutar_sql(sql, tuple(params))
     if not resultado or "error" in resultado:
         return jsonify({'error': 'Error al actualizar usuario'}), 500
 
     usuario_actualizado = resultado[0]
+    torneos = usuario_actualizado.pop('torneos')
+    if nombre:
+        invalidar_cache(*(consultas.espacio_torneo(t) for t in torneos))
     return jsonify(usuario_actualizado)
 
 
 @app.route('/inscribir/jugador', methods=['POST'])
 @token_required
 def inscribir_jugador(usuario):
-    data = request.json
-    if not data:
-        return jsonify({'error': 'JSON inválido o no enviado'}), 400
-
-    id_torneo = data.get('id_torneo')
-    if not id_torneo:
-        return jsonify({'error': 'Falta id_torneo'}), 400
-
-    id_usuario = usuario['id']
-
-    torneo = ejecutar_sql('SELECT * FROM "Torneo" WHERE id_torneo = %s', (id_torneo,))
-    if not torneo:
-        return jsonify({'error': 'Torneo no encontrado'}), 404
-    torneo = torneo[0]
-
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (torneo['id_juego'],))
-    if not juego or not juego[0]['es_individual']:
-        return jsonify({'error': 'Este torneo no es para jugadores individuales'}), 403
-
-    # Verificar si ya está inscrito
-    inscritos = ejecutar_sql(
-        'SELECT * FROM "UsuarioTorneo" WHERE usuario_id = %s AND id_torneo = %s',
-        (id_usuario, id_torneo)
-    )
-    if inscritos:
-        return jsonify({'error': 'Jugador ya inscrito en este torneo'}), 405
-
-    try:
-        ejecutar_sql('INSERT INTO "UsuarioTorneo" (usuario_id, id_torneo) VALUES (%s, %s)', (id_usuario, id_torneo))
-
-        # Insertar en Clasificacion con valores iniciales
-        ejecutar_sql(
-            '''INSERT INTO "Clasificacion" 
-               (id_torneo, id_equipo, id_usuario, puntos, posicion)
-               VALUES (%s, %s, %s, %s, %s)''',
-            (id_torneo, None, id_usuario, 0, None)
-        )
-    except Exception as e:
-        return jsonify({'error': f'Error al inscribir jugador: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Jugador inscrito en torneo'}), 201
+    return ejecutar_operacion(consultas.INSCRIBIR_JUGADOR, usuario)
 
 
 @app.route('/torneo/<int:torneo_id>/salir', methods=['POST'])
 @token_required
 def salir_torneo(usuario, torneo_id):
-    id_usuario = usuario['id']
-
-    torneo = ejecutar_sql('SELECT * FROM "Torneo" WHERE id_torneo = %s', (torneo_id,))
-    if not torneo:
-        return jsonify({'error': 'Torneo no encontrado'}), 404
-
-    inscritos = ejecutar_sql(
-        'SELECT * FROM "UsuarioTorneo" WHERE usuario_id = %s AND id_torneo = %s',
-        (id_usuario, torneo_id)
-    )
-    if not inscritos:
-        return jsonify({'error': 'No estás inscrito en este torneo'}), 400
-
-    try:
-        ejecutar_sql('DELETE FROM "UsuarioTorneo" WHERE usuario_id = %s AND id_torneo = %s', (id_usuario, torneo_id))
-        ejecutar_sql('DELETE FROM "Clasificacion" WHERE id_usuario = %s AND id_torneo = %s', (id_usuario, torneo_id))
-    except Exception as e:
-        return jsonify({'error': f'Error al salir del torneo: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Saliste del torneo correctamente'})
+    return ejecutar_operacion(consultas.SALIR_TORNEO, usuario, torneo_id=torneo_id)
 
 @app.route('/unirse/juego-individual', methods=['POST'])
 @token_required
 def unirse_juego_individual(usuario):
-    data = request.json
-    if not data or 'id_juego' not in data:
-        return jsonify({'error': 'Falta id_juego'}), 400
-
-    id_usuario = usuario['id']
-    id_juego = data['id_juego']
-
-    # Verificar que el juego es individual
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (id_juego,))
-    if not juego:
-        return jsonify({'error': 'Juego no encontrado'}), 404
-    if not juego[0]['es_individual']:
-        return jsonify({'error': 'El juego no es individual'}), 400
-
-    # Verificar si ya está inscrito en ese juego
-    ya_inscrito = ejecutar_sql('SELECT * FROM "LigaIndividual" WHERE id_usuario = %s AND id_juego = %s', (id_usuario, id_juego))
-    if ya_inscrito:
-        return jsonify({'error': 'Ya estás inscrito en este juego individual'}), 409
-
-    # Insertar inscripción
-    try:
-        ejecutar_sql('INSERT INTO "LigaIndividual" (id_usuario, id_juego) VALUES (%s, %s)', (id_usuario, id_juego))
-    except Exception as e:
-        return jsonify({'error': f'Error al inscribirse en el juego individual: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Inscripción al juego individual realizada correctamente'}), 201
+    return ejecutar_operacion(consultas.UNIRSE_JUEGO_INDIVIDUAL, usuario)
 
 @app.route('/salir/juego-individual', methods=['POST'])
 @token_required
 def salir_juego_individual(usuario):
-    data = request.json
-    if not data or 'id_juego' not in data:
-        return jsonify({'error': 'Falta id_juego'}), 400
-
-    id_usuario = usuario['id']
-    id_juego = data['id_juego']
-
-    # Verificar que el juego es individual
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (id_juego,))
-    if not juego:
-        return jsonify({'error': 'Juego no encontrado'}), 404
-    if not juego[0]['es_individual']:
-        return jsonify({'error': 'El juego no es individual'}), 400
-
-    # Verificar si está inscrito en ese juego
-    inscrito = ejecutar_sql('SELECT * FROM "LigaIndividual" WHERE id_usuario = %s AND id_juego = %s', (id_usuario, id_juego))
-    if not inscrito:
-        return jsonify({'error': 'No estás inscrito en este juego individual'}), 409
-
-    # Eliminar inscripción
-    try:
-        ejecutar_sql('DELETE FROM "LigaIndividual" WHERE id_usuario = %s AND id_juego = %s', (id_usuario, id_juego))
-    except Exception as e:
-        return jsonify({'error': f'Error al salir del juego individual: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Has salido correctamente del juego individual'}), 200
+    return ejecutar_operacion(consultas.SALIR_JUEGO_INDIVIDUAL, usuario)
 
 @app.route('/equipo/fundador/<int:id_usuario>', methods=['GET'])
 @token_required
@@ -667,177 +1278,24 @@ def get_equipo_por_fundador(usuario, id_usuario):
 @app.route('/inscribir/equipo', methods=['POST'])
 @token_required
 def inscribir_equipo(usuario):
-    data = request.json
-    id_torneo = data.get('id_torneo')
-    id_equipo = data.get('id_equipo')
-
-    if not id_torneo or not id_equipo:
-        return jsonify({'error': 'Faltan datos obligatorios (id_torneo, id_equipo)'}), 400
-
-    torneo = ejecutar_sql('SELECT * FROM "Torneo" WHERE id_torneo = %s', (id_torneo,))
-    if not torneo:
-        return jsonify({'error': 'Torneo no encontrado'}), 404
-    torneo = torneo[0]
-
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (torneo['id_juego'],))
-    if not juego or juego[0]['es_individual']:
-        return jsonify({'error': 'Este torneo no es para equipos'}), 400
-
-    equipo = ejecutar_sql('SELECT * FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-    if not equipo:
-        return jsonify({'error': 'Equipo no encontrado'}), 404
-
-    if equipo[0]['fundador'] != usuario['id']:
-        return jsonify({'error': 'Solo el fundador del equipo puede inscribirlo'}), 403
-
-    ya_inscrito = ejecutar_sql('SELECT * FROM "EquipoTorneo" WHERE equipo_id = %s AND id_torneo = %s', (id_equipo, id_torneo))
-    if ya_inscrito:
-        return jsonify({'error': 'El equipo ya está inscrito en este torneo'}), 400
-
-    try:
-        ejecutar_sql('INSERT INTO "EquipoTorneo" (equipo_id, id_torneo) VALUES (%s, %s)', (id_equipo, id_torneo))
-
-        # Insertar en Clasificacion para el equipo
-        ejecutar_sql(
-            '''INSERT INTO "Clasificacion" (id_torneo, id_equipo, id_usuario, puntos, posicion)
-               VALUES (%s, %s, %s, %s, %s)''',
-            (id_torneo, id_equipo, None, 0, None)
-        )
-    except Exception as e:
-        return jsonify({'error': f'Error al inscribir equipo: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Equipo inscrito en torneo'}), 200
+    return ejecutar_operacion(consultas.INSCRIBIR_EQUIPO, usuario)
 
 
 @app.route('/unirse/juego-equipo', methods=['POST'])
 @token_required
 def unirse_juego_equipo(usuario):
-    print("Usuario recibido:", usuario)
-
-    data = request.json
-    id_juego = data.get('id_juego')
-    id_equipo = data.get('id_equipo')
-
-    if not id_juego or not id_equipo:
-        return jsonify({'error': 'Faltan datos obligatorios (id_juego, id_equipo)'}), 400
-
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (id_juego,))
-    if not juego:
-        return jsonify({'error': 'Juego no encontrado'}), 404
-    if juego[0]['es_individual']:
-        return jsonify({'error': 'Este juego no es para equipos'}), 400
-
-    print(f"id_equipo recibido: {id_equipo}, tipo: {type(id_equipo)}")
-    equipo = ejecutar_sql('SELECT fundador FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-    print(f"Resultado fundador:", equipo)
-
-    if not equipo:
-        return jsonify({'error': 'Equipo no encontrado'}), 404
-
-    fundador = equipo[0]['fundador']
-    print(f"Fundador en BD: {fundador}, Usuario ID: {usuario.get('id')}")
-
-    if fundador != usuario.get('id'):
-        return jsonify({'error': 'Solo el fundador del equipo puede unirlo a una liga'}), 403
-
-    ya_inscrito = ejecutar_sql(
-        'SELECT * FROM "LigaEquipo" WHERE id_equipo = %s AND id_juego = %s',
-        (id_equipo, id_juego)
-    )
-    if ya_inscrito:
-        return jsonify({'error': 'Este equipo ya está inscrito en la liga de este juego'}), 409
-
-    try:
-        print("Antes:",
-              ejecutar_sql('SELECT * FROM "LigaEquipo" WHERE id_equipo = %s AND id_juego = %s', (id_equipo, id_juego)))
-        ejecutar_sql(
-            'INSERT INTO "LigaEquipo" (id_equipo, id_juego) VALUES (%s, %s)',
-            (id_equipo, id_juego)
-        )
-        print("Después:",
-              ejecutar_sql('SELECT * FROM "LigaEquipo" WHERE id_equipo = %s AND id_juego = %s', (id_equipo, id_juego)))
-
-
-    except Exception as e:
-        return jsonify({'error': f'Error al inscribir equipo en la liga: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'Equipo inscrito en la liga correctamente'}), 201
+    return ejecutar_operacion(consultas.UNIRSE_JUEGO_EQUIPO, usuario)
 
 @app.route('/salir/juego-equipo', methods=['POST'])
 @token_required
 def salir_juego_equipo(usuario):
-    data = request.json
-    if not data or 'id_juego' not in data or 'id_equipo' not in data:
-        return jsonify({'error': 'Faltan datos (id_juego, id_equipo)'}), 400
-
-    id_juego = data['id_juego']
-    id_equipo = data['id_equipo']
-
-    # Verificar que el juego es para equipos
-    juego = ejecutar_sql('SELECT * FROM "Juego" WHERE id_juego = %s', (id_juego,))
-    if not juego:
-        return jsonify({'error': 'Juego no encontrado'}), 404
-    if juego[0]['es_individual']:
-        return jsonify({'error': 'El juego no es para equipos'}), 400
-
-    # Verificar que el usuario es el fundador del equipo
-    equipo = ejecutar_sql('SELECT * FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-    if not equipo:
-        return jsonify({'error': 'Equipo no encontrado'}), 404
-    if equipo[0]['fundador'] != usuario['id']:
-        return jsonify({'error': 'Solo el fundador del equipo puede retirarlo de la liga'}), 403
-
-    # Verificar si está inscrito
-    inscrito = ejecutar_sql(
-        'SELECT * FROM "LigaEquipo" WHERE id_equipo = %s AND id_juego = %s',
-        (id_equipo, id_juego)
-    )
-    if not inscrito:
-        return jsonify({'error': 'El equipo no está inscrito en este juego'}), 409
-
-    try:
-        ejecutar_sql('DELETE FROM "LigaEquipo" WHERE id_equipo = %s AND id_juego = %s', (id_equipo, id_juego))
-    except Exception as e:
-        return jsonify({'error': f'Error al salir del juego de equipos: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'El equipo ha salido correctamente de la liga'}), 200
+    return ejecutar_operacion(consultas.SALIR_JUEGO_EQUIPO, usuario)
 
 
 @app.route('/torneo-equipo/<int:id_torneo>/salir', methods=['POST'])
 @token_required
 def salir_torneo_equipo(usuario, id_torneo):
-    data = request.json
-    id_equipo = data.get('id_equipo')
-    if not id_equipo:
-        return jsonify({'error': 'Falta id_equipo'}), 400
-
-    # Verificar que el torneo existe
-    torneo = ejecutar_sql('SELECT * FROM "Torneo" WHERE id_torneo = %s', (id_torneo,))
-    if not torneo:
-        return jsonify({'error': 'Torneo no encontrado'}), 404
-
-    # Verificar que el usuario es el fundador del equipo
-    equipo = ejecutar_sql('SELECT * FROM "Equipo" WHERE id_equipo = %s', (id_equipo,))
-    if not equipo:
-        return jsonify({'error': 'Equipo no encontrado'}), 404
-    if equipo[0]['fundador'] != usuario['id']:
-        return jsonify({'error': 'Solo el fundador del equipo puede retirarlo del torneo'}), 403
-
-    # Verificar inscripción
-    inscritos = ejecutar_sql(
-        'SELECT * FROM "EquipoTorneo" WHERE equipo_id = %s AND id_torneo = %s',
-        (id_equipo, id_torneo)
-    )
-    if not inscritos:
-        return jsonify({'error': 'El equipo no está inscrito en este torneo'}), 400
-
-    try:
-        ejecutar_sql('DELETE FROM "EquipoTorneo" WHERE equipo_id = %s AND id_torneo = %s', (id_equipo, id_torneo))
-        ejecutar_sql('DELETE FROM "Clasificacion" WHERE id_equipo = %s AND id_torneo = %s', (id_equipo, id_torneo))
-    except Exception as e:
-        return jsonify({'error': f'Error al salir del torneo: {str(e)}'}), 500
-
-    return jsonify({'mensaje': 'El equipo ha salido del torneo correctamente'}), 200
+    return ejecutar_operacion(consultas.SALIR_TORNEO_EQUIPO, usuario, id_torneo=id_torneo)
 
 
 
@@ -848,42 +1306,24 @@ def salir_torneo_equipo(usuario, id_torneo):
 @app.route('/evento/crear', methods=['POST'])
 @admin_required
 def crear_evento(usuario):
-    data = request.json
-    nombre = data.get('nombre')
-    tipo = data.get('tipo')
-    año = data.get('año')
-    mes = data.get('mes')
-
-    # Validaciones básicas
-    if not nombre or not tipo or not año:
-        return jsonify({'error': 'Faltan campos obligatorios: nombre, tipo, año'}), 400
-    if tipo not in ('anual', 'mensual'):
-        return jsonify({'error': 'Tipo de evento inválido, debe ser "anual" o "mensual"'}), 400
-    if tipo == 'mensual' and (mes is None or not (1 <= int(mes) <= 12)):
-        return jsonify({'error': 'Para evento mensual, mes debe estar entre 1 y 12'}), 400
-    if tipo == 'anual':
-        mes = None  # Ignorar mes si es anual
+    try:
+        nombre, tipo, año, mes = importacion.validar_evento(request.json)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
 
     try:
-        if mes is not None:
-            sql = '''
-                INSERT INTO "Evento" (nombre, tipo, año, mes)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id_evento
-            '''
-            resultado = ejecutar_sql(sql, (nombre, tipo, año, mes))
-        else:
-            sql = '''
-                INSERT INTO "Evento" (nombre, tipo, año)
-                VALUES (%s, %s, %s)
-                RETURNING id_evento
-            '''
-            resultado = ejecutar_sql(sql, (nombre, tipo, año))
+        sql = '''
+            INSERT INTO "Evento" (nombre, tipo, año, mes)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id_evento
+        '''
+        resultado = ejecutar_sql(sql, (nombre, tipo, año, mes))
 
         if isinstance(resultado, dict) and 'error' in resultado:
             return jsonify(resultado), 500
 
         id_evento = resultado[0]['id_evento']
+        invalidar_cache('eventos')
         return jsonify({'mensaje': 'Evento creado correctamente', 'id_evento': id_evento})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -892,17 +1332,11 @@ def crear_evento(usuario):
 @app.route('/torneo/crear', methods=['POST'])
 @admin_required
 def crear_torneo(usuario):
-    data = request.json
-    nombre = data.get('nombre')
-    fecha_inicio = data.get('fecha_inicio')
-    fecha_fin = data.get('fecha_fin')
-    ubicacion = data.get('ubicacion')
-    id_evento = data.get('id_evento')  # Puede ser None
-    id_juego = data.get('id_juego')
-
-    # Validaciones básicas
-    if not nombre or not fecha_inicio or not fecha_fin or not id_juego:
-        return jsonify({'error': 'Faltan campos obligatorios: nombre, fecha_inicio, fecha_fin, id_juego'}), 400
+    try:
+        nombre, fecha_inicio, fecha_fin, ubicacion, id_evento, id_juego = \
+            importacion.validar_torneo(request.json)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
 
     # Validar que si hay id_evento, exista en la DB
     if id_evento:
@@ -923,11 +1357,395 @@ def crear_torneo(usuario):
             return jsonify(resultado), 500
 
         id_torneo = resultado[0]['id_torneo']
+        invalidar_cache('torneos')
         return jsonify({'mensaje': 'Torneo creado correctamente', 'id_torneo': id_torneo})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# -------------------- Tareas periódicas --------------------
+@app.before_request
+def arrancar_tareas():
+    volcador.arrancar()
+    refresco_liga.arrancar()
+
+
+# -------------------- Importación masiva --------------------
+def importar(tipo):
+    """Valida e inserta las filas de la petición; devuelve (valores, filas RETURNING).
+
+    Todas las filas se validan antes de escribir: si alguna falla no se
+    inserta ninguna y se lanza Rechazo con los errores por fila.
+    """
+    filas = importacion.leer_filas(request)
+    valores, errores = tipo.validar_filas(filas)
+    if not errores:
+        try:
+            errores = tipo.errores_referencias(
+                valores, lambda sql, ids: {f['id'] for f in ejecutar_sql_params(sql, (ids,))})
+        except Exception as e:
+            raise Rechazo({'error': f'Error al comprobar las referencias: {str(e)}'}, 500)
+    if errores:
+        raise Rechazo({'error': 'No se ha importado ninguna fila', 'errores': errores})
+
+    try:
+        with transaccion() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                creadas = psycopg2.extras.execute_values(
+                    cur, tipo.sql, valores, template=tipo.plantilla,
+                    page_size=importacion.LOTE, fetch=True)
+    except Exception as e:
+        marcar_fallo()
+        logger.exception("Error en la importación")
+        raise Rechazo({'error': f'Error al importar: {str(e)}'}, 500)
+
+    if tipo.espacio:
+        invalidar_cache(tipo.espacio)
+    return valores, creadas
+
+
+@app.route('/importar/eventos', methods=['POST'])
+@admin_required
+def importar_eventos(usuario):
+    try:
+        _, creadas = importar(importacion.EVENTOS)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+    return jsonify({'mensaje': f'{len(creadas)} eventos importados',
+                    'ids': [f['id_evento'] for f in creadas]}), 201
+
+
+@app.route('/importar/torneos', methods=['POST'])
+@admin_required
+def importar_torneos(usuario):
+    try:
+        _, creadas = importar(importacion.TORNEOS)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+    return jsonify({'mensaje': f'{len(creadas)} torneos importados',
+                    'ids': [f['id_torneo'] for f in creadas]}), 201
+
+
+@app.route('/importar/inscripciones-equipos', methods=['POST'])
+@admin_required
+def importar_inscripciones_equipos(usuario):
+    try:
+        valores, creadas = importar(importacion.INSCRIPCIONES_EQUIPOS)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+    nuevas = sorted({(f['id_torneo'], f['id_equipo']) for f in creadas})
+    ya_inscritas = sorted(set(valores) - set(nuevas))
+    invalidar_cache(*{consultas.espacio_torneo(t) for t, _ in nuevas})
+    return jsonify({
+        'mensaje': f'{len(nuevas)} inscripciones creadas',
+        'inscritas': [{'id_torneo': t, 'id_equipo': e} for t, e in nuevas],
+        'ya_inscritas': [{'id_torneo': t, 'id_equipo': e} for t, e in ya_inscritas],
+    }), 201
+
+
+# Los resultados de partidos solo se registran; el volcado (marcadores.py)
+# actualiza "Equipo".victorias/derrotas cada RESULTADOS_INTERVALO segundos
+volcador = Volcador(transaccion)
+
+
+@app.route('/importar/resultados-partidos', methods=['POST'])
+@admin_required
+def importar_resultados_partidos(usuario):
+    try:
+        _, creadas = importar(importacion.RESULTADOS_PARTIDOS)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+    return jsonify({'mensaje': f'{len(creadas)} resultados registrados',
+                    'ids': [f['id_resultado'] for f in creadas],
+                    'aplicacion_maxima_segundos': volcador.intervalo}), 202
+
+
+# -------------------- Exportaciones --------------------
+@app.route('/exportar/<tabla>', methods=['GET'])
+@admin_required
+@en_streaming
+def exportar(usuario, tabla):
+    # Volcado completo en streaming: ?formato=ndjson|csv y ?torneo=<id> opcional
+    definicion = exportacion.EXPORTACIONES.get(tabla)
+    if definicion is None:
+        return jsonify({'error': f'Exportación desconocida, usa una de: {", ".join(exportacion.EXPORTACIONES)}'}), 404
+    formato = request.args.get('formato', 'ndjson')
+    if formato not in exportacion.FORMATOS:
+        return jsonify({'error': 'formato debe ser ndjson o csv'}), 400
+    torneo = request.args.get('torneo')
+    if torneo is not None and not torneo.isdigit():
+        return jsonify({'error': 'torneo debe ser un número entero'}), 400
+
+    # La conexión se presta aquí (si el pool está agotado aún se puede
+    # responder con error) y se devuelve cuando el servidor cierra la respuesta
+    origen, conn = prestar_conexion()
+    estado = {'descartar': False}
+
+    def generar():
+        try:
+            yield from exportacion.generar(conn, definicion, formato, torneo and int(torneo))
+        except Exception:
+            # Ya se enviaron cabeceras y filas: se corta la respuesta para que
+            # el cliente vea la descarga incompleta
+            logger.exception("Error en la exportación de %s", tabla)
+            estado['descartar'] = True
+            raise
+
+    tipo, extension = exportacion.FORMATOS[formato]
+    respuesta = Response(generar(), content_type=tipo)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{tabla}.{extension}"'
+    respuesta.call_on_close(lambda: origen.devolver(conn, descartar=estado['descartar']))
+    return respuesta
+
+
+# -------------------- Resultados y clasificación --------------------
+def validar_resultados(data):
+    # Acepta un resultado suelto, una lista o {"resultados": [...]}
+    if isinstance(data, dict) and 'resultados' in data:
+        data = data['resultados']
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        return None, [{'indice': None, 'error': 'Se esperaba un resultado o una lista de resultados'}]
+
+    resultados, errores = [], []
+    for i, r in enumerate(data):
+        if not isinstance(r, dict):
+            errores.append({'indice': i, 'error': 'Cada resultado debe ser un objeto'})
+            continue
+        id_equipo, id_usuario, puntos = r.get('id_equipo'), r.get('id_usuario'), r.get('puntos')
+        if (id_equipo is None) == (id_usuario is None):
+            errores.append({'indice': i, 'error': 'Indica id_equipo o id_usuario (solo uno)'})
+        elif not isinstance(puntos, int) or isinstance(puntos, bool):
+            errores.append({'indice': i, 'error': 'puntos debe ser un número entero'})
+        elif not all(isinstance(x, int) for x in (id_equipo, id_usuario) if x is not None):
+            errores.append({'indice': i, 'error': 'id_equipo / id_usuario debe ser un número entero'})
+        else:
+            resultados.append((id_equipo, id_usuario, puntos))
+    return resultados, errores
+
+
+@app.route('/torneo/<int:torneo_id>/resultados', methods=['POST'])
+@admin_required
+def registrar_resultados(usuario, torneo_id):
+    resultados, errores = validar_resultados(request.get_json(silent=True))
+    if errores:
+        return jsonify({'error': 'Resultados inválidos', 'detalles': errores}), 400
+
+    # Primero el bloqueo del torneo, en su propia sentencia: así la suma parte
+    # de los puntos que haya confirmado el resultado anterior
+    bloqueo = ejecutar_sql(consultas.BLOQUEAR_RESULTADOS, (torneo_id,))
+    if isinstance(bloqueo, dict):
+        return jsonify({'error': f'Error al registrar resultados: {bloqueo["error"]}'}), 500
+    if not bloqueo:
+        return jsonify({'error': 'Torneo no encontrado'}), 404
+
+    resultado = ejecutar_sql(consultas.REGISTRAR_RESULTADOS, {
+        'id_torneo': torneo_id,
+        'equipos': [r[0] for r in resultados],
+        'usuarios': [r[1] for r in resultados],
+        'puntos': [r[2] for r in resultados],
+    })
+    if isinstance(resultado, dict):
+        return jsonify({'error': f'Error al registrar resultados: {resultado["error"]}'}), 500
+    r = resultado[0]
+
+    if not r['torneo_existe']:
+        return jsonify({'error': 'Torneo no encontrado'}), 404
+    if r['no_inscritos']:
+        return jsonify({'error': 'Hay participantes no inscritos en este torneo',
+                        'no_inscritos': r['no_inscritos']}), 409
+
+    if r['actualizadas']:
+        invalidar_cache(consultas.espacio_torneo(torneo_id))
+    return jsonify({
+        'mensaje': 'Resultados registrados',
+        'resultados': len(resultados),
+        'filas_actualizadas': r['actualizadas'],
+    })
+
+
+# -------------------- Rondas y emparejamientos --------------------
+@app.route('/torneo/<int:torneo_id>/rondas', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+def rondas_torneo(torneo_id):
+    return listar_paginado(consultas.LISTADO_RONDAS, (torneo_id,))
+
+
+@app.route('/torneo/<int:torneo_id>/rondas/<int:numero>', methods=['GET'])
+@versionado(consultas.espacio_torneo)
+def partidas_ronda(torneo_id, numero):
+    return listar_paginado(consultas.LISTADO_PARTIDAS, (torneo_id, numero))
+
+
+def nueva_ronda(torneo_id, formato):
+    """Genera y guarda la siguiente ronda del torneo; devuelve (numero, formato, partidas).
+
+    El formato lo fija la primera ronda; en las siguientes se puede omitir.
+    """
+    try:
+        with transaccion() as conn:
+            with conn.cursor() as cur:
+                cur.execute(consultas.BLOQUEAR_TORNEO, (torneo_id,))
+                torneo = cur.fetchone()
+                if torneo is None:
+                    raise Rechazo({'error': 'Torneo no encontrado'}, 404)
+                cur.execute(consultas.ULTIMA_RONDA, (torneo_id,))
+                ultima = cur.fetchone()
+                if ultima is None:
+                    if formato is None:
+                        raise Rechazo({'error': f'Indica el formato: {", ".join(cuadros.FORMATOS)}'})
+                    numero = 1
+                else:
+                    if formato not in (None, ultima[1]):
+                        raise Rechazo({'error': f'El torneo ya se juega con formato {ultima[1]}'}, 409)
+                    numero, formato = ultima[0] + 1, ultima[1]
+
+                cur.execute(consultas.PARTICIPANTES_RONDA[torneo[0]], (torneo_id,))
+                participantes = [f[0] for f in cur.fetchall()]
+                historial = []
+                if formato != 'liga':
+                    cur.execute(consultas.HISTORIAL_PARTIDAS, (torneo_id,))
+                    historial = cur.fetchall()
+                partidas = cuadros.generar(formato, participantes, historial, numero)
+
+                cur.execute(consultas.INSERTAR_RONDA, (torneo_id, numero, formato, len(partidas)))
+                psycopg2.extras.execute_values(
+                    cur, consultas.INSERTAR_PARTIDAS,
+                    [(torneo_id, numero, mesa) + partida for mesa, partida in enumerate(partidas, start=1)],
+                    page_size=importacion.LOTE)
+    except Rechazo:
+        raise
+    except Exception as e:
+        marcar_fallo()
+        logger.exception("Error al generar la ronda")
+        raise Rechazo({'error': f'Error al generar la ronda: {str(e)}'}, 500)
+
+    invalidar_cache(consultas.espacio_torneo(torneo_id))
+    return numero, formato, partidas
+
+
+@app.route('/torneo/<int:torneo_id>/rondas', methods=['POST'])
+@admin_required
+def generar_ronda(usuario, torneo_id):
+    formato = (request.get_json(silent=True) or {}).get('formato')
+    if formato is not None and formato not in cuadros.FORMATOS:
+        return jsonify({'error': f'Formato no válido, debe ser uno de: {", ".join(cuadros.FORMATOS)}'}), 400
+    try:
+        numero, formato, partidas = nueva_ronda(torneo_id, formato)
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+    return jsonify({
+        'mensaje': f'Ronda {numero} generada',
+        'ronda': numero,
+        'formato': formato,
+        'partidas': len(partidas),
+        'exentos': sum(1 for p in partidas if p[2] is None),
+    }), 201
+
+
+@app.route('/torneo/<int:torneo_id>/rondas/<int:numero>/resultados', methods=['POST'])
+@admin_required
+def resultados_ronda(usuario, torneo_id, numero):
+    # Lista de {"mesa", "ganador"} (o {"resultados": [...]})
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('resultados', [data])
+    if not isinstance(data, list) or not data or not all(
+            isinstance(r, dict) and all(isinstance(r.get(c), int) and not isinstance(r.get(c), bool)
+                                        for c in ('mesa', 'ganador'))
+            for r in data):
+        return jsonify({'error': 'Se esperaba una lista de objetos con mesa y ganador (enteros)'}), 400
+    mesas = [r['mesa'] for r in data]
+    repetidas = sorted(m for m, veces in Counter(mesas).items() if veces > 1)
+    if repetidas:
+        return jsonify({'error': 'Hay mesas repetidas', 'mesas': repetidas}), 400
+
+    bloqueo = ejecutar_sql(consultas.BLOQUEAR_RESULTADOS, (torneo_id,))
+    if isinstance(bloqueo, dict):
+        return jsonify({'error': f'Error al registrar los resultados: {bloqueo["error"]}'}), 500
+    if not bloqueo:
+        return jsonify({'error': 'Torneo no encontrado'}), 404
+
+    resultado = ejecutar_sql(consultas.RESULTADOS_RONDA, {
+        'id_torneo': torneo_id,
+        'ronda': numero,
+        'mesas': mesas,
+        'ganadores': [r['ganador'] for r in data],
+    })
+    if isinstance(resultado, dict):
+        return jsonify({'error': f'Error al registrar los resultados: {resultado["error"]}'}), 500
+    r = resultado[0]
+    if r['cerrada']:
+        return jsonify({'error': f'La ronda {numero + 1} ya se ha generado a partir de esta'}), 409
+    if r['invalidas']:
+        return jsonify({'error': 'Mesas inexistentes, exentas o con un ganador que no juega en ellas',
+                        'mesas': r['invalidas']}), 400
+
+    invalidar_cache(consultas.espacio_torneo(torneo_id))
+    return jsonify({'mensaje': 'Resultados registrados', 'actualizadas': r['actualizadas']})
+
+
+# -------------------- Peticiones agrupadas --------------------
+# Varios GET en una sola petición HTTP (ver lotes.py): un solo token, una
+# sola conexión y las subpeticiones en paralelo mientras no la necesiten.
+def vista_de(ruta):
+    try:
+        endpoint, _ = app.create_url_adapter(request).match(ruta.split('?', 1)[0], method='GET')
+    except HTTPException:
+        return None  # el 404/405 lo da la propia subpetición
+    return app.view_functions[endpoint]
+
+
+def subpeticion(compartida, usuario, base, peticion):
+    ruta, etag, vista = peticion
+    if getattr(vista, '_streaming', False):
+        # Se rechaza sin despacharla: abriría una suscripción o una exportación
+        return lotes.error(ruta, 400, 'Las respuestas en streaming no se pueden pedir en un lote')
+    entorno = EnvironBuilder(path=ruta, base_url=base, method='GET',
+                             headers={'If-None-Match': etag} if etag else None).get_environ()
+    # Contexto de aplicación propio: si no, en el hilo de /batch (lotes de
+    # una petición o BATCH_HILOS=1) se reutilizaría el suyo y con él su `g`
+    with app.app_context(), app.request_context(entorno):
+        g._lote = compartida
+        if usuario is not None:
+            g._usuario = usuario
+        try:
+            respuesta = app.full_dispatch_request()
+        except Exception:
+            # Sin handle_exception, que con PROPAGATE_EXCEPTIONS (o debug)
+            # relanzaría y tiraría todo el lote
+            app.log_exception(sys.exc_info())
+            return lotes.error(ruta, 500, 'Error interno del servidor')
+        return lotes.resultado(ruta, respuesta)
+
+
+@app.route('/batch', methods=['POST'])
+def ejecutar_lote():
+    try:
+        peticiones = lotes.validar(request.get_json(silent=True))
+    except Rechazo as e:
+        return jsonify(e.cuerpo), e.estado
+
+    usuario = None
+    if request.headers.get('Authorization'):
+        usuario, error = usuario_de_cabecera(request.headers['Authorization'])
+        if error:
+            return jsonify(error), 401
+
+    peticiones = [(ruta, etag, vista_de(ruta)) for ruta, etag in peticiones]
+    # Réplica o primaria según las rutas del lote, como si fueran GET sueltos
+    origen = elegir_pool([vista for _, _, vista in peticiones])
+    compartida = lotes.ConexionCompartida(lambda: prestar_conexion(origen))
+    base = request.host_url
+    try:
+        respuestas = lotes.ejecutar(
+            lambda peticion: subpeticion(compartida, usuario, base, peticion), peticiones)
+    finally:
+        compartida.cerrar()
+    return jsonify({'respuestas': respuestas})
+
+
 # -------------------- Main --------------------
 if __name__ == '__main__':
     app.run(debug=True)
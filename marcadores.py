@@ -0,0 +1,101 @@
+"""Victorias y derrotas de los equipos a partir de "ResultadoPartido".
+
+Registrar un resultado es un INSERT en una tabla de solo inserción; un volcado
+periódico suma los pendientes a "Equipo" con un UPDATE por equipo y lote, así
+un equipo muy activo no recibe un UPDATE (y una espera de bloqueo) por partido.
+
+- Exactamente una vez: el volcado marca los resultados como aplicados en la
+  misma transacción en que los suma. Si el proceso muere a medias no se
+  confirma nada, y un advisory lock impide que dos workers vuelquen a la vez.
+- Retraso acotado: mientras haya un worker vivo, los contadores van como
+  mucho INTERVALO segundos (más la duración del volcado) por detrás.
+"""
+import os
+
+from tareas import TareaPeriodica
+
+INTERVALO = float(os.environ.get('RESULTADOS_INTERVALO', 5))
+# Resultados por transacción; si hay más pendientes se vuelca en varias
+LOTE = int(os.environ.get('RESULTADOS_LOTE', 5000))
+
+# Clave del advisory lock del volcado (la de migrar.py es 7_421_001)
+BLOQUEO = 7_421_002
+
+VOLCAR = '''
+    WITH lote AS (
+        UPDATE "ResultadoPartido"
+        SET aplicado = TRUE
+        WHERE id_resultado IN (
+            SELECT id_resultado FROM "ResultadoPartido"
+            WHERE NOT aplicado
+            ORDER BY id_resultado
+            LIMIT %(lote)s
+        )
+        RETURNING id_ganador, id_perdedor
+    ),
+    deltas AS (
+        SELECT id_equipo, SUM(victoria) AS victorias, SUM(1 - victoria) AS derrotas
+        FROM (
+            SELECT id_ganador AS id_equipo, 1 AS victoria FROM lote
+            UNION ALL
+            SELECT id_perdedor, 0 FROM lote
+        ) r
+        GROUP BY id_equipo
+    ),
+    act AS (
+        UPDATE "Equipo" e
+        SET victorias = e.victorias + d.victorias,
+            derrotas = e.derrotas + d.derrotas
+        FROM deltas d
+        WHERE e.id_equipo = d.id_equipo
+        RETURNING e.id_equipo
+    )
+    SELECT (SELECT count(*) FROM lote) AS resultados,
+           (SELECT count(*) FROM act) AS equipos
+'''
+
+
+class Volcador(TareaPeriodica):
+    """Vuelca los resultados pendientes cada `intervalo` segundos.
+
+    `transaccion()` es un context manager que da una conexión y confirma al
+    salir (main.transaccion fuera de una petición).
+    """
+
+    nombre = 'volcado-resultados'
+
+    def __init__(self, transaccion, intervalo=INTERVALO, lote=LOTE):
+        super().__init__(intervalo)
+        self.transaccion = transaccion
+        self.lote = lote
+        self._resultados = 0
+
+    def ejecutar(self):
+        self.volcar()
+
+    def volcar(self):
+        """Aplica todos los resultados pendientes; devuelve cuántos se han aplicado.
+
+        Devuelve 0 sin esperar si otro proceso está volcando.
+        """
+        total = 0
+        while True:
+            with self.transaccion() as conn:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (BLOQUEO,))
+                    if not cur.fetchone()[0]:
+                        break
+                    cur.execute(VOLCAR, {'lote': self.lote})
+                    resultados, _ = cur.fetchone()
+            total += resultados
+            if resultados < self.lote:
+                break
+        with self._lock:
+            self._resultados += total
+        return total
+
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        with self._lock:
+            estadisticas['resultados_aplicados'] = self._resultados
+        return estadisticas
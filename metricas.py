@@ -0,0 +1,129 @@
+import threading
+from bisect import bisect_left
+
+# Buckets en segundos, pensados para peticiones web y consultas SQL
+BUCKETS_TIEMPO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CANTIDAD = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+# -------------------- Tipos de métrica --------------------
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_etiquetas, cantidad=1):
+        with self._lock:
+            self._valores[valores_etiquetas] = self._valores.get(valores_etiquetas, 0) + cantidad
+
+    def exportar(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        for clave, valor in valores:
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_TIEMPO):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [cuentas por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exportar(self):
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for clave, serie in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + (float('inf'),), serie):
+                acumulado += cuenta
+                extra = f'le="{_numero(float(limite))}"'
+                yield f'{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, extra)} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(serie[-2])}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie[-1]}'
+
+
+class Indicador:
+    """Valor calculado al exportar a partir de una función (p. ej. estado del pool).
+
+    tipo='counter' para valores acumulados que ya lleva otro componente.
+    """
+
+    def __init__(self, nombre, ayuda, funcion, tipo='gauge'):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def exportar(self):
+        try:
+            valor = self.funcion()
+        except Exception:
+            return
+        yield f'{self.nombre} {_numero(valor)}'
+
+
+# -------------------- Registro --------------------
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, *args, **kwargs):
+        return self.registrar(Contador(*args, **kwargs))
+
+    def histograma(self, *args, **kwargs):
+        return self.registrar(Histograma(*args, **kwargs))
+
+    def indicador(self, *args, **kwargs):
+        return self.registrar(Indicador(*args, **kwargs))
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus (version 0.0.4)."""
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exportar())
+        return '\n'.join(lineas) + '\n'
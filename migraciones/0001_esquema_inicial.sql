@@ -0,0 +1,86 @@
+-- Esquema base de EsportsCanarias.
+-- Usa IF NOT EXISTS para poder adoptar bases de datos creadas a mano antes
+-- de existir las migraciones. Las restricciones UNIQUE y los índices de
+-- acceso están en 0002_indices.sql.
+
+CREATE TABLE IF NOT EXISTS "Usuario" (
+    id_usuario  SERIAL PRIMARY KEY,
+    nombre      VARCHAR(100) NOT NULL,
+    email       VARCHAR(255) NOT NULL,
+    contraseña  VARCHAR(255) NOT NULL,
+    rol         VARCHAR(20)  NOT NULL DEFAULT 'jugador'
+                CHECK (rol IN ('jugador', 'administrador'))
+);
+
+CREATE TABLE IF NOT EXISTS "Juego" (
+    id_juego       SERIAL PRIMARY KEY,
+    nombre         VARCHAR(100) NOT NULL,
+    es_individual  BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS "Evento" (
+    id_evento  SERIAL PRIMARY KEY,
+    nombre     VARCHAR(150) NOT NULL,
+    tipo       VARCHAR(10)  NOT NULL CHECK (tipo IN ('anual', 'mensual')),
+    año        INTEGER      NOT NULL,
+    mes        INTEGER      CHECK (mes BETWEEN 1 AND 12),
+    CHECK (tipo = 'anual' OR mes IS NOT NULL)
+);
+
+CREATE TABLE IF NOT EXISTS "Torneo" (
+    id_torneo     SERIAL PRIMARY KEY,
+    nombre        VARCHAR(150) NOT NULL,
+    fecha_inicio  DATE NOT NULL,
+    fecha_fin     DATE NOT NULL,
+    ubicacion     VARCHAR(255),
+    id_evento     INTEGER REFERENCES "Evento" (id_evento) ON DELETE SET NULL,
+    id_juego      INTEGER NOT NULL REFERENCES "Juego" (id_juego),
+    CHECK (fecha_fin >= fecha_inicio)
+);
+
+CREATE TABLE IF NOT EXISTS "Equipo" (
+    id_equipo       SERIAL PRIMARY KEY,
+    nombre          VARCHAR(100) NOT NULL,
+    fundador        INTEGER REFERENCES "Usuario" (id_usuario) ON DELETE SET NULL,
+    fecha_creacion  DATE NOT NULL DEFAULT CURRENT_DATE,
+    -- crear_equipo no envía el código: lo genera la base de datos
+    codigo          VARCHAR(8) NOT NULL DEFAULT upper(substr(md5(random()::text), 1, 8)),
+    victorias       INTEGER NOT NULL DEFAULT 0,
+    derrotas        INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS "UsuarioEquipo" (
+    usuario_id  INTEGER NOT NULL REFERENCES "Usuario" (id_usuario) ON DELETE CASCADE,
+    equipo_id   INTEGER NOT NULL REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "EquipoTorneo" (
+    equipo_id  INTEGER NOT NULL REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE,
+    id_torneo  INTEGER NOT NULL REFERENCES "Torneo" (id_torneo) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "UsuarioTorneo" (
+    usuario_id  INTEGER NOT NULL REFERENCES "Usuario" (id_usuario) ON DELETE CASCADE,
+    id_torneo   INTEGER NOT NULL REFERENCES "Torneo" (id_torneo) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "LigaEquipo" (
+    id_equipo  INTEGER NOT NULL REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE,
+    id_juego   INTEGER NOT NULL REFERENCES "Juego" (id_juego) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "LigaIndividual" (
+    id_usuario  INTEGER NOT NULL REFERENCES "Usuario" (id_usuario) ON DELETE CASCADE,
+    id_juego    INTEGER NOT NULL REFERENCES "Juego" (id_juego) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "Clasificacion" (
+    id_clasificacion  SERIAL PRIMARY KEY,
+    id_torneo         INTEGER NOT NULL REFERENCES "Torneo" (id_torneo) ON DELETE CASCADE,
+    id_equipo         INTEGER REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE,
+    id_usuario        INTEGER REFERENCES "Usuario" (id_usuario) ON DELETE CASCADE,
+    puntos            INTEGER NOT NULL DEFAULT 0,
+    posicion          INTEGER,
+    -- Cada fila es de un equipo o de un jugador, nunca de ambos
+    CHECK ((id_equipo IS NULL) <> (id_usuario IS NULL))
+);
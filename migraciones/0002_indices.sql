@@ -0,0 +1,67 @@
+-- Índices para los caminos de acceso de main.py.
+-- Los UNIQUE además hacen efectivos los ON CONFLICT DO NOTHING de las
+-- inscripciones: dos peticiones simultáneas no pueden duplicar una fila.
+--
+-- En una base de datos creada a mano, un UNIQUE falla (y con él toda la
+-- migración) si ya hay filas repetidas. Antes de migrar, cada una de estas
+-- consultas debe devolver cero filas; si no, hay que quitar los duplicados:
+--   SELECT email FROM "Usuario" GROUP BY 1 HAVING count(*) > 1;
+--   SELECT codigo FROM "Equipo" GROUP BY 1 HAVING count(*) > 1;
+--   SELECT usuario_id, equipo_id FROM "UsuarioEquipo" GROUP BY 1, 2 HAVING count(*) > 1;
+--   SELECT equipo_id, id_torneo FROM "EquipoTorneo" GROUP BY 1, 2 HAVING count(*) > 1;
+--   SELECT usuario_id, id_torneo FROM "UsuarioTorneo" GROUP BY 1, 2 HAVING count(*) > 1;
+--   SELECT id_juego, id_equipo FROM "LigaEquipo" GROUP BY 1, 2 HAVING count(*) > 1;
+--   SELECT id_juego, id_usuario FROM "LigaIndividual" GROUP BY 1, 2 HAVING count(*) > 1;
+--   SELECT id_torneo, id_equipo, id_usuario FROM "Clasificacion"
+--       GROUP BY 1, 2, 3 HAVING count(*) > 1;
+
+-- login / registro: WHERE email = %s
+CREATE UNIQUE INDEX IF NOT EXISTS usuario_email_uq ON "Usuario" (email);
+
+-- /equipo/codigo/<codigo>, /equipo/unirse/<codigo>
+CREATE UNIQUE INDEX IF NOT EXISTS equipo_codigo_uq ON "Equipo" (codigo);
+-- /equipo/fundador/<id>
+CREATE INDEX IF NOT EXISTS equipo_fundador_idx ON "Equipo" (fundador);
+
+-- Equipo(s) de un usuario (/equipo/usuario, salirse, pertenencia). UNIQUE por
+-- (usuario, equipo) y no por usuario: quien ya es miembro de un equipo puede
+-- fundar otro
+CREATE UNIQUE INDEX IF NOT EXISTS usuario_equipo_uq ON "UsuarioEquipo" (usuario_id, equipo_id);
+-- Miembros de un equipo
+CREATE INDEX IF NOT EXISTS usuario_equipo_equipo_idx ON "UsuarioEquipo" (equipo_id, usuario_id);
+
+-- Inscripciones de equipos: duplicados por (equipo, torneo) y plantilla por torneo
+CREATE UNIQUE INDEX IF NOT EXISTS equipo_torneo_uq ON "EquipoTorneo" (equipo_id, id_torneo);
+CREATE INDEX IF NOT EXISTS equipo_torneo_torneo_idx ON "EquipoTorneo" (id_torneo, equipo_id);
+
+-- Inscripciones de jugadores
+CREATE UNIQUE INDEX IF NOT EXISTS usuario_torneo_uq ON "UsuarioTorneo" (usuario_id, id_torneo);
+CREATE INDEX IF NOT EXISTS usuario_torneo_torneo_idx ON "UsuarioTorneo" (id_torneo, usuario_id);
+
+-- Ligas: listados por juego y duplicados por (juego, miembro)
+CREATE UNIQUE INDEX IF NOT EXISTS liga_equipo_uq ON "LigaEquipo" (id_juego, id_equipo);
+CREATE INDEX IF NOT EXISTS liga_equipo_equipo_idx ON "LigaEquipo" (id_equipo);
+CREATE UNIQUE INDEX IF NOT EXISTS liga_individual_uq ON "LigaIndividual" (id_juego, id_usuario);
+CREATE INDEX IF NOT EXISTS liga_individual_usuario_idx ON "LigaIndividual" (id_usuario);
+
+-- /clasificacion/<id>: índice cubriente en el orden de la respuesta
+CREATE INDEX IF NOT EXISTS clasificacion_torneo_posicion_idx
+    ON "Clasificacion" (id_torneo, posicion)
+    INCLUDE (puntos, id_equipo, id_usuario);
+-- Una fila de clasificación por participante y torneo
+CREATE UNIQUE INDEX IF NOT EXISTS clasificacion_torneo_equipo_uq
+    ON "Clasificacion" (id_torneo, id_equipo) WHERE id_equipo IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS clasificacion_torneo_usuario_uq
+    ON "Clasificacion" (id_torneo, id_usuario) WHERE id_usuario IS NOT NULL;
+
+-- /torneos (keyset por fecha_inicio, id_torneo) y /torneos/por-juego, /torneos/completos
+CREATE INDEX IF NOT EXISTS torneo_fecha_idx ON "Torneo" (fecha_inicio DESC, id_torneo DESC);
+CREATE INDEX IF NOT EXISTS torneo_juego_fecha_idx ON "Torneo" (id_juego, fecha_inicio DESC);
+-- /torneos/evento/<id>
+CREATE INDEX IF NOT EXISTS torneo_evento_idx ON "Torneo" (id_evento);
+
+-- /eventos (keyset por año, id_evento)
+CREATE INDEX IF NOT EXISTS evento_año_idx ON "Evento" (año DESC, id_evento DESC);
+
+-- /jugadores/por-juego (keyset por nombre, id_usuario)
+CREATE INDEX IF NOT EXISTS usuario_nombre_idx ON "Usuario" (nombre, id_usuario);
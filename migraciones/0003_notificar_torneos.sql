@@ -0,0 +1,31 @@
+-- Avisos de cambios en la clasificación y las inscripciones de un torneo para
+-- /clasificacion/<id>/stream. NOTIFY es transaccional: el aviso sale al
+-- confirmar, y PostgreSQL junta los avisos repetidos de una misma transacción
+-- (una importación masiva envía uno por torneo, no uno por fila).
+
+CREATE OR REPLACE FUNCTION notificar_torneo() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('torneo_cambios', OLD.id_torneo::text);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('torneo_cambios', NEW.id_torneo::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clasificacion_notificar ON "Clasificacion";
+CREATE TRIGGER clasificacion_notificar
+    AFTER INSERT OR UPDATE OR DELETE ON "Clasificacion"
+    FOR EACH ROW EXECUTE FUNCTION notificar_torneo();
+
+DROP TRIGGER IF EXISTS equipo_torneo_notificar ON "EquipoTorneo";
+CREATE TRIGGER equipo_torneo_notificar
+    AFTER INSERT OR UPDATE OR DELETE ON "EquipoTorneo"
+    FOR EACH ROW EXECUTE FUNCTION notificar_torneo();
+
+DROP TRIGGER IF EXISTS usuario_torneo_notificar ON "UsuarioTorneo";
+CREATE TRIGGER usuario_torneo_notificar
+    AFTER INSERT OR UPDATE OR DELETE ON "UsuarioTorneo"
+    FOR EACH ROW EXECUTE FUNCTION notificar_torneo();
@@ -0,0 +1,20 @@
+-- Resultados de partidos entre equipos. La tabla es de solo inserción: los
+-- contadores "Equipo".victorias/derrotas se actualizan por lotes desde aquí
+-- (marcadores.py) y `aplicado` indica qué filas ya están sumadas.
+
+CREATE TABLE IF NOT EXISTS "ResultadoPartido" (
+    id_resultado  BIGSERIAL PRIMARY KEY,
+    id_torneo     INTEGER REFERENCES "Torneo" (id_torneo) ON DELETE SET NULL,
+    id_ganador    INTEGER NOT NULL REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE,
+    id_perdedor   INTEGER NOT NULL REFERENCES "Equipo" (id_equipo) ON DELETE CASCADE,
+    registrado    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    aplicado      BOOLEAN NOT NULL DEFAULT FALSE,
+    CHECK (id_ganador <> id_perdedor)
+);
+
+-- Pendientes de volcar, en orden de llegada
+CREATE INDEX IF NOT EXISTS resultado_partido_pendiente_idx
+    ON "ResultadoPartido" (id_resultado) WHERE NOT aplicado;
+-- Para las claves ajenas (ON DELETE CASCADE al borrar un equipo)
+CREATE INDEX IF NOT EXISTS resultado_partido_ganador_idx ON "ResultadoPartido" (id_ganador);
+CREATE INDEX IF NOT EXISTS resultado_partido_perdedor_idx ON "ResultadoPartido" (id_perdedor);
@@ -0,0 +1,101 @@
+-- Tabla de cada liga precalculada: puntos y torneos jugados (de "Clasificacion")
+-- y victorias y derrotas (de "ResultadoPartido") de todos los torneos del juego,
+-- con la posición ya calculada. /liga/<id_juego>/tabla solo recorre el índice
+-- de su juego. liga.py la refresca con REFRESH ... CONCURRENTLY cuando algo cambia.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS "TablaLiga" AS
+WITH puntos AS (
+    SELECT t.id_juego, c.id_equipo, c.id_usuario,
+           count(*) AS torneos, sum(c.puntos) AS puntos
+    FROM "Clasificacion" c
+    JOIN "Torneo" t ON t.id_torneo = c.id_torneo
+    GROUP BY t.id_juego, c.id_equipo, c.id_usuario
+),
+partidos AS (
+    SELECT t.id_juego, r.id_equipo,
+           sum(r.victoria) AS victorias, sum(1 - r.victoria) AS derrotas
+    FROM (
+        SELECT id_torneo, id_ganador AS id_equipo, 1 AS victoria FROM "ResultadoPartido"
+        UNION ALL
+        SELECT id_torneo, id_perdedor, 0 FROM "ResultadoPartido"
+    ) r
+    JOIN "Torneo" t ON t.id_torneo = r.id_torneo
+    GROUP BY t.id_juego, r.id_equipo
+),
+participantes AS (
+    SELECT le.id_juego, 'equipo' AS tipo, e.id_equipo AS id_participante, e.nombre,
+           COALESCE(pt.torneos, 0) AS torneos, COALESCE(pt.puntos, 0) AS puntos,
+           COALESCE(pa.victorias, 0) AS victorias, COALESCE(pa.derrotas, 0) AS derrotas
+    FROM "LigaEquipo" le
+    JOIN "Juego" j ON j.id_juego = le.id_juego AND NOT j.es_individual
+    JOIN "Equipo" e ON e.id_equipo = le.id_equipo
+    LEFT JOIN puntos pt ON pt.id_juego = le.id_juego AND pt.id_equipo = le.id_equipo
+    LEFT JOIN partidos pa ON pa.id_juego = le.id_juego AND pa.id_equipo = le.id_equipo
+    UNION ALL
+    SELECT li.id_juego, 'jugador', u.id_usuario, u.nombre,
+           COALESCE(pt.torneos, 0), COALESCE(pt.puntos, 0), 0, 0
+    FROM "LigaIndividual" li
+    JOIN "Juego" j ON j.id_juego = li.id_juego AND j.es_individual
+    JOIN "Usuario" u ON u.id_usuario = li.id_usuario
+    LEFT JOIN puntos pt ON pt.id_juego = li.id_juego AND pt.id_usuario = li.id_usuario
+)
+SELECT id_juego, tipo, id_participante, nombre, torneos, puntos, victorias, derrotas,
+       RANK() OVER (PARTITION BY id_juego ORDER BY puntos DESC, victorias DESC, derrotas ASC)::int AS posicion
+FROM participantes;
+
+-- REFRESH ... CONCURRENTLY necesita un índice único sin WHERE. Cada juego es
+-- de equipos o individual, así que (id_juego, id_participante) no se repite
+-- (liga_equipo_uq y liga_individual_uq de la migración 0002).
+CREATE UNIQUE INDEX IF NOT EXISTS tabla_liga_uq ON "TablaLiga" (id_juego, id_participante);
+-- /liga/<id_juego>/tabla: keyset por (posicion, id_participante)
+CREATE INDEX IF NOT EXISTS tabla_liga_posicion_idx ON "TablaLiga" (id_juego, posicion, id_participante);
+
+-- Cada sentencia que cambia algo de lo que muestra la tabla avanza esta
+-- secuencia. nextval no bloquea ni espera a otras transacciones, así que los
+-- equipos muy activos no comparten una fila caliente.
+CREATE SEQUENCE IF NOT EXISTS tabla_liga_cambios;
+
+CREATE OR REPLACE FUNCTION marcar_tabla_liga() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval('tabla_liga_cambios');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tabla_liga_clasificacion ON "Clasificacion";
+CREATE TRIGGER tabla_liga_clasificacion
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "Clasificacion"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+DROP TRIGGER IF EXISTS tabla_liga_resultado_partido ON "ResultadoPartido";
+CREATE TRIGGER tabla_liga_resultado_partido
+    AFTER INSERT OR DELETE OR TRUNCATE ON "ResultadoPartido"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+DROP TRIGGER IF EXISTS tabla_liga_liga_equipo ON "LigaEquipo";
+CREATE TRIGGER tabla_liga_liga_equipo
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "LigaEquipo"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+DROP TRIGGER IF EXISTS tabla_liga_liga_individual ON "LigaIndividual";
+CREATE TRIGGER tabla_liga_liga_individual
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "LigaIndividual"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+DROP TRIGGER IF EXISTS tabla_liga_equipo_nombre ON "Equipo";
+CREATE TRIGGER tabla_liga_equipo_nombre
+    AFTER UPDATE OF nombre ON "Equipo"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+DROP TRIGGER IF EXISTS tabla_liga_usuario_nombre ON "Usuario";
+CREATE TRIGGER tabla_liga_usuario_nombre
+    AFTER UPDATE OF nombre ON "Usuario"
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_tabla_liga();
+
+-- Valor de la secuencia con el que se hizo el último refresco
+CREATE TABLE IF NOT EXISTS "TablaLigaRefresco" (
+    unica       BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (unica),
+    cambios     BIGINT NOT NULL DEFAULT 0,
+    refrescada  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO "TablaLigaRefresco" DEFAULT VALUES ON CONFLICT DO NOTHING;
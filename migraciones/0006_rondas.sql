@@ -0,0 +1,25 @@
+-- Rondas y partidas generadas por cuadros.py. Los participantes son equipos
+-- o jugadores según el juego del torneo, como en "Clasificacion".
+
+CREATE TABLE IF NOT EXISTS "Ronda" (
+    id_torneo  INTEGER NOT NULL REFERENCES "Torneo" (id_torneo) ON DELETE CASCADE,
+    numero     INTEGER NOT NULL,
+    formato    VARCHAR(20) NOT NULL,
+    partidas   INTEGER NOT NULL,
+    creada     TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (id_torneo, numero)
+);
+
+CREATE TABLE IF NOT EXISTS "Partida" (
+    id_torneo       INTEGER NOT NULL,
+    ronda           INTEGER NOT NULL,
+    mesa            INTEGER NOT NULL,
+    cuadro          VARCHAR(20),
+    participante_a  INTEGER NOT NULL,
+    -- NULL: participante_a queda exento y pasa como ganador
+    participante_b  INTEGER,
+    ganador         INTEGER,
+    PRIMARY KEY (id_torneo, ronda, mesa),
+    FOREIGN KEY (id_torneo, ronda) REFERENCES "Ronda" (id_torneo, numero) ON DELETE CASCADE,
+    CHECK (ganador IS NULL OR ganador = participante_a OR ganador = participante_b)
+);
@@ -0,0 +1,13 @@
+-- /buscar: nombres de equipos y jugadores por prefijo y por parecido.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Prefijo: rango lower(nombre) >= 'abc' AND < 'abd' en orden de bytes (COLLATE
+-- "C"), que sirve también con sentencias preparadas, a diferencia de LIKE 'abc%'
+CREATE INDEX IF NOT EXISTS equipo_nombre_prefijo_idx ON "Equipo" ((lower(nombre) COLLATE "C"));
+CREATE INDEX IF NOT EXISTS usuario_nombre_prefijo_idx ON "Usuario" ((lower(nombre) COLLATE "C"));
+
+-- Parecido: GiST de trigramas, que además de filtrar con % devuelve los más
+-- cercanos primero (ORDER BY <-> ... LIMIT) sin ordenar todas las coincidencias
+CREATE INDEX IF NOT EXISTS equipo_nombre_trgm_idx ON "Equipo" USING gist (lower(nombre) gist_trgm_ops);
+CREATE INDEX IF NOT EXISTS usuario_nombre_trgm_idx ON "Usuario" USING gist (lower(nombre) gist_trgm_ops);
@@ -0,0 +1,60 @@
+-- "Clasificacion".posicion siempre al día: al inscribirse, al salir, al
+-- importar inscripciones o al borrar en cascada un torneo, equipo o jugador
+-- se recalcula la posición de los torneos afectados, con el mismo RANK() que
+-- REGISTRAR_RESULTADOS (que ya la recalcula al sumar puntos).
+--
+-- Un disparador por sentencia y no por fila: una importación masiva recalcula
+-- cada torneo una vez. Antes se bloquea el torneo como BLOQUEAR_RESULTADOS, y
+-- como en READ COMMITTED cada sentencia de la función toma su propia foto, el
+-- recálculo ve las inscripciones y los resultados confirmados mientras
+-- esperaba. Las tablas de transición solo se admiten con un evento por
+-- disparador: uno para INSERT y otro para DELETE.
+
+CREATE OR REPLACE FUNCTION recalcular_posiciones() RETURNS trigger AS $$
+DECLARE
+    torneos integer[];
+    torneo integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT id_torneo ORDER BY id_torneo) INTO torneos FROM nuevas;
+    ELSE
+        SELECT array_agg(DISTINCT id_torneo ORDER BY id_torneo) INTO torneos FROM viejas;
+    END IF;
+
+    FOREACH torneo IN ARRAY COALESCE(torneos, '{}') LOOP
+        PERFORM 1 FROM "Torneo" WHERE id_torneo = torneo FOR NO KEY UPDATE;
+        UPDATE "Clasificacion" c
+        SET posicion = n.posicion
+        FROM (
+            SELECT id_clasificacion, RANK() OVER (ORDER BY puntos DESC) AS posicion
+            FROM "Clasificacion"
+            WHERE id_torneo = torneo
+        ) n
+        WHERE c.id_clasificacion = n.id_clasificacion
+          AND c.posicion IS DISTINCT FROM n.posicion;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clasificacion_posiciones_alta ON "Clasificacion";
+CREATE TRIGGER clasificacion_posiciones_alta
+    AFTER INSERT ON "Clasificacion"
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT EXECUTE FUNCTION recalcular_posiciones();
+
+DROP TRIGGER IF EXISTS clasificacion_posiciones_baja ON "Clasificacion";
+CREATE TRIGGER clasificacion_posiciones_baja
+    AFTER DELETE ON "Clasificacion"
+    REFERENCING OLD TABLE AS viejas
+    FOR EACH STATEMENT EXECUTE FUNCTION recalcular_posiciones();
+
+-- Las posiciones que ya estaban desfasadas
+UPDATE "Clasificacion" c
+SET posicion = n.posicion
+FROM (
+    SELECT id_clasificacion, RANK() OVER (PARTITION BY id_torneo ORDER BY puntos DESC) AS posicion
+    FROM "Clasificacion"
+) n
+WHERE c.id_clasificacion = n.id_clasificacion
+  AND c.posicion IS DISTINCT FROM n.posicion;
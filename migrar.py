@@ -0,0 +1,138 @@
+"""Migraciones versionadas del esquema de EsportsCanarias.
+
+Cada fichero migraciones/NNNN_nombre.sql es una versión y se aplica una sola
+vez, dentro de su propia transacción, en orden numérico. Las versiones
+aplicadas se guardan en la tabla "Migracion". Se ejecuta en cada despliegue,
+antes de arrancar la aplicación; si no hay nada pendiente no hace nada:
+
+    python migrar.py            aplica las migraciones pendientes
+    python migrar.py --estado   muestra las aplicadas y las pendientes
+"""
+import hashlib
+import os
+import re
+import sys
+
+import psycopg2
+
+from config import DB_CONFIG
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+
+# Clave del advisory lock: evita que dos despliegues migren a la vez
+BLOQUEO = 7_421_001
+
+_PATRON = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+class MigracionModificada(Exception):
+    """Una migración ya aplicada ha cambiado en disco."""
+
+
+def migraciones_disponibles(directorio=DIRECTORIO):
+    encontradas = []
+    for fichero in sorted(os.listdir(directorio)):
+        m = _PATRON.match(fichero)
+        if not m:
+            continue
+        with open(os.path.join(directorio, fichero), encoding='utf-8') as f:
+            sql = f.read()
+        encontradas.append({
+            'version': int(m.group(1)),
+            'nombre': m.group(2),
+            'sql': sql,
+            'checksum': hashlib.sha256(sql.encode('utf-8')).hexdigest(),
+        })
+    versiones = [m['version'] for m in encontradas]
+    if len(versiones) != len(set(versiones)):
+        raise ValueError('Hay dos migraciones con el mismo número de versión')
+    return encontradas
+
+
+def _preparar(conn):
+    with conn.cursor() as cur:
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS "Migracion" (
+                version   INTEGER PRIMARY KEY,
+                nombre    TEXT NOT NULL,
+                checksum  TEXT NOT NULL,
+                aplicada  TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        ''')
+    conn.commit()
+
+
+def migraciones_aplicadas(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT version, checksum FROM "Migracion" ORDER BY version')
+        return dict(cur.fetchall())
+
+
+def migrar(conn, directorio=DIRECTORIO, salida=print):
+    """Aplica las migraciones pendientes y devuelve las versiones aplicadas."""
+    _preparar(conn)
+    aplicadas_ahora = []
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_advisory_lock(%s)', (BLOQUEO,))
+    conn.commit()
+    try:
+        aplicadas = migraciones_aplicadas(conn)
+        conn.commit()
+        for migracion in migraciones_disponibles(directorio):
+            version = migracion['version']
+            if version in aplicadas:
+                if aplicadas[version] != migracion['checksum']:
+                    raise MigracionModificada(
+                        f'La migración {version:04d}_{migracion["nombre"]} ya se aplicó '
+                        f'y su contenido ha cambiado; crea una migración nueva'
+                    )
+                continue
+            salida(f'Aplicando {version:04d}_{migracion["nombre"]}...')
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(migracion['sql'])
+                    cur.execute(
+                        'INSERT INTO "Migracion" (version, nombre, checksum) VALUES (%s, %s, %s)',
+                        (version, migracion['nombre'], migracion['checksum'])
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            aplicadas_ahora.append(version)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_advisory_unlock(%s)', (BLOQUEO,))
+        conn.commit()
+    return aplicadas_ahora
+
+
+def estado(conn, directorio=DIRECTORIO, salida=print):
+    _preparar(conn)
+    aplicadas = migraciones_aplicadas(conn)
+    conn.commit()
+    for migracion in migraciones_disponibles(directorio):
+        version = migracion['version']
+        if version not in aplicadas:
+            marca = 'pendiente'
+        elif aplicadas[version] != migracion['checksum']:
+            marca = 'MODIFICADA'
+        else:
+            marca = 'aplicada'
+        salida(f'{version:04d}_{migracion["nombre"]}: {marca}')
+
+
+# -------------------- Main --------------------
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if '--estado' in sys.argv[1:]:
+            estado(conn)
+        else:
+            aplicadas = migrar(conn)
+            print(f'{len(aplicadas)} migraciones aplicadas' if aplicadas else 'El esquema ya está al día')
+    except MigracionModificada as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+    finally:
+        conn.close()
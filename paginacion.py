@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from serializacion import Filas
+
+LIMITE_POR_DEFECTO = int(os.environ.get('PAGINA_LIMITE_POR_DEFECTO', 100))
+LIMITE_MAXIMO = int(os.environ.get('PAGINA_LIMITE_MAXIMO', 500))
+
+
+class ParametroInvalido(ValueError):
+    """Cursor, limit o fields mal formados (se responde 400)."""
+
+
+# -------------------- Cursores opacos --------------------
+def _serializable(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(valores):
+    datos = json.dumps([_serializable(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token, num_claves):
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ParametroInvalido('Cursor inválido')
+    if not isinstance(valores, list) or len(valores) != num_claves:
+        raise ParametroInvalido('Cursor inválido')
+    return valores
+
+
+# -------------------- Listados paginados --------------------
+class Listado:
+    """Describe un listado paginable por clave (keyset).
+
+    - desde: fragmento SQL con FROM/JOIN.
+    - filtro: condición WHERE base opcional (puede llevar %s).
+    - columnas: campo público -> expresión SQL que se puede pedir con fields=.
+    - orden: campos que forman la clave única de ordenación; la página
+      siguiente empieza justo después de la última clave devuelta.
+    - por_defecto: expresión SELECT cuando no se pasa fields= (compatibilidad).
+    """
+
+    def __init__(self, desde, columnas, orden, filtro=None, descendente=False, por_defecto=None):
+        self.desde = desde
+        self.filtro = filtro
+        self.columnas = columnas
+        self.orden = orden
+        self.descendente = descendente
+        self.por_defecto = por_defecto or ', '.join(
+            f'{expr} AS {campo}' for campo, expr in columnas.items()
+        )
+
+    def campos(self, fields):
+        if not fields:
+            return None
+        pedidos = [c.strip() for c in fields.split(',') if c.strip()]
+        desconocidos = [c for c in pedidos if c not in self.columnas]
+        if desconocidos or not pedidos:
+            raise ParametroInvalido(
+                f'Campos no válidos: {", ".join(desconocidos) or fields}. '
+                f'Disponibles: {", ".join(self.columnas)}'
+            )
+        return list(dict.fromkeys(pedidos))
+
+    def consulta(self, args, params=()):
+        """Devuelve (sql, params, limite, campos) para los argumentos de la petición."""
+        limite = args.get('limit', LIMITE_POR_DEFECTO)
+        try:
+            limite = int(limite)
+        except (TypeError, ValueError):
+            raise ParametroInvalido('limit debe ser un número entero')
+        if limite < 1:
+            raise ParametroInvalido('limit debe ser mayor que 0')
+        limite = min(limite, LIMITE_MAXIMO)
+
+        campos = self.campos(args.get('fields'))
+        if campos is None:
+            seleccion = self.por_defecto
+        else:
+            # Las columnas de la clave se piden siempre para poder construir el cursor
+            necesarios = campos + [c for c in self.orden if c not in campos]
+            seleccion = ', '.join(f'{self.columnas[c]} AS {c}' for c in necesarios)
+
+        claves = ', '.join(self.columnas[c] for c in self.orden)
+        sentido = 'DESC' if self.descendente else 'ASC'
+        condiciones = [self.filtro] if self.filtro else []
+        params = list(params)
+
+        cursor = args.get('cursor')
+        if cursor:
+            valores = decodificar_cursor(cursor, len(self.orden))
+            comparador = '<' if self.descendente else '>'
+            marcadores = ', '.join(['%s'] * len(valores))
+            condiciones.append(f'({claves}) {comparador} ({marcadores})')
+            params.extend(valores)
+
+        sql = f'SELECT {seleccion} {self.desde}'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+
+        orden_sql = ', '.join(f'{self.columnas[c]} {sentido}' for c in self.orden)
+        sql += f' ORDER BY {orden_sql} LIMIT %s'
+        params.append(limite + 1)  # una fila de más indica si hay otra página
+        return sql, tuple(params), limite, campos
+
+    def pagina(self, filas, limite, campos):
+        """Recorta las filas al límite y devuelve (filas, cursor_siguiente)."""
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            ultima = filas[-1]
+            siguiente = codificar_cursor([ultima[c] for c in self.orden])
+        if campos is not None:
+            sobrantes = [c for c in self.orden if c not in campos]
+            if sobrantes and isinstance(filas, Filas):
+                filas = filas.sin(sobrantes)
+            elif sobrantes:
+                filas = [{k: v for k, v in fila.items() if k not in sobrantes} for fila in filas]
+        return filas, siguiente
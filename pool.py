@@ -0,0 +1,252 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+
+# -------------------- Conexión del pool --------------------
+class ConexionPool(psycopg2.extensions.connection):
+    # Subclase para poder guardar metadatos (creación, último uso, sentencias
+    # preparadas) en la conexión
+    pass
+
+
+class PoolAgotado(Exception):
+    """No se pudo obtener una conexión del pool dentro del tiempo de espera."""
+
+
+# -------------------- Pool de conexiones --------------------
+class PoolConexiones:
+    """Pool de conexiones PostgreSQL acotado y seguro entre hilos.
+
+    - min_conexiones: conexiones inactivas que se mantienen abiertas.
+    - max_conexiones: límite total de conexiones (en uso + inactivas).
+    - timeout: segundos que espera obtener() antes de lanzar PoolAgotado.
+    - vida_maxima: segundos tras los que una conexión se recicla.
+    - inactividad_maxima: segundos inactiva tras los que se cierra si sobra.
+    - ping_tras: segundos inactiva tras los que se comprueba con SELECT 1.
+    """
+
+    def __init__(self, min_conexiones=1, max_conexiones=10, timeout=5.0,
+                 vida_maxima=1800.0, inactividad_maxima=300.0, ping_tras=30.0,
+                 **parametros_conexion):
+        if min_conexiones < 0 or max_conexiones < 1 or min_conexiones > max_conexiones:
+            raise ValueError('Tamaños de pool inválidos')
+        self.min_conexiones = min_conexiones
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+        self.vida_maxima = vida_maxima
+        self.inactividad_maxima = inactividad_maxima
+        self.ping_tras = ping_tras
+        self.parametros_conexion = parametros_conexion
+
+        self._cond = threading.Condition()
+        self._libres = []  # LIFO: la conexión más reciente se reutiliza primero
+        self._en_uso = set()
+        self._total = 0
+        self._cerrado = False
+        # Función opcional que recibe los segundos que tardó cada préstamo (métricas)
+        self.al_prestar = None
+
+        # Estadísticas
+        self._esperas = 0
+        self._tiempo_espera = 0.0
+        self._timeouts = 0
+        self._creadas = 0
+        self._descartadas = 0
+        self._prestamos = 0
+
+    # ---------- Ciclo de vida de conexiones ----------
+    def _crear(self):
+        conn = psycopg2.connect(connection_factory=ConexionPool, **self.parametros_conexion)
+        ahora = time.monotonic()
+        conn._creada = ahora
+        conn._devuelta = ahora
+        conn.preparadas = set()  # nombres con PREPARE hecho en esta sesión
+        return conn
+
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _caducada(self, conn, ahora):
+        return conn.closed or ahora - conn._creada > self.vida_maxima
+
+    def _viva(self, conn, ahora):
+        # Detecta conexiones rotas antes de prestarlas
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if ahora - conn._devuelta < self.ping_tras:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _liberar_hueco(self):
+        # Llamar con el lock tomado
+        self._total -= 1
+        self._descartadas += 1
+        self._cond.notify()
+
+    # ---------- Préstamo ----------
+    def obtener(self, timeout=None):
+        espera_max = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + espera_max
+        ha_esperado = False
+
+        while True:
+            conn = None
+            crear = False
+            with self._cond:
+                while True:
+                    if self._cerrado:
+                        raise PoolAgotado('El pool está cerrado')
+                    ahora = time.monotonic()
+                    while self._libres:
+                        candidata = self._libres.pop()
+                        if self._caducada(candidata, ahora):
+                            self._cerrar(candidata)
+                            self._total -= 1
+                            self._descartadas += 1
+                            continue
+                        conn = candidata
+                        break
+                    if conn is not None:
+                        break
+                    if self._total < self.max_conexiones:
+                        self._total += 1
+                        crear = True
+                        break
+                    restante = limite - ahora
+                    if restante <= 0:
+                        self._timeouts += 1
+                        self._registrar_espera(ha_esperado, inicio)
+                        raise PoolAgotado(
+                            f'Sin conexiones libres tras {espera_max:.1f}s '
+                            f'({self.max_conexiones} en uso)'
+                        )
+                    ha_esperado = True
+                    self._cond.wait(restante)
+
+            if crear:
+                try:
+                    conn = self._crear()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._creadas += 1
+            elif not self._viva(conn, time.monotonic()):
+                # Conexión rota: se descarta y se vuelve a intentar
+                self._cerrar(conn)
+                with self._cond:
+                    self._liberar_hueco()
+                continue
+
+            with self._cond:
+                self._en_uso.add(conn)
+                self._prestamos += 1
+                self._registrar_espera(ha_esperado, inicio)
+            if self.al_prestar is not None:
+                self.al_prestar(time.monotonic() - inicio)
+            return conn
+
+    def _registrar_espera(self, ha_esperado, inicio):
+        # Llamar con el lock tomado
+        if ha_esperado:
+            self._esperas += 1
+            self._tiempo_espera += time.monotonic() - inicio
+
+    def devolver(self, conn, descartar=False):
+        # Deja la conexión limpia (sin transacción abierta) antes de reutilizarla
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+        ahora = time.monotonic()
+        with self._cond:
+            self._en_uso.discard(conn)
+            if descartar or self._cerrado or self._caducada(conn, ahora):
+                self._cerrar(conn)
+                self._liberar_hueco()
+                return
+            conn._devuelta = ahora
+            self._libres.append(conn)
+            self._recortar(ahora)
+            self._cond.notify()
+
+    def _recortar(self, ahora):
+        # Cierra las conexiones inactivas que sobran por encima de min_conexiones
+        while len(self._libres) > self.min_conexiones:
+            mas_antigua = self._libres[0]
+            if ahora - mas_antigua._devuelta < self.inactividad_maxima:
+                break
+            self._libres.pop(0)
+            self._cerrar(mas_antigua)
+            self._total -= 1
+            self._descartadas += 1
+
+    @contextmanager
+    def conexion(self, timeout=None):
+        conn = self.obtener(timeout)
+        try:
+            yield conn
+        except Exception:
+            self.devolver(conn, descartar=conn.closed)
+            raise
+        else:
+            self.devolver(conn)
+
+    def calentar(self):
+        # Abre conexiones hasta tener min_conexiones inactivas
+        conexiones = []
+        try:
+            while True:
+                with self._cond:
+                    if len(self._libres) + len(conexiones) >= self.min_conexiones:
+                        break
+                conexiones.append(self.obtener())
+        finally:
+            for conn in conexiones:
+                self.devolver(conn)
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            for conn in self._libres:
+                self._cerrar(conn)
+            self._total -= len(self._libres)
+            self._libres = []
+            self._cond.notify_all()
+
+    # ---------- Estadísticas ----------
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'en_uso': len(self._en_uso),
+                'inactivas': len(self._libres),
+                'total': self._total,
+                'min': self.min_conexiones,
+                'max': self.max_conexiones,
+                'prestamos': self._prestamos,
+                'esperas': self._esperas,
+                'tiempo_espera_total': round(self._tiempo_espera, 6),
+                'timeouts': self._timeouts,
+                'creadas': self._creadas,
+                'descartadas': self._descartadas,
+            }
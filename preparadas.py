@@ -0,0 +1,125 @@
+"""Sentencias preparadas en el servidor para las consultas más frecuentes.
+
+Las SQL registradas con preparar() se ejecutan con PREPARE (la primera vez en
+cada conexión del pool) y EXECUTE (las siguientes), así PostgreSQL no vuelve a
+analizarlas y puede reutilizar el plan. Cada conexión lleva en `preparadas`
+los nombres que ya tiene; una conexión nueva (tras reconectar) empieza vacía.
+Las conexiones que no son del pool ejecutan la SQL tal cual.
+"""
+import re
+import threading
+
+import psycopg2.errors
+
+# %(nombre)s, %s y %% (un % literal)
+_MARCADOR = re.compile(r'%\((\w+)\)s|%s|%%')
+
+# Errores que indican que la sesión ya no tiene las sentencias que creemos
+# (DISCARD ALL, reinicio de un pooler) o que su plan ya no vale (cambió el
+# esquema de una tabla de un SELECT *)
+_ERRORES_SESION = (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported)
+
+
+class Preparada:
+    """SQL con marcadores de psycopg2 traducida a PREPARE/EXECUTE.
+
+    `tipos` es una tupla (marcadores %s) o un dict (marcadores %(nombre)s) con
+    el tipo PostgreSQL de cada parámetro; se declaran para que el plan no
+    dependa de cómo se infieren los parámetros sin tipo.
+    """
+
+    def __init__(self, nombre, sql, tipos):
+        self.nombre = nombre
+        self.sql = sql
+        self.nombres = []  # orden de los parámetros con nombre ($1, $2...)
+        posicionales = 0
+
+        def sustituir(m):
+            nonlocal posicionales
+            if m.group(0) == '%%':
+                return '%'
+            if m.group(1) is None:
+                posicionales += 1
+                return f'${posicionales}'
+            if m.group(1) not in self.nombres:
+                self.nombres.append(m.group(1))
+            return f'${self.nombres.index(m.group(1)) + 1}'
+
+        cuerpo = _MARCADOR.sub(sustituir, sql)
+        if posicionales and self.nombres:
+            raise ValueError(f'{nombre}: no se pueden mezclar %s y %(nombre)s')
+        if self.nombres:
+            tipos = [tipos[n] for n in self.nombres]
+        if len(tipos) != (posicionales or len(self.nombres)):
+            raise ValueError(f'{nombre}: hacen falta tantos tipos como parámetros')
+
+        declaracion = f' ({", ".join(tipos)})' if tipos else ''
+        self.prepare = f'PREPARE {nombre}{declaracion} AS {cuerpo}'
+        self.execute = f'EXECUTE {nombre} ({", ".join(["%s"] * len(tipos))})' if tipos else f'EXECUTE {nombre}'
+
+    def argumentos(self, params):
+        if self.nombres:
+            return [params[n] for n in self.nombres]
+        return params
+
+
+class RegistroPreparadas:
+    def __init__(self):
+        self._por_sql = {}
+        self._lock = threading.Lock()
+        self._planificadas = {}
+        self._reutilizadas = {}
+        # Función opcional (nombre, reutilizada) para métricas
+        self.al_ejecutar = None
+
+    def preparar(self, nombre, sql, tipos=()):
+        """Registra `sql` como sentencia preparada y devuelve la misma SQL."""
+        self._por_sql[sql] = Preparada(nombre, sql, tipos)
+        return sql
+
+    def buscar(self, sql):
+        return self._por_sql.get(sql)
+
+    def ejecutar(self, cur, preparada, params=None):
+        conn = cur.connection
+        ya_preparadas = getattr(conn, 'preparadas', None)
+        if ya_preparadas is None:
+            cur.execute(preparada.sql, params)
+            return
+
+        if getattr(conn, 'desalojar_preparadas', False):
+            cur.execute('DEALLOCATE ALL')
+            ya_preparadas.clear()
+            conn.desalojar_preparadas = False
+
+        reutilizada = preparada.nombre in ya_preparadas
+        if not reutilizada:
+            cur.execute(preparada.prepare)
+            ya_preparadas.add(preparada.nombre)
+        try:
+            cur.execute(preparada.execute, preparada.argumentos(params))
+        except _ERRORES_SESION:
+            # La transacción ya ha fallado; en el siguiente uso de la conexión
+            # se borran todas y se vuelven a preparar
+            conn.desalojar_preparadas = True
+            raise
+
+        contador = self._reutilizadas if reutilizada else self._planificadas
+        with self._lock:
+            contador[preparada.nombre] = contador.get(preparada.nombre, 0) + 1
+        if self.al_ejecutar is not None:
+            self.al_ejecutar(preparada.nombre, reutilizada)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                p.nombre: {
+                    'planificada': self._planificadas.get(p.nombre, 0),
+                    'reutilizada': self._reutilizadas.get(p.nombre, 0),
+                }
+                for p in self._por_sql.values()
+            }
+
+
+registro = RegistroPreparadas()
+preparar = registro.preparar
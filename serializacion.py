@@ -0,0 +1,91 @@
+"""Serialización JSON rápida con la misma salida, byte a byte, que la de Flask.
+
+- Filas: resultado de una consulta como tuplas + nombres de columna. Evita
+  crear un RealDictRow por fila; los dicts se construyen en C al serializar.
+- ProveedorJSON: DefaultJSONProvider que reutiliza sus codificadores (fuera
+  del modo debug usan el codificador en C de json) y memoriza el formato
+  HTTP de las fechas.
+"""
+import json
+from datetime import date
+from functools import lru_cache
+from itertools import repeat
+
+from flask.json.provider import DefaultJSONProvider, _default
+from werkzeug.http import http_date
+
+
+class Filas:
+    """Lista de filas de solo lectura; fila[i] e iterar devuelven dicts."""
+
+    __slots__ = ('columnas', 'tuplas')
+
+    def __init__(self, columnas, tuplas):
+        self.columnas = columnas
+        self.tuplas = tuplas
+
+    def __len__(self):
+        return len(self.tuplas)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Filas(self.columnas, self.tuplas[i])
+        return dict(zip(self.columnas, self.tuplas[i]))
+
+    def __iter__(self):
+        return iter(self.dicts())
+
+    def dicts(self):
+        # Igual que RealDictCursor: con columnas repetidas gana la última
+        return list(map(dict, map(zip, repeat(self.columnas), self.tuplas)))
+
+    def sin(self, quitar):
+        indices = [i for i, c in enumerate(self.columnas) if c not in quitar]
+        return Filas([self.columnas[i] for i in indices],
+                     [tuple(t[i] for i in indices) for t in self.tuplas])
+
+
+# Las fechas de torneos y eventos se repiten mucho entre filas y respuestas
+_fecha_http = lru_cache(maxsize=4096)(http_date)
+
+
+def _por_defecto(o):
+    if type(o) is date:
+        return _fecha_http(o)
+    if isinstance(o, Filas):
+        return o.dicts()
+    return _default(o)
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    default = staticmethod(_por_defecto)
+
+    def __init__(self, app):
+        super().__init__(app)
+        # (indent, separators) -> JSONEncoder; json.dumps crea uno nuevo en
+        # cada llamada con argumentos. Cambiar ensure_ascii o sort_keys después
+        # de crear el proveedor no afecta a los ya creados.
+        self._codificadores = {}
+
+    def _codificador(self, indent=None, separators=None):
+        clave = (indent, separators)
+        codificador = self._codificadores.get(clave)
+        if codificador is None:
+            codificador = self._codificadores[clave] = json.JSONEncoder(
+                default=self.default, ensure_ascii=self.ensure_ascii,
+                sort_keys=self.sort_keys, indent=indent, separators=separators,
+            )
+        return codificador
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._codificador().encode(obj)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            codificador = self._codificador(indent=2)
+        else:
+            codificador = self._codificador(separators=(',', ':'))
+        return self._app.response_class(f'{codificador.encode(obj)}\n', mimetype=self.mimetype)
@@ -0,0 +1,59 @@
+"""Tareas periódicas en segundo plano: un hilo por proceso y tarea."""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TareaPeriodica:
+    """Llama a ejecutar() cada `intervalo` segundos en un hilo propio.
+
+    El hilo arranca con arrancar(), que se puede llamar en cada petición: tras
+    un fork (gunicorn --preload) el hilo no existe en el worker y se crea ahí.
+    """
+
+    nombre = 'tarea'
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._ejecuciones = 0
+        self._errores = 0
+        self._ultima = None
+
+    def ejecutar(self):
+        raise NotImplementedError
+
+    def arrancar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name=self.nombre, daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.ejecutar()
+            except Exception:
+                with self._lock:
+                    self._errores += 1
+                logger.exception("Error en %s", self.nombre)
+            else:
+                with self._lock:
+                    self._ejecuciones += 1
+                    self._ultima = time.time()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'activo': self._hilo is not None and self._hilo.is_alive(),
+                'intervalo': self.intervalo,
+                'ejecuciones': self._ejecuciones,
+                'errores': self._errores,
+                'ultima': self._ultima,
+            }
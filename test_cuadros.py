@@ -0,0 +1,108 @@
+"""Pruebas de cuadros.py (lógica pura, sin base de datos): python -m pytest"""
+import pytest
+
+import cuadros
+from consultas import Rechazo
+
+
+def jugar(formato, participantes, historial, numero, ganador=lambda a, b: a):
+    # Genera la ronda, le pone resultados y la añade al historial
+    partidas = cuadros.generar(formato, participantes, historial, numero)
+    for mesa, (cuadro, a, b, g) in enumerate(partidas, start=1):
+        historial.append((numero, mesa, cuadro, a, b, g if b is None else ganador(a, b)))
+    return partidas
+
+
+# -------------------- Cabezas de serie --------------------
+def test_orden_siembra():
+    assert cuadros.orden_siembra(2) == [1, 2]
+    assert cuadros.orden_siembra(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+
+
+def test_eliminacion_exentos_para_los_mejores():
+    partidas = cuadros.generar('eliminacion', [10, 20, 30, 40, 50], [], 1)
+    assert partidas == [
+        (None, 10, None, 10),
+        (None, 40, 50, None),
+        (None, 20, None, 20),
+        (None, 30, None, 30),
+    ]
+
+
+def test_eliminacion_avanzan_los_ganadores():
+    historial = []
+    jugar('eliminacion', [1, 2, 3, 4], historial, 1, ganador=max)
+    assert cuadros.generar('eliminacion', [1, 2, 3, 4], historial, 2) == [(None, 4, 3, None)]
+
+
+def test_eliminacion_ronda_incompleta():
+    historial = []
+    cuadros.generar('eliminacion', [1, 2], historial, 1)
+    historial.append((1, 1, None, 1, 2, None))
+    with pytest.raises(Rechazo) as e:
+        cuadros.generar('eliminacion', [1, 2], historial, 2)
+    assert e.value.estado == 409
+
+
+# -------------------- Doble eliminación --------------------
+def test_doble_eliminacion_final_repetida():
+    participantes = [1, 2, 3, 4]
+    historial = []
+    jugar('doble_eliminacion', participantes, historial, 1)   # 1-4, 2-3
+    jugar('doble_eliminacion', participantes, historial, 2)   # 1-2 y 3-4
+    jugar('doble_eliminacion', participantes, historial, 3)   # 1 exento, 2-3
+    # El invicto (1) pierde la final contra el que viene de perdedores (2)
+    assert jugar('doble_eliminacion', participantes, historial, 4, ganador=lambda a, b: b) \
+        == [('final', 1, 2, None)]
+    # Los dos tienen una derrota: se repite
+    assert jugar('doble_eliminacion', participantes, historial, 5) == [('final', 1, 2, None)]
+    with pytest.raises(Rechazo) as e:
+        cuadros.generar('doble_eliminacion', participantes, historial, 6)
+    assert e.value.cuerpo['ganador'] == 1
+
+
+def test_doble_eliminacion_sin_repetir_final():
+    participantes = [1, 2, 3, 4]
+    historial = []
+    for numero in (1, 2, 3, 4):
+        jugar('doble_eliminacion', participantes, historial, numero)
+    with pytest.raises(Rechazo) as e:
+        cuadros.generar('doble_eliminacion', participantes, historial, 5)
+    assert e.value.cuerpo['ganador'] == 1
+
+
+# -------------------- Suizo --------------------
+def test_emparejar_evita_repetir_rival():
+    assert cuadros.emparejar([1, 2, 3, 4], {1: {2}, 2: {1}}) == [(None, 1, 3, None), (None, 2, 4, None)]
+
+
+def test_emparejar_acepta_repetir_si_no_hay_otro():
+    assert cuadros.emparejar([1, 2], {1: {2}, 2: {1}}) == [(None, 1, 2, None)]
+
+
+def test_suizo_empareja_por_victorias():
+    participantes = [1, 2, 3, 4, 5, 6]
+    historial = []
+    assert jugar('suizo', participantes, historial, 1, ganador=max) == \
+        [(None, 1, 2, None), (None, 3, 4, None), (None, 5, 6, None)]
+    # Ganan 2, 4 y 6; los participantes siguen llegando por puntos de la
+    # clasificación, que no recoge los resultados de las rondas
+    assert cuadros.generar('suizo', participantes, historial, 2) == \
+        [(None, 2, 4, None), (None, 6, 1, None), (None, 3, 5, None)]
+
+
+def test_suizo_no_repite_partidas():
+    participantes = [1, 2, 3, 4]
+    historial = []
+    for numero in (1, 2, 3):
+        jugar('suizo', participantes, historial, numero)
+    parejas = [frozenset((a, b)) for _, _, _, a, b, _ in historial]
+    assert len(parejas) == len(set(parejas)) == 6
+
+
+def test_suizo_exento_rota():
+    participantes = [1, 2, 3]
+    historial = []
+    assert jugar('suizo', participantes, historial, 1) == [(None, 1, 2, None), (None, 3, None, 3)]
+    # 3 ya ha descansado: ahora le toca al peor que no lo ha hecho
+    assert cuadros.generar('suizo', participantes, historial, 2) == [(None, 1, 3, None), (None, 2, None, 2)]
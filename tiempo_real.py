@@ -0,0 +1,195 @@
+"""Clasificaciones en directo con LISTEN/NOTIFY y Server-Sent Events.
+
+Cada proceso abre una sola conexión dedicada que escucha el canal
+'torneo_cambios' (lo alimentan los triggers de la migración 0003). Los avisos
+que llegan durante VENTANA segundos se juntan: por cada torneo con clientes
+suscritos se carga la clasificación una vez y se reparte a todos, y si no ha
+cambiado no se envía nada. Cada cliente tiene una cola de COLA_MAX
+clasificaciones; si se llena, el cliente va demasiado lento y se le corta el
+stream (EventSource se reconecta y recibe la clasificación actual).
+"""
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'torneo_cambios'
+VENTANA = float(os.environ.get('SSE_VENTANA', 0.25))
+COLA_MAX = int(os.environ.get('SSE_COLA_MAX', 8))
+# Comentario SSE periódico: mantiene viva la conexión en los proxies y
+# descubre los clientes que se han ido
+LATIDO = float(os.environ.get('SSE_LATIDO', 15))
+# Milisegundos que espera EventSource antes de reconectar
+REINTENTO_MS = 3000
+# Espera entre intentos de recuperar la conexión LISTEN
+ESPERA_RECONEXION = 2.0
+
+
+def evento(datos, nombre='clasificacion'):
+    return f'event: {nombre}\ndata: {datos}\n\n'
+
+
+class Suscripcion:
+    def __init__(self, difusor, torneo_id, cola_max):
+        self.torneo_id = torneo_id
+        self.cola = queue.Queue(maxsize=cola_max)
+        self.descartada = False
+        self._difusor = difusor
+
+    def entregar(self, datos):
+        # False si la cola está llena: el cliente no da abasto
+        try:
+            self.cola.put_nowait(datos)
+            return True
+        except queue.Full:
+            self.descartada = True
+            return False
+
+    def eventos(self, inicial=None):
+        """Cuerpo text/event-stream; al cerrarse la respuesta se cancela la suscripción."""
+        try:
+            yield f'retry: {REINTENTO_MS}\n\n'
+            if inicial is not None:
+                yield evento(inicial)
+            while not self.descartada:
+                try:
+                    datos = self.cola.get(timeout=LATIDO)
+                except queue.Empty:
+                    yield ': latido\n\n'
+                    continue
+                if self.descartada:
+                    break
+                yield evento(datos)
+        finally:
+            self._difusor.cancelar(self)
+
+
+class Difusor:
+    """Reparte los cambios de cada torneo entre sus suscriptores.
+
+    `cargar(torneo_id)` devuelve la clasificación ya serializada en JSON (o
+    None si no se pudo leer). El hilo de escucha arranca con la primera
+    suscripción, para no abrir conexiones antes de que gunicorn cree los workers.
+    """
+
+    def __init__(self, parametros_conexion, cargar, ventana=VENTANA, cola_max=COLA_MAX):
+        self.parametros_conexion = parametros_conexion
+        self.cargar = cargar
+        self.ventana = ventana
+        self.cola_max = cola_max
+        self._suscritos = {}  # torneo_id -> {Suscripcion}
+        self._ultimo = {}  # torneo_id -> último JSON repartido
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._avisos = 0
+        self._envios = 0
+        self._descartadas = 0
+
+    # -------------------- Suscripciones --------------------
+    def suscribir(self, torneo_id):
+        suscripcion = Suscripcion(self, torneo_id, self.cola_max)
+        with self._lock:
+            self._suscritos.setdefault(torneo_id, set()).add(suscripcion)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escuchar, name='difusor-torneos', daemon=True)
+                self._hilo.start()
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            grupo = self._suscritos.get(suscripcion.torneo_id)
+            if grupo is None or suscripcion not in grupo:
+                return
+            grupo.discard(suscripcion)
+            if not grupo:
+                del self._suscritos[suscripcion.torneo_id]
+                self._ultimo.pop(suscripcion.torneo_id, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'escuchando': self._hilo is not None and self._hilo.is_alive(),
+                'torneos': len(self._suscritos),
+                'clientes': sum(len(grupo) for grupo in self._suscritos.values()),
+                'avisos': self._avisos,
+                'envios': self._envios,
+                'descartadas': self._descartadas,
+            }
+
+    # -------------------- Reparto --------------------
+    def publicar(self, torneos):
+        for torneo_id in torneos:
+            with self._lock:
+                grupo = list(self._suscritos.get(torneo_id, ()))
+            if not grupo:
+                continue
+            datos = self.cargar(torneo_id)
+            with self._lock:
+                if datos is None or datos == self._ultimo.get(torneo_id):
+                    continue
+                self._ultimo[torneo_id] = datos
+            lentas = [s for s in grupo if not s.entregar(datos)]
+            with self._lock:
+                self._envios += len(grupo) - len(lentas)
+                self._descartadas += len(lentas)
+            for suscripcion in lentas:
+                self.cancelar(suscripcion)
+
+    # -------------------- Escucha --------------------
+    def _escuchar(self):
+        reconexion = False
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.parametros_conexion)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {CANAL}')
+                if reconexion:
+                    # Los avisos de mientras no había conexión se han perdido
+                    with self._lock:
+                        torneos = list(self._suscritos)
+                    self.publicar(torneos)
+                self._atender(conn)
+            except Exception:
+                logger.exception("Error en la escucha de %s", CANAL)
+            finally:
+                if conn is not None:
+                    conn.close()
+            reconexion = True
+            time.sleep(ESPERA_RECONEXION)
+
+    def _atender(self, conn):
+        pendientes = set()
+        limite = None
+        while True:
+            espera = max(0.0, limite - time.monotonic()) if limite is not None else LATIDO
+            if select.select([conn], [], [], espera)[0]:
+                conn.poll()
+            elif limite is None:
+                # Nada en LATIDO segundos: se comprueba que la conexión sigue viva
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+
+            while conn.notifies:
+                aviso = conn.notifies.pop(0)
+                with self._lock:
+                    self._avisos += 1
+                try:
+                    pendientes.add(int(aviso.payload))
+                except ValueError:
+                    continue
+            if pendientes and limite is None:
+                limite = time.monotonic() + self.ventana
+
+            if limite is not None and time.monotonic() >= limite:
+                self.publicar(pendientes)
+                pendientes = set()
+                limite = None